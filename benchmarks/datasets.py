@@ -0,0 +1,142 @@
+"""Synthetic data for benchmarking the score tracker offline."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from ossapi.ossapi import Beatmap as BeatmapV1
+
+from score_tracker.models.maps import add_maps
+from score_tracker.models.scores import add_scores
+from score_tracker.models.users import add_tracked_user
+from score_tracker.models.utils import (
+    MapRecord,
+    ScoreRecord,
+    beatmapv1_into_table_record,
+    missing_score_record,
+)
+
+FIRST_RANKED = datetime(2007, 10, 6, tzinfo=timezone.utc)
+
+
+def beatmap_v1_data(map_id: int, approved_date: datetime, rng: random.Random) -> dict:
+    """Raw api v1 `get_beatmaps` entry, as returned by the osu! api."""
+    length = rng.randint(30, 600)
+    return {
+        "approved": rng.choice(["1", "1", "1", "2", "4"]),
+        "submit_date": approved_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "approved_date": approved_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "last_update": approved_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "artist": f"Artist {rng.randint(1, 5000)}",
+        "beatmap_id": str(map_id),
+        "beatmapset_id": str(map_id // 4),
+        "bpm": str(rng.randint(60, 300)),
+        "creator": f"Mapper {rng.randint(1, 20000)}",
+        "creator_id": str(rng.randint(1, 20_000_000)),
+        "difficultyrating": f"{rng.uniform(0.5, 10):.4f}",
+        "diff_aim": "0",
+        "diff_speed": "0",
+        "diff_size": "4",
+        "diff_overall": "8",
+        "diff_approach": "9",
+        "diff_drain": "5",
+        "hit_length": str(length - 2),
+        "source": "",
+        "genre_id": "1",
+        "language_id": "1",
+        "title": f"Title {map_id}",
+        "total_length": str(length),
+        "version": rng.choice(["Easy", "Normal", "Hard", "Insane", "Extra"]),
+        "file_md5": f"{map_id:032x}",
+        "mode": "0",
+        "tags": "",
+        "favourite_count": "0",
+        "rating": "9",
+        "playcount": "0",
+        "passcount": "0",
+        "count_normal": "0",
+        "count_slider": "0",
+        "count_spinner": "0",
+        "max_combo": str(rng.randint(100, 3000)),
+        "storyboard": "0",
+        "video": "0",
+        "download_unavailable": "0",
+        "audio_unavailable": "0",
+    }
+
+
+def make_beatmaps(count: int, seed: int = 0) -> list[BeatmapV1]:
+    """`count` api v1 beatmaps spread evenly from the first ranked map until now."""
+    rng = random.Random(seed)
+    span = datetime.now(timezone.utc) - FIRST_RANKED
+    step = span / max(count, 1)
+    return [
+        BeatmapV1(beatmap_v1_data(i + 1, FIRST_RANKED + step * i, rng))
+        for i in range(count)
+    ]
+
+
+def make_map_records(count: int, seed: int = 0) -> list[MapRecord]:
+    """Records of table `maps` of `make_beatmaps(count, seed)`."""
+    return [beatmapv1_into_table_record(map) for map in make_beatmaps(count, seed)]
+
+
+def make_missing_scores(user_id: int, map_ids: list[int]) -> list[ScoreRecord]:
+    """Placeholder scores, as returned by `get_score` for unplayed maps."""
+    return [missing_score_record(user_id, map_id) for map_id in map_ids]
+
+
+def make_score_records(
+    user_id: int,
+    maps: list[BeatmapV1],
+    played_fraction: float,
+    checked_fraction: float,
+    rng: random.Random,
+) -> list[ScoreRecord]:
+    """Rows of table `scores` for one user: a score on `played_fraction` of
+    the maps, and a placeholder row on `checked_fraction` of the rest. The
+    remaining maps have not been requested yet."""
+    records = []
+    for map in maps:
+        roll = rng.random()
+        if roll < played_fraction:
+            played_time = map.approved_date + timedelta(days=rng.uniform(0, 365))
+            accuracy = rng.uniform(0.85, 1.0)
+            records.append(
+                ScoreRecord(
+                    map.beatmap_id * 100_000 + user_id % 100_000,
+                    user_id,
+                    map.beatmap_id,
+                    int(rng.uniform(0.3, 1.0) * 10_000_000),
+                    accuracy,
+                    int(map.max_combo * rng.uniform(0.3, 1.0)),
+                    rng.choice((0, 0, 0, 8, 64, 72, 16, 24)),
+                    int(played_time.timestamp()),
+                    round(map.star_rating**2.5 * accuracy**8, 3),
+                    rng.choice(("X", "S", "S", "A", "A", "A", "B", "C")),
+                    int(rng.random() < 0.1),
+                )
+            )
+        elif roll < played_fraction + (1 - played_fraction) * checked_fraction:
+            records.append(missing_score_record(user_id, map.beatmap_id))
+    return records
+
+
+def seed_database(
+    map_count: int,
+    user_ids: list[int],
+    played_fraction: float = 0.4,
+    checked_fraction: float = 0.8,
+    seed: int = 0,
+) -> list[BeatmapV1]:
+    """Fill the current database with `map_count` maps and the scores of
+    `user_ids`, who are also tracked. Users play between half and twice
+    `played_fraction` of the maps. Returns the maps."""
+    rng = random.Random(seed)
+    maps = make_beatmaps(map_count, seed)
+    add_maps(beatmapv1_into_table_record(map) for map in maps)
+    for user_id in user_ids:
+        add_tracked_user(user_id)
+        fraction = min(1.0, played_fraction * rng.uniform(0.5, 2))
+        records = make_score_records(user_id, maps, fraction, checked_fraction, rng)
+        add_scores(records)
+    return maps
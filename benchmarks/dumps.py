@@ -0,0 +1,194 @@
+"""Maps/sec of importing maps from local dumps, and the api requests a sync
+still needs afterwards.
+
+Writes synthetic dumps of all but the newest `--newer` maps in each format,
+imports each into an empty database, then syncs the rest from the fake api.
+From the repository root:
+
+    python -m benchmarks.dumps --maps 100000
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+from benchmarks.datasets import make_beatmaps
+from benchmarks.fakeapi import FakeOsu
+from benchmarks.utils import quiet, report, temporary_database, timer, unlimited_rate
+from score_tracker.controllers.maps import sync_maps
+from score_tracker.dumps import import_map_dump
+from score_tracker.models.maps import get_map_count, remove_all_maps
+from score_tracker.models.utils import MapRecord, beatmapv1_into_table_record
+
+MAP_COLUMNS = (
+    "beatmap_id",
+    "beatmapset_id",
+    "user_id",
+    "version",
+    "total_length",
+    "playmode",
+    "approved",
+    "difficultyrating",
+    "deleted_at",
+)
+SET_COLUMNS = (
+    "beatmapset_id",
+    "user_id",
+    "artist",
+    "title",
+    "creator",
+    "approved",
+    "approved_date",
+    "deleted_at",
+)
+
+
+def _date(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def _sql_value(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "'{}'".format(value.replace("\\", "\\\\").replace("'", "\\'"))
+    return str(value)
+
+
+def _write_sql_table(
+    path: str, table: str, columns: tuple[str, ...], rows: list[tuple]
+) -> None:
+    """Write `rows` in the layout of mysqldump."""
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+        file.write(f"CREATE TABLE `{table}` (\n")
+        for column in columns:
+            file.write(f"  `{column}` varchar(255) DEFAULT NULL,\n")
+        file.write(f"  PRIMARY KEY (`{columns[0]}`)\n) ENGINE=InnoDB;\n")
+        for start in range(0, len(rows), 1000):
+            values = ",".join(
+                "(" + ",".join(map(_sql_value, row)) + ")"
+                for row in rows[start : start + 1000]
+            )
+            file.write(f"INSERT INTO `{table}` VALUES {values};\n")
+
+
+def write_sql(directory: str, maps: list[MapRecord]) -> str:
+    sets = {}
+    for record in maps:
+        sets.setdefault(
+            record.set_id,
+            (
+                record.set_id,
+                record.mapper_id,
+                record.artist,
+                record.title,
+                record.mapper,
+                record.ranked_type,
+                _date(record.ranked_time),
+                None,
+            ),
+        )
+    _write_sql_table(
+        os.path.join(directory, "osu_beatmaps.sql"),
+        "osu_beatmaps",
+        MAP_COLUMNS,
+        [
+            (
+                record.map_id,
+                record.set_id,
+                record.mapper_id,
+                record.diff_name,
+                record.length,
+                0,
+                record.ranked_type,
+                record.diff_rating,
+                None,
+            )
+            for record in maps
+        ],
+    )
+    _write_sql_table(
+        os.path.join(directory, "osu_beatmapsets.sql"),
+        "osu_beatmapsets",
+        SET_COLUMNS,
+        list(sets.values()),
+    )
+    return directory
+
+
+def write_tsv(directory: str, maps: list[MapRecord]) -> str:
+    path = os.path.join(directory, "maps.tsv")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\t".join(MapRecord._fields) + "\n")
+        for record in maps:
+            file.write("\t".join(map(str, record)) + "\n")
+    return path
+
+
+def write_jsonl(directory: str, maps: list[MapRecord]) -> str:
+    """Maps in the format of api v1 `get_beatmaps` entries."""
+    path = os.path.join(directory, "maps.jsonl")
+    with open(path, "w", encoding="utf-8") as file:
+        for record in maps:
+            entry = {
+                "beatmap_id": str(record.map_id),
+                "beatmapset_id": str(record.set_id),
+                "approved": str(record.ranked_type),
+                "approved_date": _date(record.ranked_time),
+                "artist": record.artist,
+                "title": record.title,
+                "version": record.diff_name,
+                "creator": record.mapper,
+                "creator_id": str(record.mapper_id),
+                "difficultyrating": str(record.diff_rating),
+                "total_length": str(record.length),
+                "mode": "0",
+            }
+            file.write(json.dumps(entry) + "\n")
+    return path
+
+
+def run(directory: str, map_count: int, newer: int) -> None:
+    beatmaps = make_beatmaps(map_count)
+    fake = FakeOsu(beatmaps, latency=0.0)
+    fake.install()
+    dumped = [beatmapv1_into_table_record(map) for map in beatmaps[:-newer]]
+
+    for format, write in (
+        ("sql", write_sql),
+        ("tsv", write_tsv),
+        ("jsonl", write_jsonl),
+    ):
+        os.makedirs(os.path.join(directory, format))
+        path = write(os.path.join(directory, format), dumped)
+        remove_all_maps()
+        with quiet(), timer() as elapsed:
+            import_report = import_map_dump(path)
+        report(f"import_map_dump {format}", import_report.imported, elapsed[0], "maps")
+
+    requests = fake.counts.requests
+    with quiet(), timer() as elapsed:
+        sync_maps()
+    print(
+        f"{'sync_maps (after import)':<36} {elapsed[0]:>9.3f}s "
+        f"{fake.counts.requests - requests} requests, {get_map_count()} maps"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=100_000)
+    parser.add_argument("--newer", type=int, default=1000, help="maps only the api has")
+    args = parser.parse_args()
+
+    unlimited_rate()
+    with temporary_database() as directory:
+        run(directory, args.maps, args.newer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Rows/sec of exporting scores joined with their maps.
+
+Runs against a synthetic database of `--maps` maps and the scores of
+`--users` users. From the repository root:
+
+    python -m benchmarks.export --maps 100000 --users 3
+"""
+
+import argparse
+import os
+
+from benchmarks.datasets import seed_database
+from benchmarks.utils import report, temporary_database, timer
+from score_tracker.export import COLUMNAR_EXTENSION, export_scores
+
+
+def run(directory: str, map_count: int, user_count: int) -> None:
+    user_ids = list(range(1001, 1001 + user_count))
+    seed_database(map_count, user_ids)
+
+    for format, extension in (("csv", "csv"), ("columnar", COLUMNAR_EXTENSION)):
+        for name, users in (("one user", user_ids[:1]), ("all users", None)):
+            path = os.path.join(directory, f"scores.{extension}")
+            with timer() as elapsed:
+                rows = export_scores(path, user_ids=users, format=format)
+            report(f"export_scores {format} ({name})", rows, elapsed[0])
+            print(f"  {os.path.getsize(path) / 2**20:.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=3)
+    args = parser.parse_args()
+
+    with temporary_database() as directory:
+        run(directory, args.maps, args.users)
+
+
+if __name__ == "__main__":
+    main()
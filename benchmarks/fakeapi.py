@@ -0,0 +1,231 @@
+"""In-process stand-ins for the ossapi clients.
+
+They serve synthetic maps, scores and leaderboards with a configurable
+latency, and can answer a share of requests with a 429 to exercise the rate
+limiter retries.
+Requests are paced and timed like real ones, through `pace_request` and the
+metrics of the http transport.
+
+    fake = FakeOsu(make_beatmaps(100_000), latency=0.05, throttle_rate=0.01)
+    fake.install()
+"""
+
+import random
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from time import sleep
+
+from ossapi import (
+    Beatmap,
+    BeatmapScores,
+    BeatmapUserScore,
+    GameMode,
+    Mod,
+    Score,
+    ScoreType,
+)
+from ossapi.enums import Grade
+from ossapi.ossapi import Beatmap as BeatmapV1
+from requests import HTTPError, Response
+
+from score_tracker import metrics
+from score_tracker.controllers.api import set_clients
+from score_tracker.controllers.utils import pace_request
+
+# maximum number of maps returned by one `get_beatmaps` request
+V1_PAGE_SIZE = 500
+# scores on a leaderboard besides those of `leaderboard_users`
+LEADERBOARD_FILLERS = 100
+
+GRADES = (Grade.SS, Grade.S, Grade.S, Grade.A, Grade.A, Grade.A, Grade.B, Grade.C)
+MODS = (0, 0, 0, 8, 64, 72, 16, 24, 1, 2)
+
+
+@dataclass
+class RequestCounts:
+    requests: int = 0
+    throttled: int = 0
+
+
+class FakeOsu:
+    """Synthetic osu! api shared by `FakeOssapiV1` and `FakeOssapi`.
+
+    Each user has played a share of the maps, between `played_fraction`
+    halved and doubled depending on the user; which ones is decided by the
+    seed, so runs are repeatable.
+
+    Leaderboards hold the scores of `leaderboard_users` among other players'
+    scores. Each call to `advance` changes a `churn` share of them."""
+
+    def __init__(
+        self,
+        maps: list[BeatmapV1],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        throttle_rate: float = 0.0,
+        played_fraction: float = 0.4,
+        leaderboard_users: tuple[int, ...] = (),
+        churn: float = 0.1,
+        seed: int = 0,
+    ) -> None:
+        self.maps = sorted(maps, key=lambda map: (map.approved_date, map.beatmap_id))
+        self.maps_by_id = {map.beatmap_id: map for map in self.maps}
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.played_fraction = played_fraction
+        self.leaderboard_users = leaderboard_users
+        self.churn = churn
+        self.epoch = 0
+        self.seed = seed
+        self.counts = RequestCounts()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._played: dict[int, list[Score]] = {}
+
+    def install(self) -> None:
+        """Make the score tracker use this fake instead of the osu! api."""
+        set_clients(api=FakeOssapi(self), api_v1=FakeOssapiV1(self))
+
+    def request(self, path: str) -> None:
+        """Simulate sending a request: wait for the rate limiter, the latency,
+        and maybe respond with a 429."""
+        pace_request()
+        with self._lock:
+            self.counts.requests += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            throttled = self._rng.random() < self.throttle_rate
+            if throttled:
+                self.counts.throttled += 1
+
+        with metrics.timed(metrics.endpoint_name("GET", f"https://osu.ppy.sh{path}")):
+            sleep(delay)
+        if throttled:
+            response = Response()
+            response.status_code = 429
+            response.headers["Retry-After"] = "0"
+            raise HTTPError(f"429 for {path}", response=response)
+
+    def has_played(self, user_id: int, map_id: int) -> bool:
+        user_rng = random.Random(self.seed * 1_000_003 + user_id)
+        fraction = self.played_fraction * user_rng.uniform(0.5, 2)
+        return random.Random(f"{self.seed}-{user_id}-{map_id}").random() < fraction
+
+    def score(self, user_id: int, map_id: int) -> Score:
+        rng = random.Random(f"{self.seed}-{user_id}-{map_id}-score")
+        map = self.maps_by_id[map_id]
+        accuracy = rng.uniform(0.85, 1.0)
+        return Score(
+            id=map_id * 100_000 + user_id % 100_000,
+            user_id=user_id,
+            accuracy=accuracy,
+            mods=Mod(rng.choice(MODS)),
+            score=int(rng.uniform(0.3, 1.0) * 10_000_000),
+            max_combo=int(map.max_combo * rng.uniform(0.3, 1.0)),
+            perfect=rng.random() < 0.1,
+            pp=round(map.star_rating**2.5 * accuracy**8, 3),
+            rank=rng.choice(GRADES),
+            created_at=map.approved_date + timedelta(days=rng.uniform(0, 365)),
+            beatmap=Beatmap(id=map_id),
+            mode=GameMode.OSU,
+            passed=True,
+        )
+
+    def advance(self) -> None:
+        """Let time pass, changing a `churn` share of the leaderboards."""
+        self.epoch += 1
+
+    def leaderboard(self, map_id: int, limit: int) -> list[Score]:
+        version = sum(
+            random.Random(f"{self.seed}-{map_id}-{epoch}").random() < self.churn
+            for epoch in range(1, self.epoch + 1)
+        )
+        rng = random.Random(f"{self.seed}-{map_id}-{version}-leaderboard")
+        scores = [
+            Score(
+                id=rng.getrandbits(48),
+                user_id=10_000_000 + rng.randrange(1_000_000),
+                score=int(rng.uniform(0.3, 1.0) * 10_000_000),
+            )
+            for _ in range(LEADERBOARD_FILLERS)
+        ]
+        scores += [
+            self.score(user_id, map_id)
+            for user_id in self.leaderboard_users
+            if self.has_played(user_id, map_id)
+        ]
+        return sorted(scores, key=lambda score: score.score, reverse=True)[:limit]
+
+    def played_scores(self, user_id: int) -> list[Score]:
+        with self._lock:
+            if user_id not in self._played:
+                self._played[user_id] = [
+                    self.score(user_id, map.beatmap_id)
+                    for map in self.maps
+                    if self.has_played(user_id, map.beatmap_id)
+                ]
+            return self._played[user_id]
+
+
+class FakeOssapiV1:
+    def __init__(self, fake: FakeOsu) -> None:
+        self.fake = fake
+
+    def get_beatmaps(self, since: datetime | None = None) -> list[BeatmapV1]:
+        self.fake.request("/api/get_beatmaps")
+        maps = self.fake.maps
+        low, high = 0, len(maps) if since is not None else 0
+        while low < high:
+            middle = (low + high) // 2
+            if maps[middle].approved_date < since:
+                low = middle + 1
+            else:
+                high = middle
+        return maps[low : low + V1_PAGE_SIZE]
+
+
+class FakeOssapi:
+    def __init__(self, fake: FakeOsu) -> None:
+        self.fake = fake
+
+    def beatmap_user_score(
+        self, beatmap_id: int, user_id: int, mode: GameMode | None = None
+    ) -> BeatmapUserScore:
+        self.fake.request(f"/api/v2/beatmaps/{beatmap_id}/scores/users/{user_id}")
+        if beatmap_id not in self.fake.maps_by_id or not self.fake.has_played(
+            user_id, beatmap_id
+        ):
+            # what ossapi raises for the api's 404 response
+            raise ValueError("api returned an error: null")
+        return BeatmapUserScore(position=1, score=self.fake.score(user_id, beatmap_id))
+
+    def beatmap_scores(
+        self,
+        beatmap_id: int,
+        mode: GameMode | None = None,
+        limit: int | None = None,
+    ) -> BeatmapScores:
+        self.fake.request(f"/api/v2/beatmaps/{beatmap_id}/scores")
+        if beatmap_id not in self.fake.maps_by_id:
+            raise ValueError("api returned an error: null")
+        return BeatmapScores(scores=self.fake.leaderboard(beatmap_id, limit or 50))
+
+    def user_scores(
+        self,
+        user_id: int,
+        type: ScoreType,
+        mode: GameMode | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> list[Score]:
+        self.fake.request(f"/api/v2/users/{user_id}/scores/{type.value}")
+        scores = self.fake.played_scores(user_id)
+        if type is ScoreType.BEST:
+            scores = sorted(scores, key=lambda score: score.pp, reverse=True)[:200]
+        elif type is ScoreType.FIRSTS:
+            scores = scores[:: max(1, len(scores) // 20)][:20]
+        else:
+            scores = scores[-10:]
+        offset = offset or 0
+        return scores[offset : offset + (limit or 100)]
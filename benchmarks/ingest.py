@@ -0,0 +1,82 @@
+"""Rows/sec of the row-by-row and bulk ingestion paths.
+
+Run from the repository root:
+
+    python -m benchmarks.ingest --maps 100000
+"""
+
+import argparse
+import sqlite3 as sql
+from time import perf_counter
+
+from benchmarks.datasets import make_map_records, make_missing_scores
+from benchmarks.utils import report, temporary_database
+from score_tracker.models import utils
+from score_tracker.models.maps import add_map, add_maps, remove_all_maps
+from score_tracker.models.scores import add_score, add_scores, remove_all_scores
+
+
+def legacy_add_map(record: utils.MapRecord) -> None:
+    """`add_map` as it was before pooling: connect, insert, commit, close."""
+    connection = sql.connect(utils.DATABASE_PATH)
+    connection.execute(
+        "INSERT OR IGNORE INTO maps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        record,
+    )
+    connection.commit()
+    connection.close()
+
+
+def run(map_count: int, row_by_row_count: int, chunk_size: int) -> None:
+    maps = make_map_records(map_count)
+    sample = maps[:row_by_row_count]
+
+    remove_all_maps()
+    start = perf_counter()
+    for map in sample:
+        legacy_add_map(map)
+    report("maps: connection per row", len(sample), perf_counter() - start)
+
+    remove_all_maps()
+    start = perf_counter()
+    for map in sample:
+        add_map(map)
+    report("maps: add_map per row", len(sample), perf_counter() - start)
+
+    remove_all_maps()
+    start = perf_counter()
+    add_maps(maps, chunk_size=chunk_size)
+    report(f"maps: add_maps ({chunk_size})", len(maps), perf_counter() - start)
+
+    scores = make_missing_scores(1, [map.map_id for map in maps])
+
+    remove_all_scores()
+    start = perf_counter()
+    for score in scores[:row_by_row_count]:
+        add_score(score)
+    report("scores: add_score per row", row_by_row_count, perf_counter() - start)
+
+    remove_all_scores()
+    start = perf_counter()
+    add_scores(scores, chunk_size=chunk_size)
+    report(f"scores: add_scores ({chunk_size})", len(scores), perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=100_000)
+    parser.add_argument(
+        "--row-by-row",
+        type=int,
+        default=2_000,
+        help="rows used for the slow per-row paths",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with temporary_database():
+        run(args.maps, min(args.row_by_row, args.maps), args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Leaderboards/sec of leaderboard position tracking, and the requests and
+writes change detection saves.
+
+Reads the leaderboard of every map the tracked users have played, then lets
+`--churn` of the leaderboards change and reads them all again, and finally
+queries the scores that dropped out of the top 50. From the repository root:
+
+    python -m benchmarks.leaderboards --maps 20000 --latency 0.01
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.datasets import seed_database
+from benchmarks.fakeapi import FakeOsu
+from benchmarks.utils import quiet, report, temporary_database, timer, unlimited_rate
+from score_tracker import metrics
+from score_tracker.controllers.leaderboards import track_leaderboards
+from score_tracker.models.leaderboards import get_dropped_out
+from score_tracker.models.utils import get_connection
+
+USER_IDS = [1001, 1002, 1003]
+
+
+def read_all(name: str, fake: FakeOsu, workers: int) -> None:
+    requests = fake.counts.requests
+    metrics.reset()
+    with quiet(), timer() as elapsed:
+        read, changed = track_leaderboards(workers=workers)
+    report(name, read, elapsed[0], "maps")
+    writes = metrics.snapshot()["histograms"].get("db.write", {}).get("total", 0)
+    print(
+        f"  {fake.counts.requests - requests} requests | {changed} changed | "
+        f"db.write {writes:.3f}s"
+    )
+
+
+def run(map_count: int, latency: float, churn: float, workers: int) -> None:
+    with temporary_database():
+        maps = seed_database(map_count, USER_IDS)
+        fake = FakeOsu(maps, latency, leaderboard_users=tuple(USER_IDS), churn=churn)
+        fake.install()
+        start = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+        read_all("track_leaderboards (first read)", fake, workers)
+        read_all("track_leaderboards (none due)", fake, workers)
+
+        fake.advance()
+        connection = get_connection()
+        connection.execute("UPDATE leaderboard_checks SET next_check_time = 0;")
+        connection.commit()
+        read_all(f"track_leaderboards ({churn:.0%} changed)", fake, workers)
+
+        with timer() as elapsed:
+            drops = get_dropped_out(50, start)
+        report("get_dropped_out (top 50)", len(drops), elapsed[0], "scores")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--churn", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    unlimited_rate()
+    run(args.maps, args.latency, args.churn, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Maps/sec of retrieving maps from the api and storing them.
+
+Runs against the fake api. From the repository root:
+
+    python -m benchmarks.maps --maps 100000 --latency 0.05
+"""
+
+import argparse
+
+from benchmarks.datasets import make_beatmaps
+from benchmarks.fakeapi import FakeOsu
+from benchmarks.utils import quiet, report, temporary_database, timer, unlimited_rate
+from score_tracker.controllers.maps import (
+    fill_map_table,
+    get_leaderboard_maps,
+    sync_maps,
+)
+from score_tracker.models.maps import remove_all_maps
+
+
+def run(map_count: int, latency: float, chunk_size: int) -> None:
+    fake = FakeOsu(make_beatmaps(map_count), latency=latency)
+    fake.install()
+
+    with quiet(), timer() as elapsed:
+        maps = get_leaderboard_maps()
+    report("get_leaderboard_maps", len(maps), elapsed[0], "maps")
+    print(f"  {fake.counts.requests} requests")
+
+    with quiet(), timer() as elapsed:
+        fill_map_table(maps, chunk_size=chunk_size)
+    report(f"fill_map_table ({chunk_size})", len(maps), elapsed[0], "maps")
+
+    remove_all_maps()
+    requests = fake.counts.requests
+    with quiet(), timer() as elapsed:
+        sync_maps(full=True)
+    report("sync_maps (full)", len(maps), elapsed[0], "maps")
+    print(f"  {fake.counts.requests - requests} requests")
+
+    requests = fake.counts.requests
+    with quiet(), timer() as elapsed:
+        sync_maps()
+    print(
+        f"{'sync_maps (up to date)':<36} {elapsed[0]:>9.3f}s "
+        f"{fake.counts.requests - requests} requests"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=100_000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per api request"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    unlimited_rate()
+    with temporary_database():
+        run(args.maps, args.latency, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Duration of the queries finding maps without a score of a user.
+
+Runs against a synthetic database of `--maps` maps and the scores of
+`--users` users. From the repository root:
+
+    python -m benchmarks.queries --maps 100000 --users 5
+"""
+
+import argparse
+from statistics import median
+from time import perf_counter
+
+from benchmarks.datasets import seed_database
+from benchmarks.utils import temporary_database, timer
+from score_tracker.models.maps import (
+    get_all_map_ids_without_score,
+    get_all_map_ids_without_score_in_database,
+    iter_map_ids_without_score,
+)
+
+QUERIES = (
+    ("get_all_map_ids_without_score", get_all_map_ids_without_score),
+    (
+        "get_all_map_ids_without_score_in_database",
+        get_all_map_ids_without_score_in_database,
+    ),
+    ("iter_map_ids_without_score", lambda user: list(iter_map_ids_without_score(user))),
+    (
+        "iter_map_ids_without_score (database)",
+        lambda user: list(iter_map_ids_without_score(user, in_database=True)),
+    ),
+)
+
+
+def run(map_count: int, user_count: int, repeat: int) -> None:
+    user_ids = list(range(1001, 1001 + user_count))
+    with timer() as elapsed:
+        seed_database(map_count, user_ids)
+    print(f"Seeded {map_count} maps and {user_count} users in {elapsed[0]:.1f}s")
+
+    for name, query in QUERIES:
+        durations = []
+        rows = 0
+        for _ in range(repeat):
+            for user_id in user_ids:
+                start = perf_counter()
+                rows = len(query(user_id))
+                durations.append(perf_counter() - start)
+        print(
+            f"{name:<42} median {median(durations) * 1000:>8.1f}ms "
+            f"best {min(durations) * 1000:>8.1f}ms  ({rows} rows)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with temporary_database():
+        run(args.maps, args.users, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
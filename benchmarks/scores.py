@@ -0,0 +1,118 @@
+"""Scores/sec of the score fetching loops.
+
+Runs against the fake api, with every request taking `--latency` seconds and
+`--throttle-rate` of them answered with a 429. From the repository root:
+
+    python -m benchmarks.scores --maps 2000 --latency 0.02 --workers 1 4 8
+"""
+
+import argparse
+
+from benchmarks.datasets import make_beatmaps
+from benchmarks.fakeapi import FakeOsu
+from benchmarks.utils import quiet, report, temporary_database, timer, unlimited_rate
+from score_tracker import metrics
+from score_tracker.controllers.jobs import run_crawl_job
+from score_tracker.controllers.scheduler import run_scheduler
+from score_tracker.controllers.scores import collect_scores
+from score_tracker.models.maps import add_maps, iter_map_ids_without_score
+from score_tracker.models.users import add_tracked_user
+from score_tracker.models.utils import beatmapv1_into_table_record
+
+USER_IDS = [1001, 1002, 1003]
+
+
+def run_once(name: str, fake: FakeOsu, count: int, func) -> None:
+    requests = fake.counts.requests
+    throttled = fake.counts.throttled
+    metrics.reset()
+    retries = metrics.snapshot()["retries"]
+    with quiet(), timer() as elapsed:
+        func()
+    report(name, count, elapsed[0], "maps")
+    values = metrics.snapshot()
+    print(
+        f"  {fake.counts.requests - requests} requests | "
+        f"{fake.counts.throttled - throttled} throttled | "
+        f"{values['retries'] - retries} retries | "
+        f"db.write {values['histograms']['db.write']['total']:.3f}s"
+    )
+
+
+def run(
+    map_count: int,
+    latency: float,
+    jitter: float,
+    throttle_rate: float,
+    workers: list[int],
+) -> None:
+    maps = make_beatmaps(map_count)
+    records = [beatmapv1_into_table_record(map) for map in maps]
+    user_id = USER_IDS[0]
+
+    for count in workers:
+        with temporary_database():
+            add_maps(records)
+            fake = FakeOsu(maps, latency, jitter, throttle_rate)
+            fake.install()
+            run_once(
+                f"run_crawl_job ({count} workers)",
+                fake,
+                map_count,
+                lambda: run_crawl_job(
+                    user_id,
+                    "benchmark",
+                    lambda: iter_map_ids_without_score(user_id),
+                    workers=count,
+                ),
+            )
+
+    with temporary_database():
+        add_maps(records)
+        fake = FakeOsu(maps, latency, jitter, throttle_rate)
+        fake.install()
+        run_once(
+            f"collect_scores ({max(workers)} workers)",
+            fake,
+            map_count,
+            lambda: collect_scores(user_id, workers=max(workers)),
+        )
+
+    with temporary_database():
+        add_maps(records)
+        for tracked in USER_IDS:
+            add_tracked_user(tracked)
+        fake = FakeOsu(maps, latency, jitter, throttle_rate)
+        fake.install()
+        run_once(
+            f"run_scheduler ({len(USER_IDS)} users)",
+            fake,
+            map_count * len(USER_IDS),
+            lambda: run_scheduler(workers=max(workers)),
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--maps", type=int, default=2_000)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds per api request"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="extra random latency, up to"
+    )
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="share of requests answered with a 429",
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    unlimited_rate()
+    run(args.maps, args.latency, args.jitter, args.throttle_rate, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Helpers shared by the benchmarks."""
+
+import io
+import os
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from time import perf_counter
+from typing import Iterator
+
+from score_tracker.controllers.api import load_settings
+from score_tracker.controllers.utils import configure_rate_limit
+from score_tracker.models import utils
+from score_tracker.models.seed import (
+    create_history_table,
+    create_job_tables,
+    create_leaderboard_tables,
+    create_map_table,
+    create_score_table,
+    create_search_table,
+    create_stats_tables,
+    create_sync_table,
+    create_user_tables,
+)
+
+
+@contextmanager
+def temporary_database() -> Iterator[str]:
+    """Point the score tracker at an empty database in a temporary directory,
+    yielding the directory."""
+    with tempfile.TemporaryDirectory() as directory:
+        utils.set_database_path(os.path.join(directory, "bench.sqlite"))
+        create_map_table()
+        create_search_table()
+        create_score_table()
+        create_job_tables()
+        create_sync_table()
+        create_user_tables()
+        create_stats_tables()
+        create_history_table()
+        create_leaderboard_tables()
+        try:
+            yield directory
+        finally:
+            utils.close_connections()
+
+
+@contextmanager
+def timer() -> Iterator[list[float]]:
+    """Measure the `with` block; the duration is in the yielded list after."""
+    elapsed: list[float] = []
+    start = perf_counter()
+    try:
+        yield elapsed
+    finally:
+        elapsed.append(perf_counter() - start)
+
+
+def quiet():
+    """Hide the progress messages printed by the code under benchmark."""
+    return redirect_stdout(io.StringIO())
+
+
+def unlimited_rate() -> None:
+    """Let the fake api be called as fast as it answers."""
+    load_settings()
+    configure_rate_limit("v1", rate=1e9, burst=1_000_000)
+    configure_rate_limit("v2", rate=1e9, burst=1_000_000)
+    configure_rate_limit("leaderboards", rate=1e9, burst=1_000_000)
+
+
+def report(name: str, rows: int, seconds: float, unit: str = "rows") -> None:
+    rate = rows / seconds if seconds else float("inf")
+    print(f"{name:<36} {rows:>8} {unit} {seconds:>9.3f}s {rate:>12.0f} {unit}/s")
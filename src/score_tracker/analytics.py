@@ -0,0 +1,237 @@
+"""Vectorised analysis of stored scores with NumPy, an optional dependency."""
+
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError(
+        "score analytics need NumPy: pip install osuScoreTracker[analytics]"
+    ) from error
+
+from score_tracker.models.stats import WEIGHT, WEIGHTED_SCORES
+from score_tracker.models.utils import get_connection
+
+# grades from best to worst, stored in `ScoreArrays.grade` as their index
+GRADES = ("XH", "X", "SH", "S", "A", "B", "C", "D", "F")
+# lower bounds of the difficulty bands, in stars
+STAR_BANDS = (0, 2, 3, 4, 5, 6, 7, 8, 9)
+
+_SCORE_DTYPE = np.dtype(
+    [
+        ("map_id", np.int32),
+        ("ranked_time", np.int64),
+        ("stars", np.float32),
+        ("score", np.int64),
+        ("accuracy", np.float32),
+        ("mods", np.uint32),
+        ("pp", np.float32),
+        ("grade", np.int8),
+        ("perfect", np.bool_),
+    ]
+)
+_MAP_DTYPE = np.dtype(
+    [
+        ("map_id", np.int32),
+        ("ranked_time", np.int64),
+        ("ranked_type", np.int8),
+        ("stars", np.float32),
+    ]
+)
+_GRADE_CODE = (
+    "CASE s.grade "
+    + " ".join(f"WHEN '{grade}' THEN {code}" for code, grade in enumerate(GRADES))
+    + " ELSE -1 END"
+)
+
+
+@dataclass
+class ScoreArrays:
+    """Columns of a user's played scores, ordered by map id. Scores on maps
+    missing from table `maps` have a ranked time and star rating of 0."""
+
+    user_id: int
+    map_id: np.ndarray
+    ranked_time: np.ndarray
+    stars: np.ndarray
+    score: np.ndarray
+    accuracy: np.ndarray
+    mods: np.ndarray
+    pp: np.ndarray
+    grade: np.ndarray
+    perfect: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.map_id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _SCORE_DTYPE.names or ())
+
+
+@dataclass
+class MapArrays:
+    """Columns of the stored maps, ordered by map id"""
+
+    map_id: np.ndarray
+    ranked_time: np.ndarray
+    ranked_type: np.ndarray
+    stars: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.map_id)
+
+
+def _columns(rows: np.ndarray) -> dict[str, np.ndarray]:
+    """Contiguous copies of the fields of a structured array."""
+    return {name: np.ascontiguousarray(rows[name]) for name in rows.dtype.names}
+
+
+def load_scores(user_id: int) -> ScoreArrays:
+    """Load the played scores of a user into column arrays"""
+    cursor = get_connection().execute(
+        f"""
+        SELECT
+            s.map_id,
+            COALESCE(m.ranked_time, 0),
+            COALESCE(m.diff_rating, 0),
+            s.score,
+            s.accuracy,
+            s.mods,
+            COALESCE(s.pp, 0),
+            {_GRADE_CODE},
+            COALESCE(s.perfect, 0)
+        FROM scores AS s
+        LEFT JOIN maps AS m ON m.map_id = s.map_id
+        WHERE s.user_id = ? AND s.score > 0
+        ORDER BY s.map_id;
+        """,
+        (user_id,),
+    )
+    try:
+        rows = np.fromiter(cursor, dtype=_SCORE_DTYPE)
+    finally:
+        cursor.close()
+    return ScoreArrays(user_id, **_columns(rows))
+
+
+def load_maps(ranked_only: bool = False) -> MapArrays:
+    """Load the stored maps into column arrays, optionally only ranked and
+    approved ones"""
+    where = "WHERE ranked_type BETWEEN 1 AND 2" if ranked_only else ""
+    cursor = get_connection().execute(
+        f"""
+        SELECT map_id, ranked_time, ranked_type, COALESCE(diff_rating, 0)
+        FROM maps
+        {where}
+        ORDER BY map_id;
+        """
+    )
+    try:
+        rows = np.fromiter(cursor, dtype=_MAP_DTYPE)
+    finally:
+        cursor.close()
+    return MapArrays(**_columns(rows))
+
+
+def weighted_pp(scores: ScoreArrays, top: int = WEIGHTED_SCORES) -> float:
+    """Sum of the `top` best pp values, the n-th best weighted by `WEIGHT` ** n"""
+    pp = scores.pp
+    if len(pp) > top:
+        pp = np.partition(pp, len(pp) - top)[-top:]
+    pp = np.sort(pp)[::-1].astype(np.float64)
+    return float(pp @ WEIGHT ** np.arange(len(pp)))
+
+
+def star_band(stars: np.ndarray, bands: tuple[float, ...] = STAR_BANDS) -> np.ndarray:
+    """Index in `bands` of the difficulty band of each star rating"""
+    return np.searchsorted(np.asarray(bands), stars, side="right") - 1
+
+
+def accuracy_percentiles(
+    scores: ScoreArrays,
+    percentiles: tuple[float, ...] = (10, 50, 90),
+    bands: tuple[float, ...] = STAR_BANDS,
+) -> list[dict]:
+    """Number of scores and percentiles of accuracy in each difficulty band"""
+    band = star_band(scores.stars, bands)
+    order = np.argsort(band, kind="stable")
+    bounds = np.searchsorted(band[order], np.arange(len(bands) + 1))
+    accuracy = scores.accuracy[order]
+
+    summary = []
+    for index, low in enumerate(bands):
+        values = accuracy[bounds[index] : bounds[index + 1]]
+        quantiles = np.percentile(values, percentiles) if len(values) else []
+        summary.append(
+            {
+                "stars": low,
+                "count": len(values),
+                "percentiles": {
+                    percentile: round(float(quantile), 6)
+                    for percentile, quantile in zip(percentiles, quantiles)
+                },
+            }
+        )
+    return summary
+
+
+def ranked_period(ranked_time: np.ndarray, unit: str = "Y") -> np.ndarray:
+    """Year ("Y") or month ("M") each unix timestamp falls in"""
+    return ranked_time.astype("datetime64[s]").astype(f"datetime64[{unit}]")
+
+
+def missing_by_period(
+    maps: MapArrays, scores: ScoreArrays, unit: str = "Y"
+) -> list[dict]:
+    """Maps ranked, played and not played by a user in each year ("Y") or
+    month ("M")"""
+    periods, index = np.unique(
+        ranked_period(maps.ranked_time, unit), return_inverse=True
+    )
+    played = np.isin(maps.map_id, scores.map_id, assume_unique=True)
+    totals = np.bincount(index, minlength=len(periods))
+    played_counts = np.bincount(index, weights=played, minlength=len(periods))
+
+    return [
+        {
+            "period": str(period),
+            "maps": int(total),
+            "played": int(count),
+            "missing": int(total - count),
+        }
+        for period, total, count in zip(periods, totals, played_counts)
+    ]
+
+
+def compare_users(first: ScoreArrays, second: ScoreArrays) -> dict:
+    """Compare two users on the maps both have played, and count the maps
+    only one of them has"""
+    common, first_index, second_index = np.intersect1d(
+        first.map_id, second.map_id, assume_unique=True, return_indices=True
+    )
+    score_difference = first.score[first_index] - second.score[second_index]
+    accuracy_difference = (
+        first.accuracy[first_index].astype(np.float64) - second.accuracy[second_index]
+    )
+    pp_difference = first.pp[first_index].astype(np.float64) - second.pp[second_index]
+
+    return {
+        "users": [first.user_id, second.user_id],
+        "common": len(common),
+        "only_played": [len(first) - len(common), len(second) - len(common)],
+        "higher_score": [
+            int(np.count_nonzero(score_difference > 0)),
+            int(np.count_nonzero(score_difference < 0)),
+        ],
+        "mean_accuracy_difference": (
+            round(float(accuracy_difference.mean()), 6) if len(common) else 0.0
+        ),
+        "mean_pp_difference": (
+            round(float(pp_difference.mean()), 3) if len(common) else 0.0
+        ),
+        "weighted_pp": [
+            round(weighted_pp(first), 3),
+            round(weighted_pp(second), 3),
+        ],
+    }
@@ -1,39 +1,690 @@
-from datetime import datetime, timedelta
+from time import perf_counter
 
-# import score_tracker.api as api
-# import score_tracker.database as db
+_IMPORT_START = perf_counter()
 
-from score_tracker.models.seed import create_map_table, create_score_table
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+
+from score_tracker import metrics
+from score_tracker.models.seed import (
+    create_history_table,
+    create_job_tables,
+    create_leaderboard_tables,
+    create_map_table,
+    create_score_table,
+    create_search_table,
+    create_stats_tables,
+    create_sync_table,
+    create_user_tables,
+)
 from score_tracker.models.maps import (
     remove_all_maps,
     get_map_count,
     get_ranked_map_count,
-    get_latest_leaderboard_map,
-    get_latest_ranked_map,
-    get_all_map_ids_without_score,
-    get_all_map_ids_without_score_in_database,
     get_map_ids_for_year,
+    iter_map_ids_without_score,
 )
 from score_tracker.models.scores import (
     get_score_in_database_count,
     get_score_count,
-    add_score,
     remove_all_scores,
 )
-from score_tracker.controllers.maps import get_leaderboard_maps, fill_map_table
-from score_tracker.controllers.scores import get_score
+from score_tracker.models.browse import COLUMNS, BrowseFilter, count_rows, get_page
+from score_tracker.models.history import get_improvements
+from score_tracker.models.jobs import remove_all_jobs
+from score_tracker.models.leaderboards import get_dropped_out
+from score_tracker.models.stats import (
+    get_user_completion,
+    get_user_counts,
+    get_user_stats,
+)
+from score_tracker.models.users import (
+    get_tracked_user_ids,
+    remove_tracked_user,
+)
+from score_tracker.controllers.api import (
+    get_api,
+    get_api_v1,
+    get_cache,
+    get_cache_stats,
+)
+from score_tracker.controllers.maps import sync_maps
+from score_tracker.controllers.jobs import run_crawl_job
+from score_tracker.controllers.leaderboards import (
+    LEADERBOARD_SIZE,
+    track_leaderboards,
+)
+from score_tracker.controllers.scheduler import estimate_completion, run_scheduler
+from score_tracker.controllers.scores import collect_scores
+from score_tracker.controllers.users import track_user
+from score_tracker.database import import_scores_from_csv
+from score_tracker.dumps import DUMP_FORMATS, import_map_dump
+from score_tracker.export import COLUMNAR_EXTENSION, export_scores
+from score_tracker.progress import report, set_json_lines
+
+_IMPORT_TIME = perf_counter() - _IMPORT_START
+
+# modules only loaded once the api is used
+HEAVY_MODULES = ("ossapi", "requests", "dotenv")
+
+# exit codes of the batch commands; argparse exits with EXIT_USAGE on bad usage
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        profile_startup()
+        return EXIT_OK
+
+    if args.command is None:
+        initialise_database()
+        user_id = start()
+        while show_options(user_id) != "QUIT":
+            continue
+        return EXIT_OK
+
+    if args.command == "fetch-scores" and args.year and args.user is None:
+        parser.error("--year requires --user")
+    if args.command == "search" and args.played is not None and args.user is None:
+        parser.error("--played and --unplayed require --user")
+    return run_command(args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--json", action="store_true", help="print output as JSON lines"
+    )
+    common.add_argument(
+        "--metrics-interval",
+        type=_positive_integer_argument,
+        default=60,
+        metavar="SECONDS",
+        help="how often to report throughput and latency metrics",
+    )
+    common.add_argument(
+        "--metrics-file", metavar="PATH", help="also write the metrics to this file"
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="score-tracker",
+        description="Track osu! scores. Starts the interactive menu when no "
+        "command is given.",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report how long imports and initialisation take, then exit",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    sync = commands.add_parser(
+        "sync-maps", parents=[common], help="get maps approved since the last sync"
+    )
+    sync.add_argument(
+        "--ranked", action="store_true", help="only get ranked and approved maps"
+    )
+    sync.add_argument(
+        "--full", action="store_true", help="get all maps instead of only new ones"
+    )
+    sync.set_defaults(handler=sync_maps_command)
+
+    import_maps = commands.add_parser(
+        "import-maps",
+        parents=[common],
+        help="add maps from a local dump of beatmap metadata",
+    )
+    import_maps.add_argument(
+        "path",
+        help="osu! data dump directory or osu_beatmaps.sql, or a TSV or JSON "
+        "lines file, optionally .gz or .bz2",
+    )
+    import_maps.add_argument(
+        "--format",
+        choices=DUMP_FORMATS,
+        help="format of the dump, by default told from the extension",
+    )
+    import_maps.add_argument(
+        "--ranked", action="store_true", help="only add ranked and approved maps"
+    )
+    import_maps.set_defaults(handler=import_maps_command)
+
+    fetch = commands.add_parser(
+        "fetch-scores",
+        parents=[common],
+        help="get scores of a user, or of all tracked users",
+    )
+    fetch.add_argument("--user", type=_positive_integer_argument, help="user id")
+    fetch.add_argument(
+        "--year",
+        type=_year_argument,
+        help="only maps ranked in this year (needs --user)",
+    )
+    fetch.add_argument(
+        "--limit", type=_positive_integer_argument, help="maximum requests"
+    )
+    fetch.add_argument(
+        "--duration",
+        type=_positive_integer_argument,
+        metavar="MINUTES",
+        help="time limit",
+    )
+    fetch.add_argument(
+        "--workers",
+        type=_positive_integer_argument,
+        default=4,
+        help="concurrent requests",
+    )
+    fetch.set_defaults(handler=fetch_scores_command)
+
+    leaderboards = commands.add_parser(
+        "track-leaderboards",
+        parents=[common],
+        help="record tracked users' positions on the leaderboards due to be read",
+    )
+    leaderboards.add_argument(
+        "--limit", type=_positive_integer_argument, help="maximum requests"
+    )
+    leaderboards.add_argument(
+        "--duration",
+        type=_positive_integer_argument,
+        metavar="MINUTES",
+        help="time limit",
+    )
+    leaderboards.add_argument(
+        "--workers",
+        type=_positive_integer_argument,
+        default=2,
+        help="concurrent requests",
+    )
+    leaderboards.set_defaults(handler=track_leaderboards_command)
+
+    drops = commands.add_parser(
+        "leaderboard-drops",
+        parents=[common],
+        help="list scores that dropped out of the top of their leaderboard",
+    )
+    drops.add_argument(
+        "--user",
+        type=_positive_integer_argument,
+        action="append",
+        dest="user_ids",
+        metavar="USER",
+        help="user id, can be repeated; defaults to all users",
+    )
+    drops.add_argument(
+        "--top",
+        type=_positive_integer_argument,
+        default=50,
+        help="positions counted as the top",
+    )
+    drops.add_argument(
+        "--days",
+        type=_positive_integer_argument,
+        default=7,
+        help="how far back to look",
+    )
+    drops.set_defaults(handler=leaderboard_drops_command)
+
+    export = commands.add_parser(
+        "export", parents=[common], help="export stored scores to a file"
+    )
+    export.add_argument(
+        "--user",
+        type=_positive_integer_argument,
+        action="append",
+        dest="user_ids",
+        metavar="USER",
+        help="user id, can be repeated; defaults to all users",
+    )
+    export.add_argument(
+        "--year", type=_year_argument, help="only maps ranked in this year"
+    )
+    export.add_argument(
+        "--mods", type=_mods_argument, help='only scores with these mods, e.g. "HDDT"'
+    )
+    export.add_argument(
+        "--played-only", action="store_true", help="leave out maps without a score"
+    )
+    export.add_argument("--format", choices=("csv", "columnar"), default="csv")
+    export.add_argument("--output", help="file to write, by default in export/")
+    export.set_defaults(handler=export_command)
+
+    stats = commands.add_parser(
+        "stats", parents=[common], help="show database and progress statistics"
+    )
+    stats.set_defaults(handler=stats_command)
+
+    improvements = commands.add_parser(
+        "improvements",
+        parents=[common],
+        help="list the scores a user set or improved since a date",
+    )
+    improvements.add_argument(
+        "--user", type=_positive_integer_argument, required=True, help="user id"
+    )
+    improvements.add_argument(
+        "--since",
+        type=_date_argument,
+        required=True,
+        metavar="YYYY-MM-DD",
+        help="first day to include (UTC)",
+    )
+    improvements.add_argument(
+        "--until",
+        type=_date_argument,
+        metavar="YYYY-MM-DD",
+        help="first day to leave out (UTC)",
+    )
+    improvements.set_defaults(handler=improvements_command)
+
+    search = commands.add_parser(
+        "search",
+        parents=[common],
+        help="search maps by artist, title, difficulty and mapper",
+    )
+    search.add_argument(
+        "text",
+        nargs="*",
+        help='words to find, e.g. "camellia" or "mapper:sotarks"',
+    )
+    search.add_argument(
+        "--user", type=_positive_integer_argument, help="show this user's scores"
+    )
+    played = search.add_mutually_exclusive_group()
+    played.add_argument(
+        "--played",
+        action="store_const",
+        const=True,
+        dest="played",
+        help="only maps the user has played",
+    )
+    played.add_argument(
+        "--unplayed",
+        action="store_const",
+        const=False,
+        dest="played",
+        help="only maps the user has not played",
+    )
+    search.add_argument("--min-stars", type=_stars_argument, metavar="STARS")
+    search.add_argument("--max-stars", type=_stars_argument, metavar="STARS")
+    search.add_argument(
+        "--min-length", type=_positive_integer_argument, metavar="SECONDS"
+    )
+    search.add_argument(
+        "--max-length", type=_positive_integer_argument, metavar="SECONDS"
+    )
+    search.add_argument(
+        "--year", type=_year_argument, help="only maps ranked in this year"
+    )
+    search.add_argument(
+        "--ranked", action="store_true", help="only ranked and approved maps"
+    )
+    search.add_argument(
+        "--sort",
+        choices=tuple(COLUMNS),
+        default="ranked_time",
+        help="column to sort by",
+    )
+    search.add_argument(
+        "--ascending", action="store_true", help="sort from lowest to highest"
+    )
+    search.add_argument(
+        "--limit",
+        type=_positive_integer_argument,
+        default=50,
+        help="maximum maps to list",
+    )
+    search.set_defaults(handler=search_command)
+
+    analyse = commands.add_parser(
+        "analyse",
+        parents=[common],
+        help="analyse a user's scores (needs the analytics extra)",
+    )
+    analyse.add_argument(
+        "--user", type=_positive_integer_argument, required=True, help="user id"
+    )
+    analyse.add_argument(
+        "--compare",
+        type=_positive_integer_argument,
+        metavar="USER",
+        help="also compare with this user",
+    )
+    analyse.add_argument(
+        "--period",
+        choices=("year", "month"),
+        default="year",
+        help="ranked period to count missing maps by",
+    )
+    analyse.set_defaults(handler=analyse_command)
+
+    return parser
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """Run the batch command chosen by `args`, returning the exit code."""
+    set_json_lines(args.json)
+    metrics.configure(args.metrics_interval, args.metrics_file)
+    try:
+        initialise_database()
+        args.handler(args)
+    except KeyboardInterrupt:
+        report("interrupted", "Interrupted", command=args.command)
+        return EXIT_INTERRUPTED
+    except Exception as error:
+        report(
+            "failed",
+            f"ERROR: {type(error).__name__}: {error}",
+            command=args.command,
+            error=f"{type(error).__name__}: {error}",
+        )
+        return EXIT_FAILURE
+    return EXIT_OK
+
+
+def sync_maps_command(args: argparse.Namespace) -> None:
+    get_api_v1()  # fail before starting if the client is not configured
+    try:
+        sync_maps(ranked_only=args.ranked, full=args.full)
+    finally:
+        metrics.emit()
+
+
+def import_maps_command(args: argparse.Namespace) -> None:
+    import_report = import_map_dump(args.path, args.format, ranked_only=args.ranked)
+    for row_number, reason in import_report.rejected:
+        report(
+            "rejected",
+            f"Rejected row {row_number}: {reason}",
+            row=row_number,
+            reason=reason,
+        )
+    report(
+        "finished",
+        f"Imported {import_report.imported} maps, skipped "
+        f"{import_report.skipped}, rejected {len(import_report.rejected)}",
+        maps=import_report.imported,
+        skipped=import_report.skipped,
+        rejected=len(import_report.rejected),
+    )
+
+
+def fetch_scores_command(args: argparse.Namespace) -> None:
+    get_api()  # fail before starting if the client is not configured
+    end_time = None
+    if args.duration is not None:
+        end_time = datetime.now() + timedelta(minutes=args.duration)
+
+    try:
+        if args.user is None:
+            added = run_scheduler(
+                limit=args.limit, end_time=end_time, workers=args.workers
+            )
+        elif args.year is None:
+            added = run_crawl_job(
+                args.user,
+                "missing",
+                lambda: iter_map_ids_without_score(args.user, in_database=True),
+                limit=args.limit,
+                end_time=end_time,
+                workers=args.workers,
+            )
+        else:
+            added = run_crawl_job(
+                args.user,
+                f"year-{args.year}",
+                lambda: get_map_ids_for_year(args.year),
+                limit=args.limit,
+                end_time=end_time,
+                workers=args.workers,
+            )
+    finally:
+        metrics.emit()
+    report("finished", f"Added {added} scores to database", scores=added)
+
+
+def track_leaderboards_command(args: argparse.Namespace) -> None:
+    get_api()  # fail before starting if the client is not configured
+    end_time = None
+    if args.duration is not None:
+        end_time = datetime.now() + timedelta(minutes=args.duration)
+
+    try:
+        read, changed = track_leaderboards(
+            limit=args.limit, end_time=end_time, workers=args.workers
+        )
+    finally:
+        metrics.emit()
+    report(
+        "finished",
+        f"Read {read} leaderboards, {changed} changed",
+        leaderboards=read,
+        changed=changed,
+    )
+
+
+def leaderboard_drops_command(args: argparse.Namespace) -> None:
+    since = datetime.now(timezone.utc) - timedelta(days=args.days)
+    drops = get_dropped_out(args.top, since, args.user_ids)
+    for user_id, map_id, best, position, recorded_time in drops:
+        changed = datetime.fromtimestamp(recorded_time, tz=timezone.utc)
+        current = (
+            f"#{position}" if position is not None else f"below #{LEADERBOARD_SIZE}"
+        )
+        report(
+            "dropped",
+            f"{changed:%Y-%m-%d %H:%M} | user {user_id} | map {map_id} | "
+            f"#{best} -> {current}",
+            user_id=user_id,
+            map_id=map_id,
+            best=best,
+            position=position,
+            recorded_time=recorded_time,
+        )
+    report(
+        "finished",
+        f"{len(drops)} scores dropped out of the top {args.top} in the last "
+        f"{args.days} days",
+        scores=len(drops),
+    )
+
+
+def export_command(args: argparse.Namespace) -> None:
+    path = args.output
+    if path is None:
+        users = "-".join(map(str, args.user_ids or [])) or "all"
+        extension = "csv" if args.format == "csv" else COLUMNAR_EXTENSION
+        path = f"export/scores-{users}.{extension}"
+
+    exported = export_scores(
+        path,
+        user_ids=args.user_ids,
+        year=args.year,
+        mods=args.mods,
+        played_only=args.played_only,
+        format=args.format,
+    )
+    report(
+        "exported",
+        f"Exported {exported} scores to {path}",
+        scores=exported,
+        path=path,
+    )
+
+
+def stats_command(args: argparse.Namespace) -> None:
+    if args.json:
+        print(json.dumps(get_stats()))
+    else:
+        show_stats()
+
+
+def improvements_command(args: argparse.Namespace) -> None:
+    improvements = get_improvements(args.user, args.since, args.until)
+    for score, previous in improvements:
+        submitted = datetime.fromtimestamp(score.submit_time, tz=timezone.utc)
+        change = (
+            f"{previous.score} -> {score.score} ({score.score - previous.score:+})"
+            if previous is not None
+            else f"new {score.score}"
+        )
+        report(
+            "improvement",
+            f"{submitted:%Y-%m-%d %H:%M} | map {score.map_id} | {change} | "
+            f"{score.pp or 0:.0f}pp",
+            score=score._asdict(),
+            previous=previous._asdict() if previous is not None else None,
+        )
+    report(
+        "finished",
+        f"{len(improvements)} scores set by user {args.user}",
+        scores=len(improvements),
+    )
+
+
+def search_command(args: argparse.Namespace) -> None:
+    filters = BrowseFilter(
+        user_id=args.user,
+        search=" ".join(args.text),
+        played=args.played,
+        ranked_only=args.ranked,
+        min_stars=args.min_stars,
+        max_stars=args.max_stars,
+        min_length=args.min_length,
+        max_length=args.max_length,
+        year=args.year,
+    )
+    total = count_rows(filters)
+    rows = get_page(filters, args.sort, not args.ascending, args.limit)
+    for row in rows:
+        map = dict(zip(COLUMNS, row))
+        ranked = datetime.fromtimestamp(map["ranked_time"], tz=timezone.utc)
+        played = (
+            f" | {map['score']} ({map['accuracy']:.2%}, {map['pp']:.0f}pp)"
+            if map["score"] > 0
+            else ""
+        )
+        report(
+            "map",
+            f"{map['map_id']} | {map['artist']} - {map['title']} "
+            f"[{map['diff_name']}] ({map['mapper']}) | {map['stars']:.2f}* | "
+            f"{map['length'] // 60}:{map['length'] % 60:02} | "
+            f"{ranked:%Y-%m-%d}{played}",
+            **map,
+        )
+    report(
+        "finished",
+        f"Showing {len(rows)} of {total} matching maps",
+        maps=len(rows),
+        total=total,
+    )
+
 
+def analyse_command(args: argparse.Namespace) -> None:
+    from score_tracker import analytics
 
-def main() -> None:
-    initialise_database()
-    user_id = start()
-    while show_options(user_id) != "QUIT":
-        continue
+    scores = analytics.load_scores(args.user)
+    analysis = {
+        "user_id": args.user,
+        "scores": len(scores),
+        "weighted_pp": round(analytics.weighted_pp(scores), 3),
+        "accuracy": analytics.accuracy_percentiles(scores),
+        "missing": analytics.missing_by_period(
+            analytics.load_maps(ranked_only=True),
+            scores,
+            "Y" if args.period == "year" else "M",
+        ),
+    }
+    if args.compare is not None:
+        analysis["comparison"] = analytics.compare_users(
+            scores, analytics.load_scores(args.compare)
+        )
+
+    if args.json:
+        print(json.dumps(analysis))
+    else:
+        show_analysis(analysis)
+
+
+def show_analysis(analysis: dict) -> None:
+    print(
+        f"User {analysis['user_id']}: {analysis['scores']} scores | "
+        f"{analysis['weighted_pp']:.0f}pp"
+    )
+    print("Accuracy by star rating:")
+    for band in analysis["accuracy"]:
+        percentiles = " | ".join(
+            f"p{percentile:g} {accuracy:.2%}"
+            for percentile, accuracy in band["percentiles"].items()
+        )
+        print(f"  {band['stars']}*+: {band['count']} scores | {percentiles or '-'}")
+    print("Ranked maps not played:")
+    for period in analysis["missing"]:
+        print(
+            f"  {period['period']}: {period['missing']} of {period['maps']} "
+            f"({period['played']} played)"
+        )
+
+    if (comparison := analysis.get("comparison")) is not None:
+        first, second = comparison["users"]
+        print(
+            f"Compared with user {second}: {comparison['common']} maps both "
+            f"played | only {first} {comparison['only_played'][0]} | "
+            f"only {second} {comparison['only_played'][1]}"
+        )
+        print(
+            f"  Higher score: {first} {comparison['higher_score'][0]} | "
+            f"{second} {comparison['higher_score'][1]} | "
+            f"accuracy {comparison['mean_accuracy_difference']:+.2%} | "
+            f"pp {comparison['mean_pp_difference']:+.1f} per map | "
+            f"weighted pp {comparison['weighted_pp'][0]:.0f} vs "
+            f"{comparison['weighted_pp'][1]:.0f}"
+        )
 
 
 def initialise_database() -> None:
     create_map_table()
+    create_search_table()
     create_score_table()
+    create_job_tables()
+    create_sync_table()
+    create_user_tables()
+    create_stats_tables()
+    create_history_table()
+    create_leaderboard_tables()
+
+
+def profile_startup() -> None:
+    """Print the time spent importing the program, preparing the database and
+    building each api client."""
+    print(f"Imports: {_IMPORT_TIME * 1000:.1f} ms")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"Loaded before first api call: {', '.join(loaded) or 'none'}")
+
+    for name, step in (
+        ("Database", initialise_database),
+        ("Response cache", get_cache),
+        ("API v1 client", get_api_v1),
+        ("API v2 client", get_api),
+    ):
+        start_time = perf_counter()
+        try:
+            step()
+        except Exception as error:
+            print(f"{name}: failed after {(perf_counter() - start_time) * 1000:.1f} ms")
+            print(f"  {type(error).__name__}: {error}")
+        else:
+            print(f"{name}: {(perf_counter() - start_time) * 1000:.1f} ms")
 
 
 def start() -> int:
@@ -49,9 +700,10 @@ def show_options(user_id: int) -> None:
     print("2. Get scores on all maps in database")
     print("3. Export scores into CSV file")
     print("4. Show stats")
-    print("5. Quit")
+    print("5. Tracked users")
+    print("6. Quit")
     print()
-    response = get_input(["1", "2", "3", "4", "5"])
+    response = get_input(["1", "2", "3", "4", "5", "6"])
     print()
 
     if response == "1":
@@ -59,17 +711,109 @@ def show_options(user_id: int) -> None:
     elif response == "2":
         score_options(user_id)
     elif response == "3":
-        ...
-        # export_scores_as_csv(user_id)
+        export_options(user_id)
     elif response == "4":
         show_stats()
     elif response == "5":
+        tracked_user_options()
+    elif response == "6":
         return "QUIT"
 
 
+def get_stats() -> dict:
+    """Counts of stored maps and scores, and the statistics and remaining work
+    of each tracked user."""
+    user_ids = get_tracked_user_ids()
+    stats = {
+        "maps": get_map_count(),
+        "ranked_maps": get_ranked_map_count(),
+        "scores": get_score_count(),
+        "scores_in_database": get_score_in_database_count(),
+        "cache": None,
+        "users": [
+            {
+                "user_id": user_id,
+                "remaining": remaining,
+                "eta_seconds": eta.total_seconds(),
+                **get_user_stats(user_id),
+                "completion": {
+                    category: get_user_completion(user_id, category)
+                    for category in ("year", "stars")
+                },
+                "grades": get_user_counts(user_id, "grade"),
+                "mods": get_user_counts(user_id, "mods"),
+            }
+            for user_id, (remaining, eta) in estimate_completion(user_ids).items()
+        ],
+    }
+    if (cache_stats := get_cache_stats()) is not None:
+        stats["cache"] = asdict(cache_stats)
+    return stats
+
+
 def show_stats():
-    print(f"Maps in database: {get_map_count()} | {get_ranked_map_count()}")
-    print(f"Scores in database: {get_score_in_database_count()} | {get_score_count()}")
+    stats = get_stats()
+    print(f"Maps in database: {stats['maps']} | {stats['ranked_maps']}")
+    print(f"Scores in database: {stats['scores_in_database']} | {stats['scores']}")
+
+    if (cache := stats["cache"]) is not None:
+        print(
+            f"API cache: {cache['hits']} hits | {cache['misses']} misses | "
+            f"{cache['revalidations']} revalidated | {cache['evictions']} evicted"
+        )
+
+    for user in stats["users"]:
+        eta = timedelta(seconds=round(user["eta_seconds"]))
+        print(
+            f"User {user['user_id']}: {user['played']}/{stats['maps']} played | "
+            f"{user['remaining']} maps to check | ETA {eta}"
+        )
+        print(
+            f"  {user['weighted_pp']:.0f}pp ({user['total_pp']:.0f}pp total) | "
+            f"{user['accuracy']:.2%} accuracy | {user['fc_count']} FCs | "
+            f"{user['total_score']} total score"
+        )
+        print(
+            "  Grades: "
+            + " | ".join(f"{grade} {count}" for grade, count in user["grades"].items())
+        )
+        for category, label in (("stars", "Stars"), ("year", "Year")):
+            print(
+                f"  {label}: "
+                + " | ".join(
+                    f"{key}{'*' if category == 'stars' else ''} {played}/{total}"
+                    for key, played, total in user["completion"][category]
+                )
+            )
+
+
+def tracked_user_options() -> None:
+    print("1. List tracked users")
+    print("2. Track a user")
+    print("3. Stop tracking a user")
+    print("4. Get scores for all tracked users")
+    print("5. Get scores for all tracked users for the next specified amount of time")
+    print()
+    response = get_input(["1", "2", "3", "4", "5"])
+    print()
+
+    if response == "1":
+        for user_id in get_tracked_user_ids():
+            print(f"User {user_id}")
+    elif response == "2":
+        user_id = get_user_id()
+        if track_user(user_id):
+            print(f"Tracking user {user_id}")
+        else:
+            print(f"ERROR: user {user_id} does not exist")
+    elif response == "3":
+        remove_tracked_user(get_user_id())
+    elif response == "4":
+        run_scheduler()
+        print("Finished adding scores to database")
+    elif response == "5":
+        run_scheduler(end_time=datetime.now() + get_duration())
+        print("Finished adding scores to database")
 
 
 def map_options() -> None:
@@ -84,75 +828,97 @@ def map_options() -> None:
 
     if response == "1":
         remove_all_maps()
-        maps = get_leaderboard_maps()
-        fill_map_table(maps)
+        sync_maps(full=True)
     elif response == "2":
-        since = get_latest_leaderboard_map()
-        maps = get_leaderboard_maps(since=since)
-        fill_map_table(maps)
+        sync_maps()
     elif response == "3":
         remove_all_maps()
-        maps = [map for map in get_leaderboard_maps() if map.approved in ["1", "2"]]
-        fill_map_table(maps)
+        sync_maps(ranked_only=True, full=True)
     elif response == "4":
-        since = get_latest_ranked_map()
-        maps = [
-            map
-            for map in get_leaderboard_maps(since=since)
-            if map.approved in ["1", "2"]
-        ]
-        fill_map_table(maps)
+        sync_maps(ranked_only=True)
     elif response == "5":
         remove_all_maps()
 
 
+def export_options(user_id: int) -> None:
+    print("1. Export scores as CSV")
+    print("2. Export scores in compact columnar format")
+    print()
+    response = get_input(["1", "2"])
+    print()
+
+    if response == "1":
+        path = f"export/scores-{user_id}.csv"
+        exported = export_scores(path, user_ids=[user_id], format="csv")
+    elif response == "2":
+        path = f"export/scores-{user_id}.{COLUMNAR_EXTENSION}"
+        exported = export_scores(path, user_ids=[user_id], format="columnar")
+    print(f"Exported {exported} scores to {path}")
+
+
 def score_options(user_id: int) -> None:
     print("1. Get as many scores as possible")
     print("2. Get scores for the next speficied amount of time")
     print("3. Get specified number of scores")
     print("4. Get scores for particular year")
     print("5. Empty score database")
+    print("6. Import scores from CSV file")
+    print("7. Get best, first place and recent scores, then any missing scores")
     print()
-    response = get_input(["1", "2", "3", "4", "5"])
+    response = get_input(["1", "2", "3", "4", "5", "6", "7"])
     print()
 
     if response == "1":
-        map_ids = get_all_map_ids_without_score()
-        for i, map_id in enumerate(map_ids, start=1):
-            print(f"Adding score for map {map_id} | {i}/{len(map_ids)}")
-            score = get_score(map_id, user_id)
-            add_score(score)
+        run_crawl_job(user_id, "all", lambda: iter_map_ids_without_score(user_id))
         print("Finished adding scores to database")
     elif response == "2":
-        duration = get_duration()
-        starting_time = datetime.now()
-        end_time = starting_time + duration
-        map_ids = get_all_map_ids_without_score_in_database()
-        i = 0
-        while (now := datetime.now()) < end_time and i < len(map_ids):
-            print(f"Adding score for map {map_ids[i]} | {end_time - now} remaining")
-            score = get_score(map_ids[i], user_id)
-            add_score(score)
-            i += 1
+        end_time = datetime.now() + get_duration()
+        run_crawl_job(
+            user_id,
+            "missing",
+            lambda: iter_map_ids_without_score(user_id, in_database=True),
+            end_time=end_time,
+        )
         print("Finished adding scores to database")
     elif response == "3":
         amount = get_positive_integer()
-        map_ids = get_all_map_ids_without_score_in_database()
-        for i in range(amount):
-            print(f"Adding score for map {map_ids[i]} | {i+1}/{amount}")
-            score = get_score(map_ids[i], user_id)
-            add_score(score)
+        run_crawl_job(
+            user_id,
+            "missing",
+            lambda: iter_map_ids_without_score(user_id, in_database=True),
+            limit=amount,
+        )
         print("Finished adding scores to database")
     elif response == "4":
         year = get_year()
-        map_ids = get_map_ids_for_year(year)
-        for i, map_id in enumerate(map_ids, start=1):
-            print(f"Adding score for map {map_id} | {i}/{len(map_ids)}")
-            score = get_score(map_id, user_id)
-            add_score(score)
+        run_crawl_job(user_id, f"year-{year}", lambda: get_map_ids_for_year(year))
         print("Finished adding scores to database")
     elif response == "5":
         remove_all_scores()
+        remove_all_jobs()
+    elif response == "6":
+        import_options()
+    elif response == "7":
+        collect_scores(user_id)
+        print("Finished adding scores to database")
+
+
+def import_options() -> None:
+    path = input("Enter path of CSV file: ")
+    print()
+    print("1. Keep stored scores")
+    print("2. Replace stored scores")
+    print("3. Keep the score with the higher score")
+    print("4. Keep the score with the higher pp")
+    print()
+    response = get_input(["1", "2", "3", "4"])
+    print()
+
+    policy = ["ignore", "replace", "best-score", "best-pp"][int(response) - 1]
+    report = import_scores_from_csv(path, on_conflict=policy)
+    for line_number, reason in report.rejected:
+        print(f"Rejected line {line_number}: {reason}")
+    print(f"Imported {report.imported} scores, rejected {len(report.rejected)}")
 
 
 def get_year() -> int:
@@ -218,3 +984,46 @@ def get_positive_integer() -> int:
             break
 
     return int(result)
+
+
+def _positive_integer_argument(value: str) -> int:
+    if not value.isnumeric() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"{repr(value)} is not a positive integer")
+    return int(value)
+
+
+def _year_argument(value: str) -> int:
+    if not value.isnumeric() or not 2007 <= int(value) <= datetime.now().year:
+        raise argparse.ArgumentTypeError(
+            f"{repr(value)} is not a year from 2007 to {datetime.now().year}"
+        )
+    return int(value)
+
+
+def _stars_argument(value: str) -> float:
+    try:
+        stars = float(value)
+    except ValueError:
+        stars = -1.0
+    if not 0 <= stars < 100:
+        raise argparse.ArgumentTypeError(f"{repr(value)} is not a star rating")
+    return stars
+
+
+def _date_argument(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{repr(value)} is not a YYYY-MM-DD date")
+
+
+def _mods_argument(value: str) -> int:
+    if value.isnumeric():
+        return int(value)
+
+    from ossapi import Mod
+
+    try:
+        return Mod(value).value
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{repr(value)} is not a mod combination")
@@ -1,14 +1,124 @@
-from typing import Final
+"""Api clients, built on first use so ossapi is only imported when needed."""
+
 import os
+import threading
+from functools import wraps
+from typing import TYPE_CHECKING, Callable
+
+from score_tracker.controllers.utils import configure_rate_limit
+
+if TYPE_CHECKING:
+    from ossapi import Ossapi, OssapiV1
+    from requests.adapters import HTTPAdapter
+
+    from score_tracker.controllers.cache import CacheStats, ResponseCache
+
+
+def _memoized[T](factory: Callable[[], T]) -> Callable[[], T]:
+    """Call `factory` once, on first use, and return its result from then on.
+    Safe to call from several threads at once."""
+    lock = threading.Lock()
+    result: list[T] = []
+
+    @wraps(factory)
+    def wrapper() -> T:
+        if not result:
+            with lock:
+                if not result:
+                    result.append(factory())
+        return result[0]
+
+    def override(value: T) -> None:
+        with lock:
+            result[:] = [value]
+
+    wrapper.built = lambda: bool(result)
+    wrapper.override = override
+    return wrapper
+
+
+@_memoized
+def load_settings() -> None:
+    """Read `.env` and configure the rate limiters from the environment."""
+    from dotenv import load_dotenv
+
+    load_dotenv(".env")
+    configure_rate_limit(
+        "v1",
+        rate=float(os.environ.get("API_V1_RATE_LIMIT", 1)),
+        burst=int(os.environ.get("API_V1_BURST", 1)),
+    )
+    configure_rate_limit(
+        "v2",
+        rate=float(os.environ.get("API_RATE_LIMIT", 1)),
+        burst=int(os.environ.get("API_BURST", 1)),
+    )
+    configure_rate_limit(
+        "leaderboards",
+        rate=float(os.environ.get("LEADERBOARD_RATE_LIMIT", 0.2)),
+        burst=int(os.environ.get("LEADERBOARD_BURST", 1)),
+    )
+
+
+@_memoized
+def get_cache() -> "ResponseCache | None":
+    """The response cache shared by both clients, or None if disabled."""
+    load_settings()
+    path = os.environ.get("API_CACHE_PATH", "cache.sqlite")
+    if not path:
+        return None
+
+    from score_tracker.controllers.cache import ResponseCache
+
+    size = int(os.environ.get("API_CACHE_SIZE_MB", 256)) * 2**20
+    return ResponseCache(path, size)
+
+
+@_memoized
+def _get_adapter() -> "HTTPAdapter":
+    from score_tracker.controllers.cache import CachingAdapter, PacedAdapter
+
+    cache = get_cache()
+    return CachingAdapter(cache) if cache else PacedAdapter()
+
+
+@_memoized
+def get_api_v1() -> "OssapiV1":
+    """Client of the legacy api, using the cache and rate limiters."""
+    from score_tracker.controllers.clients import CachedOssapiV1
+
+    load_settings()
+    if not (key := os.environ.get("LEGACY_OSU_API_KEY")):
+        raise RuntimeError("LEGACY_OSU_API_KEY is not set")
+    return CachedOssapiV1(key, _get_adapter())
+
+
+@_memoized
+def get_api() -> "Ossapi":
+    """Client of the v2 api, using the cache and rate limiters."""
+    from score_tracker.controllers.clients import CachedOssapi
+
+    load_settings()
+    client_id = os.environ.get("CLIENT_ID")
+    client_secret = os.environ.get("CLIENT_SECRET")
+    if not client_id or not client_secret:
+        raise RuntimeError("CLIENT_ID and CLIENT_SECRET are not set")
+    return CachedOssapi(int(client_id), client_secret, _get_adapter())
 
-from dotenv import load_dotenv
-from ossapi import Ossapi, OssapiV1
 
-load_dotenv(".env")
+def set_clients(api: "Ossapi | None" = None, api_v1: "OssapiV1 | None" = None) -> None:
+    """Use `api` and `api_v1` instead of building the clients, such as the
+    stand-ins used by the benchmarks."""
+    if api is not None:
+        get_api.override(api)
+    if api_v1 is not None:
+        get_api_v1.override(api_v1)
 
-_API_LEGACY_KEY: Final[str] = os.environ.get("LEGACY_OSU_API_KEY")
-_API_CLIENT_ID: Final[int] = int(os.environ.get("CLIENT_ID"))
-_API_CLIENT_SECRET: Final[str] = os.environ.get("CLIENT_SECRET")
 
-API_V1 = OssapiV1(_API_LEGACY_KEY)
-API = Ossapi(_API_CLIENT_ID, _API_CLIENT_SECRET)
+def get_cache_stats() -> "CacheStats | None":
+    """Statistics of the response cache, or None if it is disabled or has not
+    been used yet."""
+    if not get_cache.built():
+        return None
+    cache = get_cache()
+    return cache.stats if cache else None
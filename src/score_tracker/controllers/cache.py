@@ -0,0 +1,316 @@
+import json
+import re
+import sqlite3 as sql
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from time import time
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from score_tracker.controllers.utils import pace_request
+from score_tracker.metrics import endpoint_name, timed
+
+# statuses worth caching: 404 is how the api says a user has no score on a map
+CACHED_STATUS_CODES = frozenset({200, 404})
+# headers kept with a cached response, including the validators used to
+# revalidate it once it expires
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# query parameters that must not end up in the cache, such as the v1 api key
+PRIVATE_PARAMS = frozenset({"k"})
+
+FOREVER = timedelta(days=3650)
+# most maps the v1 api returns for one `get_beatmaps` request
+BEATMAPS_PAGE_SIZE = 500
+
+
+def _beatmaps_page_ttl(params: dict[str, str], body: bytes) -> timedelta:
+    """A full page of maps all approved over a month ago only changes when a
+    map's status changes, which a full sync does not need to notice straight
+    away. A shorter page ends at the newest maps and grows as maps are
+    approved."""
+    try:
+        maps = json.loads(body)
+        size = int(params.get("limit") or BEATMAPS_PAGE_SIZE)
+        newest = datetime.fromisoformat(max(map["approved_date"] for map in maps))
+    except (ValueError, TypeError, KeyError):
+        return timedelta(hours=1)
+    if len(maps) < size:
+        return timedelta(hours=1)
+    if newest.tzinfo is None:
+        newest = newest.replace(tzinfo=timezone.utc)
+    if newest < datetime.now(timezone.utc) - timedelta(days=30):
+        return FOREVER
+    return timedelta(hours=1)
+
+
+# how long responses stay fresh, by path; paths not listed are not cached
+TTLS: tuple[tuple[re.Pattern, timedelta | Callable], ...] = (
+    (re.compile(r"/api/get_beatmaps$"), _beatmaps_page_ttl),
+    (re.compile(r"/beatmaps/\d+/scores/users/\d+$"), timedelta(days=1)),
+    (re.compile(r"/beatmaps/\d+/scores$"), timedelta(hours=1)),
+    (re.compile(r"/users/\d+/scores/\w+$"), timedelta(minutes=10)),
+    (re.compile(r"/users/\d+(/\w+)?$"), timedelta(days=1)),
+)
+
+
+def is_cached(url: str) -> bool:
+    """Whether responses to `url` are cached."""
+    path = urlsplit(url).path
+    return any(pattern.search(path) for pattern, _ in TTLS)
+
+
+def get_ttl(url: str, body: bytes) -> timedelta | None:
+    """How long the response `body` to `url` stays fresh, or None if it is not
+    cached."""
+    parts = urlsplit(url)
+    for pattern, ttl in TTLS:
+        if pattern.search(parts.path):
+            return ttl(dict(parse_qsl(parts.query)), body) if callable(ttl) else ttl
+    return None
+
+
+def cache_key(url: str) -> str:
+    """`url` with its query parameters sorted and private ones removed."""
+    parts = urlsplit(url)
+    params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in PRIVATE_PARAMS
+    )
+    return f"{parts.netloc}{parts.path}?{urlencode(params)}"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    expires_time: float
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_time > time()
+
+
+class ResponseCache:
+    """Persistent cache of api responses, kept in its own SQLite file.
+
+    Least recently used responses are evicted once the bodies take up more
+    than `max_bytes`. Safe to share between threads."""
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+        self._connection = sql.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL;")
+        self._connection.execute("PRAGMA synchronous = NORMAL;")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                expires_time REAL,
+                accessed_time REAL
+            );
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE INDEX IF NOT EXISTS responses_accessed_time
+            ON responses (accessed_time);
+            """
+        )
+        self._connection.commit()
+        self._size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses;"
+        ).fetchone()[0]
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            row = self._connection.execute(
+                """
+                SELECT status, headers, body, expires_time FROM responses
+                WHERE key = ?;
+                """,
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed_time = ? WHERE key = ?;",
+                (time(), key),
+            )
+            self._connection.commit()
+        return CachedResponse(row[0], json.loads(row[1]), row[2], row[3])
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        size = len(response.body)
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?;", (key,)
+            ).fetchone()
+            self._connection.execute(
+                """
+                INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?);
+                """,
+                (
+                    key,
+                    response.status,
+                    json.dumps(response.headers),
+                    response.body,
+                    size,
+                    response.expires_time,
+                    time(),
+                ),
+            )
+            self._size += size - (previous[0] if previous else 0)
+            self._stats.stores += 1
+            self._evict()
+            self._connection.commit()
+
+    def refresh(self, key: str, expires_time: float) -> None:
+        """Extend the lifetime of a response the api confirmed is unchanged."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE responses SET expires_time = ? WHERE key = ?;",
+                (expires_time, key),
+            )
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses;")
+            self._connection.commit()
+            self._size = 0
+
+    def record(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self._stats, name, getattr(self._stats, name) + count)
+
+    def _evict(self) -> None:
+        """Delete least recently used responses until under `max_bytes`."""
+        while self._size > self.max_bytes:
+            rows = self._connection.execute(
+                """
+                SELECT key, size FROM responses
+                ORDER BY accessed_time ASC LIMIT 100;
+                """
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    return
+                self._connection.execute("DELETE FROM responses WHERE key = ?;", (key,))
+                self._size -= size
+                self._stats.evictions += 1
+
+
+def _is_error(response: Response) -> bool:
+    """Whether a successful response carries an api error, such as the v1 api
+    asking to slow down, which must not be served again."""
+    return response.status_code == 200 and response.content.lstrip().startswith(
+        b'{"error"'
+    )
+
+
+class PacedAdapter(HTTPAdapter):
+    """Transport adapter waiting for the rate limiter of the api call in
+    progress before every request it sends, and recording the latency of each
+    request by endpoint."""
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        pace_request()
+        with timed(endpoint_name(request.method, request.url)):
+            return super().send(request, **kwargs)
+
+
+class CachingAdapter(PacedAdapter):
+    """`PacedAdapter` answering GET requests from a `ResponseCache` when it
+    can, and revalidating expired responses with their ETag or Last-Modified
+    header. Only requests that reach the network are rate limited."""
+
+    def __init__(self, cache: ResponseCache, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        if request.method != "GET" or not is_cached(request.url):
+            return super().send(request, **kwargs)
+
+        key = cache_key(request.url)
+        cached = self.cache.get(key)
+        if cached is not None and cached.fresh:
+            self.cache.record(hits=1)
+            return self._build_response(request, cached)
+
+        if cached is not None:
+            if etag := cached.headers.get("ETag"):
+                request.headers["If-None-Match"] = etag
+            if last_modified := cached.headers.get("Last-Modified"):
+                request.headers["If-Modified-Since"] = last_modified
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            ttl = get_ttl(request.url, cached.body)
+            self.cache.refresh(key, time() + ttl.total_seconds())
+            self.cache.record(revalidations=1)
+            return self._build_response(request, cached)
+
+        self.cache.record(misses=1)
+        if response.status_code in CACHED_STATUS_CODES and not _is_error(response):
+            headers = {
+                name: response.headers[name]
+                for name in CACHED_HEADERS
+                if name in response.headers
+            }
+            ttl = get_ttl(request.url, response.content)
+            self.cache.put(
+                key,
+                CachedResponse(
+                    response.status_code,
+                    headers,
+                    response.content,
+                    time() + ttl.total_seconds(),
+                ),
+            )
+        return response
+
+    def _build_response(
+        self, request: PreparedRequest, cached: CachedResponse
+    ) -> Response:
+        response = Response()
+        response.status_code = cached.status
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response._content = cached.body
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
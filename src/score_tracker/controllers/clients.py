@@ -0,0 +1,66 @@
+from ossapi import Ossapi, OssapiV1
+from ossapi.ossapi import (
+    APIException,
+    InvalidKeyException,
+    ReplayUnavailableException,
+)
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from score_tracker.controllers.utils import raise_for_retryable_status
+
+
+class CachedOssapiV1(OssapiV1):
+    """`OssapiV1` sending its requests through a session mounting `adapter`,
+    instead of `requests.get`. Request errors are left to the rate limiters to
+    retry, and api errors raise the same exceptions as in `OssapiV1`."""
+
+    def __init__(self, key: str, adapter: HTTPAdapter) -> None:
+        super().__init__(key)
+        self.session = Session()
+        self.session.mount("https://", adapter)
+
+    def _get(self, endpoint, params, type_, list_=False, _beatmap_id=None):
+        params["k"] = self._key
+        data = self.session.get(
+            f"{self.BASE_URL}{endpoint}", params=params, timeout=self.TIMEOUT
+        ).json()
+
+        if isinstance(data, dict) and "error" in data:
+            if data["error"] == "Requesting too fast! Slow your operation, cap'n!":
+                self._enforce_ratelimit()
+                return self._get(endpoint, params, type_, list_, _beatmap_id)
+            if data["error"] == "Please provide a valid API key.":
+                raise InvalidKeyException()
+            if data["error"] in ("Replay not available.", "Replay retrieval failed."):
+                raise ReplayUnavailableException(data["error"])
+            raise APIException(data["error"])
+
+        if not list_:
+            return type_(data)
+        if _beatmap_id:
+            for entry in data:
+                entry["beatmap_id"] = _beatmap_id
+        return [type_(entry) for entry in data]
+
+
+class CachedOssapi(Ossapi):
+    """`Ossapi` whose sessions mount `adapter`, and raise on 429 and 5xx
+    responses so they can be retried. Ossapi replaces its session when
+    re-authenticating, hence the property."""
+
+    def __init__(
+        self, client_id: int, client_secret: str, adapter: HTTPAdapter
+    ) -> None:
+        self._adapter = adapter
+        super().__init__(client_id, client_secret)
+
+    @property
+    def session(self) -> Session:
+        return self._session
+
+    @session.setter
+    def session(self, session: Session) -> None:
+        session.mount("https://", self._adapter)
+        session.hooks["response"].append(raise_for_retryable_status)
+        self._session = session
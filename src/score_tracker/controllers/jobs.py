@@ -0,0 +1,134 @@
+from datetime import datetime
+from functools import partial
+from itertools import islice, takewhile
+from threading import Event
+from typing import Callable, Iterable
+
+from score_tracker import metrics
+from score_tracker.controllers.scores import fetch_scores
+from score_tracker.controllers.writer import BatchWriter
+from score_tracker.models.jobs import (
+    create_job,
+    finish_job,
+    get_active_job,
+    get_job_progress,
+    get_pending_map_ids,
+    get_retry_map_ids,
+    mark_map_done,
+    mark_map_failed,
+)
+from score_tracker.models.scores import add_score
+from score_tracker.models.users import record_score_check
+from score_tracker.models.utils import ScoreRecord
+from score_tracker.progress import report
+
+
+def _store_job_score(job_id: int, record: ScoreRecord) -> None:
+    add_score(record)
+    record_score_check(record.user_id, record.map_id)
+    mark_map_done(job_id, record.map_id)
+
+
+def run_crawl_job(
+    user_id: int,
+    name: str,
+    get_map_ids: Callable[[], Iterable[int]],
+    limit: int | None = None,
+    end_time: datetime | None = None,
+    max_attempts: int = 3,
+    workers: int = 4,
+    stop: Event | None = None,
+) -> int:
+    """Get scores of a user on the maps of the crawl job `name`.
+
+    Resumes the unfinished job of that name if there is one, otherwise creates
+    it from `get_map_ids()`. Stops after `limit` maps, at `end_time` or once
+    `stop` is set. Maps that fail are retried after every pending map has been
+    attempted.
+
+    Returns the number of scores added."""
+    job_id = get_active_job(user_id, name)
+    if job_id is None:
+        job_id = create_job(user_id, name, get_map_ids())
+    else:
+        report(
+            "resume",
+            f"Resuming job {repr(name)} for user {user_id}",
+            user_id=user_id,
+            job=name,
+        )
+
+    added = 0
+    remaining = limit
+    throughput = metrics.Throughput()
+
+    with BatchWriter() as writer:
+        for attempt in range(max_attempts):
+            # retries are only known once the failures are written
+            writer.flush()
+            # each map is counted once it is settled, however many passes it takes
+            done, total = get_job_progress(job_id)
+            map_ids = get_pending_map_ids(job_id) if attempt == 0 else []
+            map_ids += get_retry_map_ids(job_id)
+            if not map_ids:
+                break
+
+            map_ids = iter(map_ids)
+            if end_time is not None:
+                map_ids = takewhile(lambda _: datetime.now() < end_time, map_ids)
+            if stop is not None:
+                map_ids = takewhile(lambda _: not stop.is_set(), map_ids)
+            if remaining is not None:
+                map_ids = islice(map_ids, remaining)
+
+            scores = fetch_scores(map_ids, user_id, workers, return_exceptions=True)
+            for map_id, score in scores:
+                if isinstance(score, Exception):
+                    report(
+                        "error",
+                        f"Failed to get score for map {map_id} | {score}",
+                        user_id=user_id,
+                        map_id=map_id,
+                        error=str(score),
+                    )
+                    writer.put(
+                        partial(
+                            mark_map_failed, job_id, map_id, repr(score), max_attempts
+                        )
+                    )
+                    metrics.increment("errors")
+                    continue
+
+                writer.put(partial(_store_job_score, job_id, score))
+                done += 1
+                added += 1
+                if remaining is not None:
+                    remaining -= 1
+                metrics.increment("scores")
+                throughput.add()
+
+                eta = throughput.eta(total - done if remaining is None else remaining)
+                if eta is not None and end_time is not None:
+                    eta = min(eta, end_time - datetime.now())
+                report(
+                    "score",
+                    f"Adding score for map {map_id} | {done}/{total} | "
+                    f"ETA {eta if eta is not None else '-'}",
+                    user_id=user_id,
+                    map_id=map_id,
+                    done=done,
+                    total=total,
+                    eta_seconds=eta.total_seconds() if eta is not None else None,
+                )
+                metrics.maybe_emit()
+
+            if (
+                remaining == 0
+                or (end_time is not None and datetime.now() >= end_time)
+                or (stop is not None and stop.is_set())
+            ):
+                return added
+
+    if not get_pending_map_ids(job_id) and not get_retry_map_ids(job_id):
+        finish_job(job_id)
+    return added
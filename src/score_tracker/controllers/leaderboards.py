@@ -0,0 +1,144 @@
+"""Tracking where tracked users' scores stand on map leaderboards."""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from itertools import islice, takewhile
+from threading import Event
+from typing import TYPE_CHECKING, Iterator
+
+from score_tracker import metrics
+from score_tracker.controllers.api import get_api
+from score_tracker.controllers.scores import fetch_concurrently
+from score_tracker.controllers.utils import rate_limit
+from score_tracker.controllers.writer import BatchWriter
+from score_tracker.models.leaderboards import (
+    get_due_map_count,
+    get_due_maps,
+    record_leaderboard,
+)
+from score_tracker.progress import report
+
+if TYPE_CHECKING:
+    from ossapi import BeatmapScores
+
+# most scores the api returns for one leaderboard
+LEADERBOARD_SIZE = 100
+# how long after a change a leaderboard is read again, and the longest an
+# unchanged leaderboard goes unread
+MIN_INTERVAL = timedelta(days=1)
+MAX_INTERVAL = timedelta(days=28)
+
+
+@rate_limit("leaderboards")
+def _beatmap_scores(map_id: int) -> "BeatmapScores":
+    """Rate-limited variant of `Ossapi.beatmap_scores`."""
+    from ossapi import GameMode
+
+    return get_api().beatmap_scores(map_id, mode=GameMode.OSU, limit=LEADERBOARD_SIZE)
+
+
+def get_leaderboard(map_id: int) -> list[tuple[int, int]]:
+    """Retrieves `(score_id, user_id)` of the top scores on a map, best
+    first, or an empty list if the map has no leaderboard."""
+    try:
+        scores = _beatmap_scores(map_id).scores
+    except ValueError:
+        return []
+    return [(score.id, score.user_id) for score in scores]
+
+
+def leaderboard_digest(leaderboard: list[tuple[int, int]]) -> str:
+    """Digest of a leaderboard, changing whenever a score enters, leaves or
+    moves on it."""
+    ids = ",".join(str(score_id) for score_id, _ in leaderboard)
+    return hashlib.blake2b(ids.encode(), digest_size=16).hexdigest()
+
+
+def _positions(leaderboard: list[tuple[int, int]]) -> dict[int, int]:
+    """Each user's best position on a leaderboard, from 1."""
+    positions: dict[int, int] = {}
+    for position, (_, user_id) in enumerate(leaderboard, 1):
+        positions.setdefault(user_id, position)
+    return positions
+
+
+def _due_map_ids(due_time: int) -> Iterator[int]:
+    """Maps due to be read by `due_time`, page by page."""
+    after = None
+    while page := get_due_maps(due_time, after):
+        yield from (map_id for _, map_id in page)
+        after = page[-1]
+
+
+def track_leaderboards(
+    limit: int | None = None,
+    end_time: datetime | None = None,
+    workers: int = 2,
+    stop: Event | None = None,
+) -> tuple[int, int]:
+    """Read the leaderboards due of the maps tracked users have scores on,
+    recording the positions of the users on each that changed.
+
+    Stops after `limit` requests, at `end_time`, once `stop` is set, or when
+    no leaderboard is due.
+    Returns the number of leaderboards read and how many of them changed."""
+    due_time = int(datetime.now(timezone.utc).timestamp())
+    remaining = get_due_map_count(due_time)
+    if limit is not None:
+        remaining = min(remaining, limit)
+    throughput = metrics.Throughput()
+
+    work = _due_map_ids(due_time)
+    if end_time is not None:
+        work = takewhile(lambda _: datetime.now() < end_time, work)
+    if stop is not None:
+        work = takewhile(lambda _: not stop.is_set(), work)
+    if limit is not None:
+        work = islice(work, limit)
+
+    done = 0
+    changed = 0
+
+    def store(map_id: int, leaderboard: list[tuple[int, int]]) -> None:
+        nonlocal changed
+        changed += record_leaderboard(
+            map_id,
+            leaderboard_digest(leaderboard),
+            _positions(leaderboard),
+            int(MIN_INTERVAL.total_seconds()),
+            int(MAX_INTERVAL.total_seconds()),
+        )
+
+    with BatchWriter() as writer:
+        for map_id, leaderboard in fetch_concurrently(
+            get_leaderboard, work, workers, return_exceptions=True
+        ):
+            remaining -= 1
+            if isinstance(leaderboard, Exception):
+                report(
+                    "error",
+                    f"Failed to get leaderboard of map {map_id} | {leaderboard}",
+                    map_id=map_id,
+                    error=str(leaderboard),
+                )
+                metrics.increment("errors")
+                continue
+
+            writer.put(partial(store, map_id, leaderboard))
+            done += 1
+            metrics.increment("leaderboards")
+            throughput.add()
+
+            eta = throughput.eta(remaining)
+            report(
+                "leaderboard",
+                f"Read leaderboard of map {map_id} | {done} done | "
+                f"ETA {eta if eta is not None else '-'}",
+                map_id=map_id,
+                done=done,
+                remaining=remaining,
+                eta_seconds=eta.total_seconds() if eta is not None else None,
+            )
+            metrics.maybe_emit()
+    return done, changed
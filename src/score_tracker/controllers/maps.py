@@ -1,63 +1,149 @@
 from datetime import datetime, timezone, timedelta
+from typing import TYPE_CHECKING, Iterator
 
-from ossapi.ossapi import Beatmap as BeatmapV1
-
+from score_tracker import metrics
 from score_tracker.controllers.utils import rate_limit
-from score_tracker.controllers.api import API_V1
-from score_tracker.models.maps import add_map
+from score_tracker.controllers.api import get_api_v1
+from score_tracker.models.maps import (
+    add_maps,
+    get_latest_leaderboard_map,
+    get_latest_ranked_map,
+    get_map_count,
+    get_sync_watermark,
+    set_sync_watermark,
+    upsert_maps,
+)
+from score_tracker.models.utils import (
+    MapRecord,
+    beatmapv1_into_table_record,
+    transaction,
+)
+from score_tracker.progress import report
+
+if TYPE_CHECKING:
+    from ossapi.ossapi import Beatmap as BeatmapV1
+
+FIRST_MAP_DATE = datetime(2007, 1, 1, tzinfo=timezone.utc)
+LEADERBOARD_STATUSES = ("1", "2", "4")
+RANKED_STATUSES = ("1", "2")
+
+
+@rate_limit("v1")
+def _get_beatmaps(since: datetime) -> "list[BeatmapV1]":
+    """Rate-limited variant of `OssapiV1.get_beatmaps`."""
+    return get_api_v1().get_beatmaps(since=since)
 
 
-@rate_limit
-def _get_beatmaps(since: datetime) -> list[BeatmapV1]:
-    """Rate-limited variant of `OssapiV1.get_beatmaps`."""
-    return API_V1.get_beatmaps(since=since)
+def _ranked_datetime(record: MapRecord) -> datetime:
+    return datetime.fromtimestamp(record.ranked_time, tz=timezone.utc)
 
 
-def get_leaderboard_maps(
-    since: datetime = datetime(2007, 1, 1, tzinfo=timezone.utc),
-    upto: datetime = datetime.now(timezone.utc) + timedelta(days=1),
-) -> list[BeatmapV1]:
-    """Retrieves all maps approved between `since` and `upto` (UTC)"""
+def iter_leaderboard_map_pages(
+    since: datetime = FIRST_MAP_DATE,
+    upto: datetime | None = None,
+    statuses: tuple[str, ...] = LEADERBOARD_STATUSES,
+) -> Iterator[list[MapRecord]]:
+    """Retrieves maps approved between `since` and `upto` (UTC), one page of
+    the api at a time, as records of table `maps`.
 
-    maps: list[BeatmapV1] = []
-    map_id_set: set[int] = set()
+    Only the ids of the previous page are kept to skip maps returned twice."""
+    previous_ids: set[int] = set()
 
     while retrieved := _get_beatmaps(since=since):
-        prev_len = len(maps)
+        retrieved_ids = {map.beatmap_id for map in retrieved}
+        if retrieved_ids <= previous_ids:
+            break
 
+        page = []
         for map in retrieved:
-            if map.beatmap_id in map_id_set:
+            if upto is not None and map.approved_date > upto:
+                yield page
+                return
+            if map.beatmap_id in previous_ids:
                 continue
-            if map.mode != 0:
-                continue
-            if map.approved not in ["1", "2", "4"]:
-                continue
-            if map.approved_date > upto:
-                return maps
-
-            maps.append(map)
-            map_id_set.add(map.beatmap_id)
+            if map.mode == 0 and map.approved in statuses:
+                page.append(beatmapv1_into_table_record(map))
 
-        if len(maps) == prev_len:
-            break
+        yield page
+        previous_ids = retrieved_ids
+        since = retrieved[-1].approved_date - timedelta(seconds=1)
 
-        since = maps[-1].approved_date - timedelta(seconds=1)
-        print(f"Retrieved maps up to {since}: {len(maps)}")
 
+def get_leaderboard_maps(
+    since: datetime = FIRST_MAP_DATE,
+    upto: datetime | None = None,
+) -> list[MapRecord]:
+    """Retrieves all maps approved between `since` and `upto` (UTC)"""
+    maps: list[MapRecord] = []
+    for page in iter_leaderboard_map_pages(since, upto):
+        maps += page
+        if maps:
+            latest = _ranked_datetime(maps[-1])
+            report(
+                "maps",
+                f"Retrieved maps up to {latest}: {len(maps)}",
+                upto=latest,
+                maps=len(maps),
+            )
     return maps
 
 
-def fill_map_table(maps: list[BeatmapV1]) -> None:
+def sync_maps(ranked_only: bool = False, full: bool = False) -> None:
+    """Bring table `maps` up to date with the api.
+
+    Only maps approved after the last sync are requested, unless `full`. Each
+    page is written as soon as it is retrieved, together with the new
+    high-water mark, so an interrupted sync continues where it stopped."""
+    name = "ranked" if ranked_only else "leaderboard"
+    statuses = RANKED_STATUSES if ranked_only else LEADERBOARD_STATUSES
+
+    since = FIRST_MAP_DATE
+    if not full:
+        if watermark := get_sync_watermark(name):
+            since = watermark[0] - timedelta(seconds=1)
+        elif get_map_count():
+            latest = (
+                get_latest_ranked_map if ranked_only else get_latest_leaderboard_map
+            )
+            since = latest() - timedelta(seconds=1)
+
+    added = 0
+    changed = 0
+    for page in iter_leaderboard_map_pages(since, statuses=statuses):
+        if not page:
+            continue
+        latest = _ranked_datetime(page[-1])
+        with metrics.timed("db.write"), transaction():
+            changes = upsert_maps(page)
+            set_sync_watermark(name, latest, page[-1].map_id)
+
+        added += len(page)
+        changed += len(changes)
+        for map_id, old_status, new_status in changes:
+            report(
+                "status",
+                f"Map {map_id} changed status from {old_status} to {new_status}",
+                map_id=map_id,
+                old_status=old_status,
+                new_status=new_status,
+            )
+        report(
+            "maps",
+            f"Retrieved maps up to {latest}: {added}",
+            upto=latest,
+            maps=added,
+        )
+        metrics.maybe_emit()
+
+    report(
+        "synced",
+        f"Synced {added} maps, {changed} with a changed status",
+        maps=added,
+        changed=changed,
+    )
+
+
+def fill_map_table(maps: list[MapRecord], chunk_size: int = 1000) -> None:
     """Add beatmap data to table `maps`"""
-    for added, maps_slice in _split_sequence(maps, 1000):
-        for map in maps_slice:
-            add_map(map)
-        print(f"{added} maps added to database")
-
-
-def _split_sequence(sequence: list, window: int):
-    sent = 0
-    for i in range(len(sequence) // 1000 + 1):
-        current_slice = sequence[i * window : (i + 1) * window]
-        sent += len(current_slice)
-        yield sent, current_slice
+    added = add_maps(maps, chunk_size=chunk_size)
+    report("added", f"{added} maps added to database", maps=added)
@@ -0,0 +1,150 @@
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from itertools import islice, takewhile
+from threading import Event
+from typing import Callable, Iterable, Iterator
+
+from score_tracker import metrics
+from score_tracker.controllers.api import load_settings
+from score_tracker.controllers.scores import fetch_user_scores, store_score
+from score_tracker.controllers.utils import get_limiter
+from score_tracker.controllers.writer import BatchWriter
+from score_tracker.models.users import (
+    get_remaining_work_count,
+    get_stale_maps,
+    get_tracked_user_ids,
+    get_unchecked_maps,
+)
+from score_tracker.progress import report
+
+STALE_AFTER = timedelta(days=30)
+
+
+def _stale_before(stale_after: timedelta) -> int:
+    return int((datetime.now(timezone.utc) - stale_after).timestamp())
+
+
+def _iter_pages(get_page: Callable[..., list[tuple[int, int]]]) -> Iterator[int]:
+    """Map ids from a query ordered by `(ranked_time, map_id)`, page by page."""
+    before = None
+    while page := get_page(before=before):
+        yield from (map_id for _, map_id in page)
+        before = page[-1]
+
+
+def _user_work(user_id: int, stale_before: int) -> Iterator[tuple[int, int]]:
+    """Maps to request a user's score on, by priority: maps never requested,
+    then maps without a score last requested before `stale_before`, each
+    most recently ranked first."""
+    unchecked = _iter_pages(lambda before: get_unchecked_maps(user_id, before))
+    stale = _iter_pages(lambda before: get_stale_maps(user_id, stale_before, before))
+    for map_id in unchecked:
+        yield user_id, map_id
+    for map_id in stale:
+        yield user_id, map_id
+
+
+def _interleave(iterators: Iterable[Iterator]) -> Iterator:
+    """Take one item from each iterator in turn until all are exhausted."""
+    queue = deque(iterators)
+    while queue:
+        iterator = queue.popleft()
+        for item in islice(iterator, 1):
+            queue.append(iterator)
+            yield item
+
+
+def run_scheduler(
+    user_ids: list[int] | None = None,
+    limit: int | None = None,
+    end_time: datetime | None = None,
+    stale_after: timedelta = STALE_AFTER,
+    workers: int = 4,
+    stop: Event | None = None,
+) -> int:
+    """Get scores of all tracked users (or `user_ids`), taking turns between
+    users so they share the api rate limit.
+
+    Stops after `limit` requests, at `end_time`, once `stop` is set, or when
+    no work is left.
+    Returns the number of scores added."""
+    if user_ids is None:
+        user_ids = get_tracked_user_ids()
+    stale_before = _stale_before(stale_after)
+    remaining = sum(get_remaining_work_count(user, stale_before) for user in user_ids)
+    if limit is not None:
+        remaining = min(remaining, limit)
+    throughput = metrics.Throughput()
+
+    work = _interleave(_user_work(user_id, stale_before) for user_id in user_ids)
+    if end_time is not None:
+        work = takewhile(lambda _: datetime.now() < end_time, work)
+    if stop is not None:
+        work = takewhile(lambda _: not stop.is_set(), work)
+    if limit is not None:
+        work = islice(work, limit)
+
+    done = 0
+    with BatchWriter() as writer:
+        for (user_id, map_id), score in fetch_user_scores(
+            work, workers, return_exceptions=True
+        ):
+            if isinstance(score, Exception):
+                report(
+                    "error",
+                    f"Failed to get score of user {user_id} on map {map_id} | {score}",
+                    user_id=user_id,
+                    map_id=map_id,
+                    error=str(score),
+                )
+                metrics.increment("errors")
+                remaining -= 1
+                continue
+
+            writer.put(partial(store_score, score))
+            done += 1
+            remaining -= 1
+            metrics.increment("scores")
+            throughput.add()
+
+            eta = throughput.eta(remaining)
+            if eta is not None and end_time is not None:
+                eta = min(eta, end_time - datetime.now())
+            report(
+                "score",
+                f"Adding score of user {user_id} on map {map_id} | {done} done | "
+                f"ETA {eta if eta is not None else '-'}",
+                user_id=user_id,
+                map_id=map_id,
+                done=done,
+                remaining=remaining,
+                eta_seconds=eta.total_seconds() if eta is not None else None,
+            )
+            metrics.maybe_emit()
+    return done
+
+
+def estimate_completion(
+    user_ids: list[int], stale_after: timedelta = STALE_AFTER
+) -> dict[int, tuple[int, timedelta]]:
+    """Maps each user to the number of maps `run_scheduler` still has to
+    request for them and the time until it would be done.
+
+    Users take turns, so a user is done once every other user has had as many
+    requests as them, or has run out of work."""
+    stale_before = _stale_before(stale_after)
+    remaining = {
+        user_id: get_remaining_work_count(user_id, stale_before) for user_id in user_ids
+    }
+    load_settings()
+    rate = get_limiter("v2").rate
+    return {
+        user_id: (
+            count,
+            timedelta(
+                seconds=sum(min(other, count) for other in remaining.values()) / rate
+            ),
+        )
+        for user_id, count in remaining.items()
+    }
@@ -1,25 +1,211 @@
-from ossapi import BeatmapUserScore, GameMode, Score
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
-from score_tracker.controllers.api import API
+from score_tracker import metrics
+from score_tracker.controllers.api import get_api
 from score_tracker.controllers.utils import rate_limit
-from score_tracker.models.scores import add_score
+from score_tracker.controllers.writer import BatchWriter
+from score_tracker.models.maps import get_stored_map_ids, iter_map_ids_without_score
+from score_tracker.models.scores import add_score, add_scores, get_user_map_ids
+from score_tracker.models.users import record_score_check
+from score_tracker.models.utils import (
+    ScoreRecord,
+    missing_score_record,
+    score_into_table_record,
+    transaction,
+)
+from score_tracker.progress import report
 
+if TYPE_CHECKING:
+    from ossapi import BeatmapUserScore, GameMode, Score, ScoreType
 
-@rate_limit
-def _beatmap_user_score(map_id: int, user_id: int, mode: GameMode) -> BeatmapUserScore:
+USER_SCORES_PAGE_SIZE = 100
+
+
+@rate_limit("v2")
+def _beatmap_user_score(
+    map_id: int, user_id: int, mode: "GameMode"
+) -> "BeatmapUserScore":
     """Rate-limited variant of `Ossapi.beatmap_user_score`."""
-    return API.beatmap_user_score(map_id, user_id, mode=mode)
+    return get_api().beatmap_user_score(map_id, user_id, mode=mode)
+
+
+@rate_limit("v2")
+def _user_scores(user_id: int, type: "ScoreType", offset: int) -> "list[Score]":
+    """Rate-limited variant of `Ossapi.user_scores`."""
+    from ossapi import GameMode
+
+    return get_api().user_scores(
+        user_id,
+        type,
+        mode=GameMode.OSU,
+        limit=USER_SCORES_PAGE_SIZE,
+        offset=offset,
+    )
+
+
+def get_listed_scores(user_id: int) -> tuple[list[ScoreRecord], list[ScoreRecord]]:
+    """Retrieves a user's scores from the paginated user score listings: the
+    best and first place scores, each the user's best on its map, and the
+    recent scores, which need not be."""
+    from ossapi import ScoreType
+
+    best: list[ScoreRecord] = []
+    recent: list[ScoreRecord] = []
+    for type in (ScoreType.BEST, ScoreType.FIRSTS, ScoreType.RECENT):
+        scores = recent if type is ScoreType.RECENT else best
+        offset = 0
+        while page := _user_scores(user_id, type, offset):
+            scores += [
+                score_into_table_record(score) for score in page if score.beatmap
+            ]
+            offset += len(page)
+            if len(page) < USER_SCORES_PAGE_SIZE:
+                break
+        report(
+            "listed",
+            f"Retrieved {offset} {type.value} scores of user {user_id}",
+            user_id=user_id,
+            type=type.value,
+            scores=offset,
+        )
+    return best, recent
 
 
-def get_score(map_id: int, user_id: int) -> Score | tuple[int, int]:
-    """Retrieves a user's best score on a beatmap."""
+def get_score(map_id: int, user_id: int) -> ScoreRecord:
+    """Retrieves a user's best score on a beatmap, or a placeholder record if
+    there is none."""
+    from ossapi import GameMode
+
     try:
-        return _beatmap_user_score(map_id, user_id, mode=GameMode.OSU).score
+        score = _beatmap_user_score(map_id, user_id, mode=GameMode.OSU).score
     except ValueError:
-        return (user_id, map_id)
+        return missing_score_record(user_id, map_id)
+    return score_into_table_record(score)
+
+
+def fetch_scores(
+    map_ids: Iterable[int],
+    user_id: int,
+    workers: int = 4,
+    return_exceptions: bool = False,
+) -> Iterator[tuple[int, ScoreRecord | Exception]]:
+    """Retrieves a user's best score on each map with up to `workers` requests
+    in flight, all sharing the api rate limit.
+
+    Yields `(map_id, score)` pairs in the order the requests complete. With
+    `return_exceptions`, a failed request yields its exception instead of
+    raising it."""
+    work = ((user_id, map_id) for map_id in map_ids)
+    for (_, map_id), score in fetch_user_scores(work, workers, return_exceptions):
+        yield map_id, score
+
+
+def fetch_user_scores(
+    work: Iterable[tuple[int, int]],
+    workers: int = 4,
+    return_exceptions: bool = False,
+) -> Iterator[tuple[tuple[int, int], ScoreRecord | Exception]]:
+    """Like `fetch_scores`, for `(user_id, map_id)` pairs of any users.
+
+    Yields `((user_id, map_id), score)` pairs."""
+    return fetch_concurrently(
+        lambda item: get_score(item[1], item[0]), work, workers, return_exceptions
+    )
+
+
+def fetch_concurrently[
+    T, R
+](
+    request: Callable[[T], R],
+    work: Iterable[T],
+    workers: int = 4,
+    return_exceptions: bool = False,
+) -> Iterator[tuple[T, R | Exception]]:
+    """Call `request` on each item of `work` with up to `workers` calls in
+    flight, taking items from `work` only as calls complete.
+
+    Yields `(item, result)` pairs in the order the calls complete. With
+    `return_exceptions`, a failed call yields its exception instead of
+    raising it."""
+    from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+    work = iter(work)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending: dict[Future, T] = {}
+
+    def submit(count: int) -> None:
+        for item in islice(work, count):
+            pending[executor.submit(request, item)] = item
+
+    try:
+        submit(workers * 2)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                if return_exceptions and (error := future.exception()):
+                    yield item, error
+                else:
+                    yield item, future.result()
+            submit(len(done))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def store_score(record: ScoreRecord) -> None:
+    """Store a retrieved score, keeping the better one if a score is already
+    stored, and record when it was requested"""
+    add_score(record)
+    record_score_check(record.user_id, record.map_id)
+
+
+def collect_scores(user_id: int, fallback: bool = True, workers: int = 4) -> None:
+    """Get a user's scores with as few requests as possible.
+
+    Scores from the user score listings are merged into table `scores`,
+    keeping the better score where one is already stored. A recent score
+    may not be the user's best on its map, so it is only merged onto a row
+    already stored, such as the placeholder of a map first played since it
+    was checked. With `fallback`, maps the user still has no row for are
+    then requested one by one."""
+    listed, recent = get_listed_scores(user_id)
+    stored = get_stored_map_ids(record.map_id for record in listed)
+    listed = [record for record in listed if record.map_id in stored]
+    checked = get_user_map_ids(user_id, (record.map_id for record in recent))
+    recent = [record for record in recent if record.map_id in checked]
+
+    with metrics.timed("db.write"), transaction():
+        add_scores(listed + recent, on_conflict="best-score")
+        for record in listed + recent:
+            record_score_check(user_id, record.map_id)
+    report(
+        "merged",
+        f"Merged {len(listed) + len(recent)} listed scores of user {user_id}",
+        user_id=user_id,
+        scores=len(listed) + len(recent),
+    )
+
+    if not fallback:
+        return
+
+    map_ids = iter_map_ids_without_score(user_id, in_database=True)
+    scores = enumerate(fetch_scores(map_ids, user_id, workers), 1)
+    with BatchWriter() as writer:
+        for i, (map_id, score) in scores:
+            writer.put(partial(store_score, score))
+            metrics.increment("scores")
+            report(
+                "score",
+                f"Adding score for map {map_id} | {i} done",
+                user_id=user_id,
+                map_id=map_id,
+                done=i,
+            )
+            metrics.maybe_emit()
 
 
-def fill_score_table(scores: list[Score | tuple[int, int]]) -> None:
+def fill_score_table(scores: list[ScoreRecord], chunk_size: int = 1000) -> None:
     """Add score data to table `scores`"""
-    for score in scores:
-        add_score(score)
+    add_scores(scores, chunk_size=chunk_size)
@@ -1,14 +1,29 @@
-from ossapi import User
+from typing import TYPE_CHECKING
 
-from score_tracker.controllers.api import API
+from score_tracker.controllers.api import get_api
 from score_tracker.controllers.utils import rate_limit
+from score_tracker.models.users import add_tracked_user
 
+if TYPE_CHECKING:
+    from ossapi import User
 
-@rate_limit
-def _user(user_id: int) -> User:
+
+@rate_limit("v2")
+def _user(user_id: int) -> "User":
     """Rate-limited variant of `Ossapi.user`."""
-    return API.user(user_id)
+    return get_api().user(user_id)
 
 
 def user_exists(user_id: int) -> bool:
-    return _user(user_id).id == user_id
+    try:
+        return _user(user_id).id == user_id
+    except ValueError:
+        return False
+
+
+def track_user(user_id: int) -> bool:
+    """Add a user to the tracked users, if they exist."""
+    if not user_exists(user_id):
+        return False
+    add_tracked_user(user_id)
+    return True
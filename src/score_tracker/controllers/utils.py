@@ -1,32 +1,261 @@
+import random
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
 from functools import wraps
-from time import time
-from typing import Callable
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Awaitable, Callable
 
-last_call_time = time()
+from score_tracker.progress import report
 
+if TYPE_CHECKING:
+    from requests import Response
 
-def rate_limit(func: Callable) -> Callable:
-    """Decorator for rate limiting api calls."""
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        global last_call_time
 
-        while time() - last_call_time < 1:
-            continue
+def _retryable_errors() -> tuple[type[Exception], ...]:
+    """Errors `RateLimiter` may retry. Only called once an error is raised,
+    so that requests is not imported before the first api call."""
+    from requests import RequestException
 
-        result = None
-        retries = 0
-        while result is None:
-            if retries > 10:
-                raise TimeoutError("Too many unsuccessful requests")
+    return (ConnectionError, RequestException)
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second on average
+    with bursts of up to `burst` calls."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate: float, burst: int) -> None:
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self._tokens = min(self._tokens, float(burst))
+
+    def reserve(self) -> float:
+        """Take a token, returning the seconds to wait before it may be used."""
+        with self._lock:
+            now = monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+@dataclass
+class LimiterStats:
+    calls: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    retries: int = 0
+    throttles: int = 0
+    throttle_time: float = 0.0
+
+
+# rate limiter of the api call in progress on each thread
+_current = threading.local()
+
+
+def pace_request() -> None:
+    """Wait for the rate limiter of the api call in progress on this thread,
+    if any. Called by the http transport right before sending a request."""
+    if (limiter := getattr(_current, "limiter", None)) is not None:
+        limiter.acquire()
+
+
+class RateLimiter:
+    """Api budget shared by every thread and task calling through it.
+
+    Requests are paced by a token bucket. Failed calls are retried with
+    exponential backoff and jitter, and a 429 response pauses every caller
+    for as long as its Retry-After header asks."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 1.0,
+        burst: int = 1,
+        max_retries: int = 10,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._bucket = TokenBucket(rate, burst)
+        self._stats = LimiterStats()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._bucket.rate
+
+    @property
+    def stats(self) -> LimiterStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def configure(self, rate: float, burst: int) -> None:
+        self._bucket.configure(rate, burst)
+
+    def acquire(self) -> None:
+        """Sleep until the next call may be made."""
+        if (wait := self._reserve()) > 0:
+            sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Wait without blocking the event loop until the next call may be made."""
+        import asyncio  # slow to import and only needed by async callers
+
+        if (wait := self._reserve()) > 0:
+            await asyncio.sleep(wait)
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Call `func` within the budget, retrying transient failures.
+
+        The budget is spent by `pace_request`, which the http transport calls
+        for every request `func` sends, so responses served from the cache
+        cost nothing."""
+        previous = getattr(_current, "limiter", None)
+        _current.limiter = self
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except _retryable_errors() as error:
+                    delay = self._backoff(attempt, error)
+                attempt += 1
+                sleep(delay)
+        finally:
+            _current.limiter = previous
+
+    async def call_async(self, func: Callable[..., Awaitable], *args, **kwargs):
+        """Await `func` within the budget, retrying transient failures."""
+        import asyncio
+
+        attempt = 0
+        while True:
+            await self.acquire_async()
             try:
-                last_call_time = time()
-                result = func(*args, **kwargs)
-            except ConnectionError:
-                retries += 1
-                print("Connection Error occured")
+                return await func(*args, **kwargs)
+            except _retryable_errors() as error:
+                delay = self._backoff(attempt, error)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _reserve(self) -> float:
+        with self._lock:
+            pause = max(0.0, self._paused_until - monotonic())
+        wait = pause + self._bucket.reserve()
+        with self._lock:
+            self._stats.calls += 1
+            if wait > 0:
+                self._stats.waits += 1
+                self._stats.wait_time += wait
+        return wait
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retrying after `error`.
+
+        Re-raises `error` if it is not worth retrying."""
+        from requests import HTTPError
+
+        response = error.response if isinstance(error, HTTPError) else None
+        if response is not None and response.status_code not in RETRY_STATUS_CODES:
+            raise error
+        if attempt >= self.max_retries:
+            raise TimeoutError("Too many unsuccessful requests") from error
+
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if response is not None and (retry_after := _retry_after(response)):
+            delay = retry_after + random.uniform(0, self.backoff)
+
+        with self._lock:
+            self._stats.retries += 1
+            if response is not None and response.status_code == 429:
+                self._stats.throttles += 1
+                self._stats.throttle_time += delay
+                self._paused_until = max(self._paused_until, monotonic() + delay)
+
+        report(
+            "retry",
+            f"{self.name}: {error} | retrying in {delay:.1f}s",
+            limiter=self.name,
+            error=str(error),
+            delay=round(delay, 3),
+        )
+        return delay
+
+
+def _retry_after(response: "Response") -> float | None:
+    """Seconds requested by the Retry-After header of `response`, if any."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    if value.isnumeric():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """Get the rate limiter `name`, creating it with default settings."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name)
+        return _limiters[name]
+
+
+def all_limiters() -> list[RateLimiter]:
+    with _limiters_lock:
+        return list(_limiters.values())
+
+
+def configure_rate_limit(name: str, rate: float, burst: int) -> None:
+    """Set the calls per second and burst size allowed by limiter `name`."""
+    get_limiter(name).configure(rate, burst)
+
+
+def raise_for_retryable_status(response: "Response", *args, **kwargs) -> None:
+    """`requests` response hook turning throttling and server errors into
+    `HTTPError`s that `RateLimiter` retries."""
+    from requests import HTTPError
+
+    if response.status_code in RETRY_STATUS_CODES:
+        raise HTTPError(f"{response.status_code} for {response.url}", response=response)
+
+
+def rate_limit(name: str) -> Callable[[Callable], Callable]:
+    """Decorator for rate limiting api calls against the limiter `name`."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_limiter(name).call(func, *args, **kwargs)
 
-        return result
+        return wrapper
 
-    return wrapper
+    return decorator
@@ -0,0 +1,97 @@
+import queue
+import threading
+from time import monotonic
+from typing import Callable
+
+from score_tracker import metrics
+from score_tracker.models.utils import close_connection, transaction
+
+# gauge of the number of writes waiting for the writer thread
+QUEUE_GAUGE = "db.queue"
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Thread applying queued database writes in batched transactions.
+
+    Crawl loops put one write per result and carry on fetching while the
+    writer commits up to `batch_size` writes at a time, at most `max_delay`
+    seconds after the first of them was queued. It is the only thread writing
+    to the database while it runs. Once `max_queued` writes are waiting,
+    `put` blocks until the writer catches up.
+
+    Leaving the `with` block, also on Ctrl-C, commits everything queued."""
+
+    def __init__(
+        self, batch_size: int = 500, max_delay: float = 0.5, max_queued: int = 2000
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._error: BaseException | None = None
+
+    def __enter__(self) -> "BatchWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def put(self, write: Callable[[], object]) -> None:
+        """Queue `write` to run in the writer thread, waiting while the queue
+        is full. Raises the error that stopped the writer, if any."""
+        self._raise_error()
+        self._queue.put(write)
+        metrics.gauge(QUEUE_GAUGE, self._queue.qsize())
+
+    def flush(self) -> None:
+        """Wait until every queued write is committed."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Commit every queued write and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("database writer failed") from self._error
+
+    def _run(self) -> None:
+        try:
+            self._write_batches()
+        finally:
+            close_connection()
+
+    def _write_batches(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            write = self._queue.get()
+            deadline = monotonic() + self.max_delay
+            while write is not _STOP:
+                batch.append(write)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    write = self._queue.get(timeout=max(0, deadline - monotonic()))
+                except queue.Empty:
+                    break
+            stopping = write is _STOP
+
+            try:
+                if batch and self._error is None:
+                    with metrics.timed("db.write"), transaction():
+                        for write in batch:
+                            write()
+            except BaseException as error:
+                self._error = error
+            finally:
+                for _ in range(len(batch) + stopping):
+                    self._queue.task_done()
+                metrics.gauge(QUEUE_GAUGE, self._queue.qsize())
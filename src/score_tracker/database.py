@@ -1,46 +1,121 @@
 import csv
-import os
-import sqlite3 as sql
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cache
+from typing import Callable, Iterator
 
-from score_tracker.models.utils import auto_connection
-from score_tracker.models.scores import add_score
+from score_tracker.export import export_scores
+from score_tracker.models.scores import add_scores
+from score_tracker.models.utils import ScoreRecord
 
 
-@auto_connection
-def export_scores_as_csv(cursor: sql.Cursor, user_id: int) -> None:
+@dataclass
+class ImportReport:
+    # rows written, leaving out those the conflict policy kept out
+    imported: int = 0
+    rejected: list[tuple[int, str]] = field(default_factory=list)
+    # rows read but left out, such as maps without a leaderboard
+    skipped: int = 0
+
+
+def export_scores_as_csv(user_id: int) -> None:
     """Creates a CSV file with all stored scores of particular player."""
-    scores = cursor.execute(
-        """
-        SELECT * FROM scores
-        WHERE user_id = ?;
-        """,
-        (user_id,),
-    ).fetchall()
-
-    if not os.path.isdir("export"):
-        os.mkdir("export")
-
-    with open(f"export/scores-{user_id}.csv", "w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(
-            (
-                "Score ID",
-                "User ID",
-                "Map ID",
-                "Score",
-                "Accuracy",
-                "Combo",
-                "Mods",
-                "Time Submitted",
-                "pp",
-            )
-        )
-        writer.writerows(scores)
+    export_scores(f"export/scores-{user_id}.csv", user_ids=[user_id])
 
 
-def import_scores_from_csv(csv_path: str) -> None:
-    """Adds scores from CSV file into database."""
-    with open(csv_path) as file:
+def import_scores_from_csv(
+    csv_path: str, on_conflict: str = "ignore", batch_size: int = 50000
+) -> ImportReport:
+    """Adds scores from CSV file into database.
+
+    The file may be any export of this tool, or use the column names of table
+    `scores`. `on_conflict` is "ignore", "replace", "best-score" or "best-pp".
+    Rows that cannot be read are skipped and listed in the report with their
+    line number."""
+    report = ImportReport()
+    with open(csv_path, newline="", encoding="utf-8") as file:
         reader = csv.reader(file)
-        for row in reader[1:]:
-            add_score(tuple(row))
+        records = _read_score_records(reader, report)
+        report.imported = add_scores(records, batch_size, on_conflict)
+    return report
+
+
+@cache
+def _parse_mods(value: str) -> int:
+    if not value:
+        return 0
+    if value.isnumeric():
+        return int(value)
+
+    from ossapi import Mod
+
+    return Mod(value).value
+
+
+def _parse_time(value: str) -> int:
+    if not value:
+        return 0
+    if value.isnumeric():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def _parse_pp(value: str) -> float | None:
+    return float(value) if value else None
+
+
+def _parse_grade(value: str) -> str | None:
+    return value or None
+
+
+def _parse_flag(value: str) -> int:
+    return int(value) if value else 0
+
+
+# field of `ScoreRecord`, accepted header names and how to parse it
+_SCORE_FIELDS: tuple[tuple[str, tuple[str, ...], Callable], ...] = (
+    ("score_id", ("Score ID",), int),
+    ("user_id", ("User ID",), int),
+    ("map_id", ("Map ID",), int),
+    ("score", ("Score",), int),
+    ("accuracy", ("Accuracy",), float),
+    ("max_combo", ("Combo",), int),
+    ("mods", ("Mods",), _parse_mods),
+    ("submit_time", ("Time Submitted",), _parse_time),
+    ("pp", ("pp",), _parse_pp),
+    ("grade", ("Grade",), _parse_grade),
+    ("perfect", ("FC",), _parse_flag),
+)
+# columns missing from exports of older versions, read as an empty value
+_OPTIONAL_FIELDS = frozenset({"grade", "perfect"})
+
+
+def _read_score_records(
+    reader: Iterator[list[str]], report: ImportReport
+) -> Iterator[ScoreRecord]:
+    header = next(reader, [])
+    parsers = []
+    for name, aliases, parse in _SCORE_FIELDS:
+        index = next((i for i, h in enumerate(header) if h in (name, *aliases)), None)
+        if index is None and name not in _OPTIONAL_FIELDS:
+            raise ValueError(f"CSV file has no column for {repr(name)}")
+        parsers.append((index, parse))
+
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            record = ScoreRecord(
+                *[
+                    parse(row[index] if index is not None else "")
+                    for index, parse in parsers
+                ]
+            )
+        except (IndexError, ValueError) as error:
+            report.rejected.append((line_number, str(error)))
+            continue
+
+        if record.user_id < 1 or record.map_id < 1:
+            report.rejected.append((line_number, "user and map ids must be positive"))
+        elif record.score < 0 or not 0 <= record.accuracy <= 1:
+            report.rejected.append((line_number, "score or accuracy out of range"))
+        else:
+            yield record
@@ -0,0 +1,379 @@
+"""Importing maps from local dumps of beatmap metadata, without the api."""
+
+import bz2
+import csv
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timezone
+from functools import cache
+from typing import Callable, Iterable, Iterator, TextIO
+
+from score_tracker.controllers.maps import LEADERBOARD_STATUSES, RANKED_STATUSES
+from score_tracker.database import ImportReport
+from score_tracker.models.maps import (
+    add_maps,
+    get_map_count,
+    get_sync_watermark,
+    set_sync_watermark,
+)
+from score_tracker.models.utils import MapRecord
+from score_tracker.progress import report
+
+DUMP_FORMATS = ("sql", "tsv", "jsonl")
+MAPS_TABLE = "osu_beatmaps"
+SETS_TABLE = "osu_beatmapsets"
+# progress is reported after every this many rows
+REPORT_EVERY = 50_000
+
+_EXTENSIONS = {
+    ".sql": "sql",
+    ".tsv": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "jsonl",
+}
+_COMPRESSED = {".gz": gzip.open, ".bz2": bz2.open}
+
+
+def _parse_time(value: str | int) -> int:
+    """Unix timestamp of a timestamp or a date and time, read as UTC."""
+    if isinstance(value, int) or value.isdecimal():
+        return int(value)
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return int(time.timestamp())
+
+
+def _parse_text(value: str | None) -> str:
+    return "" if value is None else str(value)
+
+
+def _parse_integer(value: str | int | float) -> int:
+    return int(float(value)) if isinstance(value, str) else int(value)
+
+
+# field of `MapRecord`, accepted column names and how to parse it
+_MAP_FIELDS: tuple[tuple[str, tuple[str, ...], Callable], ...] = (
+    ("map_id", ("beatmap_id", "id"), int),
+    ("set_id", ("beatmapset_id",), int),
+    ("ranked_time", ("approved_date", "ranked_date"), _parse_time),
+    ("ranked_type", ("approved", "ranked"), int),
+    ("artist", (), _parse_text),
+    ("title", (), _parse_text),
+    ("diff_name", ("version",), _parse_text),
+    ("mapper", ("creator",), _parse_text),
+    ("mapper_id", ("creator_id", "user_id"), int),
+    ("diff_rating", ("difficultyrating", "difficulty_rating", "star_rating"), float),
+    ("length", ("total_length",), _parse_integer),
+)
+
+
+# columns holding the game mode, and the values of osu!standard
+_MODE_COLUMNS = ("playmode", "mode_int", "mode")
+_STANDARD_MODES = frozenset({"0", "osu"})
+
+
+@cache
+def _column(keys: tuple[str, ...], name: str) -> str | None:
+    """Column read for the field `name` of `MapRecord` from rows with `keys`,
+    if any."""
+    aliases = next(aliases for field, aliases, _ in _MAP_FIELDS if field == name)
+    return next((key for key in (name, *aliases) if key in keys), None)
+
+
+@cache
+def _columns(keys: tuple[str, ...]) -> tuple[tuple[str, str, Callable], ...]:
+    """Column read for each field of `MapRecord` from rows with `keys`, with
+    the field's name and how to parse it."""
+    columns = []
+    for name, _, parse in _MAP_FIELDS:
+        key = _column(keys, name)
+        if key is None:
+            raise ValueError(f"no column for {repr(name)}")
+        columns.append((key, name, parse))
+    return tuple(columns)
+
+
+def _map_record(row: dict) -> MapRecord:
+    """Record of table `maps` for a row of a dump."""
+    values = []
+    for key, name, parse in _columns(tuple(row)):
+        value = row[key]
+        if value is None and parse is not _parse_text:
+            raise ValueError(f"no value for {repr(name)}")
+        values.append(parse(value))
+    return MapRecord(*values)
+
+
+def _is_listed(row: dict) -> bool:
+    """Whether a row is an osu!standard map that has been ranked and is not
+    deleted. Rows without a ranked time column are left for `_map_record` to
+    reject."""
+    mode = next((row[key] for key in _MODE_COLUMNS if key in row), 0)
+    ranked_key = _column(tuple(row), "ranked_time")
+    return (
+        str(mode) in _STANDARD_MODES
+        and (ranked_key is None or row[ranked_key] not in (None, ""))
+        and row.get("deleted_at") is None
+    )
+
+
+def detect_format(path: str) -> str:
+    """Dump format of a file or directory, from its extension. Directories
+    are taken to hold the osu! data dumps."""
+    if os.path.isdir(path):
+        return "sql"
+    root, extension = os.path.splitext(path.lower())
+    if extension in _COMPRESSED:
+        extension = os.path.splitext(root)[1]
+    if extension not in _EXTENSIONS:
+        raise ValueError(f"cannot tell the dump format of {repr(path)}")
+    return _EXTENSIONS[extension]
+
+
+def _open(path: str) -> TextIO:
+    opener = _COMPRESSED.get(os.path.splitext(path.lower())[1], open)
+    return opener(path, "rt", encoding="utf-8", newline="")
+
+
+# rows are yielded with their line or row number, or an error for rows that
+# cannot be read
+type DumpRows = Iterator[tuple[int, dict | str]]
+
+
+def _read_tsv(file: TextIO) -> DumpRows:
+    reader = csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
+    header = next(reader, [])
+    for line_number, row in enumerate(reader, start=2):
+        if len(row) != len(header):
+            yield line_number, f"expected {len(header)} columns, got {len(row)}"
+            continue
+        # mysql writes NULL as \N
+        yield line_number, {
+            name: None if value == "\\N" else value for name, value in zip(header, row)
+        }
+
+
+def _read_jsonl(file: TextIO) -> DumpRows:
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, f"invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "not a JSON object"
+            continue
+        yield line_number, row
+
+
+_SQL_CREATE = re.compile(r"CREATE TABLE `(?P<table>\w+)`")
+_SQL_COLUMN = re.compile(r"\s+`(?P<column>\w+)`")
+_SQL_INSERT = re.compile(
+    r"INSERT INTO `(?P<table>\w+)`\s*(?:\((?P<columns>[^)]*)\)\s*)?VALUES\s*"
+)
+# a parenthesised row of an INSERT statement, and a value within one
+_SQL_ROW = re.compile(r"\(((?:'(?:[^'\\]|\\.|'')*'|[^'()])*)\)", re.DOTALL)
+_SQL_VALUE = re.compile(r"'((?:[^'\\]|\\.|'')*)'|([^,]+)", re.DOTALL)
+_SQL_ESCAPE = re.compile(r"\\(.)|''", re.DOTALL)
+_SQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def _unescape(text: str) -> str:
+    if "\\" not in text and "''" not in text:
+        return text
+    return _SQL_ESCAPE.sub(
+        lambda match: (
+            _SQL_ESCAPES.get(match[1], match[1]) if match[1] is not None else "'"
+        ),
+        text,
+    )
+
+
+def _sql_values(line: str, start: int) -> Iterator[list]:
+    """Rows of the VALUES list of an INSERT statement, from `start`."""
+    for row in _SQL_ROW.finditer(line, start):
+        yield [
+            (None if raw == "NULL" else raw) if raw else _unescape(string)
+            for string, raw in _SQL_VALUE.findall(row[1])
+        ]
+
+
+def _read_sql(file: TextIO, table: str) -> DumpRows:
+    """Rows of `table` in a mysqldump file, as dictionaries by column."""
+    columns: list[str] = []
+    creating = False
+    row_number = 0
+    for line in file:
+        if match := _SQL_CREATE.match(line):
+            creating = match["table"] == table
+            if creating:
+                columns = []
+        elif creating:
+            if match := _SQL_COLUMN.match(line):
+                columns.append(match["column"])
+            elif line.startswith(")"):
+                creating = False
+        elif (match := _SQL_INSERT.match(line)) and match["table"] == table:
+            names = columns
+            if match["columns"]:
+                names = [name.strip(" `") for name in match["columns"].split(",")]
+            if not names:
+                raise ValueError(f"dump has no columns for table {repr(table)}")
+            for values in _sql_values(line, match.end()):
+                row_number += 1
+                if len(values) != len(names):
+                    yield row_number, (
+                        f"expected {len(names)} values, got {len(values)}"
+                    )
+                    continue
+                yield row_number, dict(zip(names, values))
+
+
+def _dump_file(path: str, table: str) -> str:
+    """Path of the dump of `table` in the directory `path`."""
+    for extension in ("", ".gz", ".bz2"):
+        candidate = os.path.join(path, f"{table}.sql{extension}")
+        if os.path.exists(candidate):
+            return candidate
+    raise ValueError(f"no dump of table {repr(table)} in {repr(path)}")
+
+
+def _read_data_dump(path: str) -> DumpRows:
+    """Rows of `osu_beatmaps`, with the artist, title, creator and ranked
+    date of their beatmapset, from the dump directory or maps file `path`."""
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    maps_path = _dump_file(path, MAPS_TABLE) if os.path.isdir(path) else path
+
+    sets = {}
+    with _open(_dump_file(directory, SETS_TABLE)) as file:
+        for _, row in _read_sql(file, SETS_TABLE):
+            if isinstance(row, dict):
+                sets[row["beatmapset_id"]] = (
+                    row["artist"],
+                    row["title"],
+                    row["creator"],
+                    row["user_id"],
+                    row["approved_date"],
+                )
+
+    with _open(maps_path) as file:
+        for row_number, row in _read_sql(file, MAPS_TABLE):
+            if isinstance(row, str):
+                yield row_number, row
+                continue
+            beatmapset = sets.get(row["beatmapset_id"])
+            if beatmapset is None:
+                yield row_number, f"no beatmapset {row['beatmapset_id']}"
+                continue
+            artist, title, creator, creator_id, approved_date = beatmapset
+            yield row_number, row | {
+                "artist": artist,
+                "title": title,
+                "creator": creator,
+                "creator_id": creator_id,
+                "approved_date": approved_date,
+            }
+
+
+def _read_rows(path: str, format: str) -> DumpRows:
+    if format == "sql":
+        yield from _read_data_dump(path)
+        return
+    with _open(path) as file:
+        yield from _read_tsv(file) if format == "tsv" else _read_jsonl(file)
+
+
+def _read_records(
+    rows: DumpRows, statuses: set[int], import_report: ImportReport
+) -> Iterator[MapRecord]:
+    """Records of the listed maps of the given statuses among `rows`. Rows
+    that cannot be read are listed in the report, and other maps counted as
+    skipped."""
+    for number, row in rows:
+        if isinstance(row, str):
+            import_report.rejected.append((number, row))
+            continue
+        if not _is_listed(row):
+            import_report.skipped += 1
+            continue
+        try:
+            record = _map_record(row)
+        except (TypeError, ValueError) as error:
+            import_report.rejected.append((number, str(error)))
+            continue
+        if record.ranked_type not in statuses:
+            import_report.skipped += 1
+            continue
+        yield record
+
+
+def _is_newer(record: MapRecord, than: MapRecord | None) -> bool:
+    return than is None or (record.ranked_time, record.map_id) > (
+        than.ranked_time,
+        than.map_id,
+    )
+
+
+def _advance_watermark(name: str, record: MapRecord | None, was_empty: bool) -> None:
+    """Move the high-water mark of sync `name` to `record`, if it is newer.
+
+    A mark already set is only moved if table `maps` was empty before the
+    import. Otherwise the dump may skip maps ranked since the last sync,
+    which the next sync would then never request."""
+    if record is None:
+        return
+    ranked_time = datetime.fromtimestamp(record.ranked_time, tz=timezone.utc)
+    watermark = get_sync_watermark(name)
+    if watermark is None or (was_empty and (ranked_time, record.map_id) > watermark):
+        set_sync_watermark(name, ranked_time, record.map_id)
+
+
+def import_map_dump(
+    path: str,
+    format: str | None = None,
+    ranked_only: bool = False,
+    chunk_size: int = 1000,
+) -> ImportReport:
+    """Add the maps in the dump `path` to table `maps`.
+
+    `format` is one of `DUMP_FORMATS`, by default told from the extension.
+    Like `sync_maps`, only osu!standard maps with a leaderboard are added, or
+    only ranked and approved ones if `ranked_only`. Maps already stored are
+    kept as they are. Into an empty database, or one never synced, syncs then
+    start from the newest map imported."""
+    format = format or detect_format(path)
+    if format not in DUMP_FORMATS:
+        raise ValueError(f"unknown dump format {repr(format)}")
+    statuses = {
+        int(status)
+        for status in (RANKED_STATUSES if ranked_only else LEADERBOARD_STATUSES)
+    }
+    import_report = ImportReport()
+    was_empty = get_map_count() == 0
+
+    # newest map overall and newest ranked or approved map
+    newest: list[MapRecord | None] = [None, None]
+
+    def track(records: Iterable[MapRecord]) -> Iterator[MapRecord]:
+        for count, record in enumerate(records, start=1):
+            if _is_newer(record, newest[0]):
+                newest[0] = record
+            if record.ranked_type in (1, 2) and _is_newer(record, newest[1]):
+                newest[1] = record
+            if count % REPORT_EVERY == 0:
+                report("maps", f"Read {count} maps", maps=count)
+            yield record
+
+    records = _read_records(_read_rows(path, format), statuses, import_report)
+    import_report.imported = add_maps(track(records), chunk_size)
+
+    if not ranked_only:
+        _advance_watermark("leaderboard", newest[0], was_empty)
+    _advance_watermark("ranked", newest[1], was_empty)
+    return import_report
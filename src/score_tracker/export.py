@@ -0,0 +1,178 @@
+"""Exporting stored scores with their map's metadata, as CSV or columnar binary."""
+
+import csv
+import json
+import os
+import struct
+import zlib
+from array import array
+from datetime import datetime, timezone
+from functools import cache
+from typing import BinaryIO, Iterable, Iterator
+
+from score_tracker.models.scores import iter_scores_with_maps
+
+COLUMNS: tuple[tuple[str, str], ...] = (
+    ("Score ID", "int"),
+    ("User ID", "int"),
+    ("Map ID", "int"),
+    ("Artist", "str"),
+    ("Title", "str"),
+    ("Difficulty", "str"),
+    ("Mapper", "str"),
+    ("Star Rating", "float"),
+    ("Ranked Time", "str"),
+    ("Score", "int"),
+    ("Accuracy", "float"),
+    ("Combo", "int"),
+    ("Mods", "str"),
+    ("Time Submitted", "str"),
+    ("pp", "float"),
+    ("Grade", "str"),
+    ("FC", "int"),
+)
+
+COLUMNAR_MAGIC = b"OSTC\x01"
+COLUMNAR_EXTENSION = "ostc"
+
+
+@cache
+def decode_mods(mods: int) -> str:
+    """Short names of the mods in the bitmask `mods`, e.g. "HDDT"."""
+    from ossapi import Mod
+
+    return Mod(mods).short_name()
+
+
+def decode_timestamp(timestamp: int | None) -> str:
+    """ISO 8601 UTC datetime of a unix timestamp, or "" if there is none."""
+    if not timestamp:
+        return ""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _decode_row(row: tuple) -> tuple:
+    """Decode a row of `iter_scores_with_maps` into the columns of `COLUMNS`."""
+    return (
+        *row[0:3],
+        *(text or "" for text in row[3:7]),
+        row[7] or 0.0,
+        decode_timestamp(row[8]),
+        *row[9:12],
+        decode_mods(row[12]) if row[9] else "",
+        decode_timestamp(row[13]),
+        row[14] or 0.0,
+        row[15] or "",
+        row[16] or 0,
+    )
+
+
+def export_scores(
+    path: str,
+    user_ids: Iterable[int] | None = None,
+    year: int | None = None,
+    mods: int | None = None,
+    played_only: bool = False,
+    format: str = "csv",
+    chunk_size: int = 10000,
+) -> int:
+    """Write stored scores matching the filters to `path`.
+
+    `format` is "csv" or "columnar". Returns the number of rows written."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    chunks = (
+        [_decode_row(row) for row in rows]
+        for rows in iter_scores_with_maps(user_ids, year, mods, played_only, chunk_size)
+    )
+
+    if format == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            return write_csv(file, chunks)
+    if format == "columnar":
+        with open(path, "wb") as file:
+            return write_columnar(file, chunks)
+    raise ValueError(f"Unknown export format {repr(format)}")
+
+
+def write_csv(file, chunks: Iterable[list[tuple]]) -> int:
+    writer = csv.writer(file)
+    writer.writerow(name for name, _ in COLUMNS)
+    written = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        written += len(rows)
+    return written
+
+
+def write_columnar(file: BinaryIO, chunks: Iterable[list[tuple]]) -> int:
+    """Write rows in the columnar format.
+
+    Layout: magic, a length-prefixed JSON header describing the columns, then
+    one block per chunk of rows (its row count followed by each column as a
+    length-prefixed zlib stream), terminated by a row count of 0. Integers
+    are int64, floats are float64 and strings are a uint32 length array
+    followed by their UTF-8 bytes."""
+    header = json.dumps([{"name": name, "type": kind} for name, kind in COLUMNS])
+    file.write(COLUMNAR_MAGIC)
+    _write_block(file, header.encode())
+
+    written = 0
+    for rows in chunks:
+        if not rows:
+            continue
+        file.write(struct.pack("<I", len(rows)))
+        for index, (_, kind) in enumerate(COLUMNS):
+            _write_block(file, zlib.compress(_encode_column(rows, index, kind)))
+        written += len(rows)
+
+    file.write(struct.pack("<I", 0))
+    return written
+
+
+def read_columnar(file: BinaryIO) -> Iterator[dict[str, list]]:
+    """Read a file written by `write_columnar`, yielding one dict of column
+    name to values per block of rows."""
+    if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar score export")
+    columns = json.loads(_read_block(file))
+
+    while count := struct.unpack("<I", file.read(4))[0]:
+        yield {
+            column["name"]: _decode_column(
+                zlib.decompress(_read_block(file)), count, column["type"]
+            )
+            for column in columns
+        }
+
+
+def _encode_column(rows: list[tuple], index: int, kind: str) -> bytes:
+    if kind == "int":
+        return array("q", (row[index] or 0 for row in rows)).tobytes()
+    if kind == "float":
+        return array("d", (row[index] or 0.0 for row in rows)).tobytes()
+    values = [row[index].encode() for row in rows]
+    return array("I", map(len, values)).tobytes() + b"".join(values)
+
+
+def _decode_column(data: bytes, count: int, kind: str) -> list:
+    if kind in ("int", "float"):
+        return array("q" if kind == "int" else "d", data).tolist()
+    lengths = array("I", data[: count * 4])
+    values = []
+    offset = count * 4
+    for length in lengths:
+        values.append(data[offset : offset + length].decode())
+        offset += length
+    return values
+
+
+def _write_block(file: BinaryIO, data: bytes) -> None:
+    file.write(struct.pack("<I", len(data)))
+    file.write(data)
+
+
+def _read_block(file: BinaryIO) -> bytes:
+    (length,) = struct.unpack("<I", file.read(4))
+    return file.read(length)
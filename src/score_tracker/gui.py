@@ -1,11 +1,597 @@
+"""Tk GUI for browsing the stored maps and scores."""
+
+import queue
+import threading
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from time import monotonic
 from tkinter import ttk
+from typing import Callable
+
+from score_tracker import progress
+from score_tracker.cli import initialise_database
+from score_tracker.controllers.jobs import run_crawl_job
+from score_tracker.controllers.maps import sync_maps
+from score_tracker.controllers.scheduler import run_scheduler
+from score_tracker.controllers.users import track_user
+from score_tracker.export import decode_mods
+from score_tracker.models.browse import COLUMNS, BrowseFilter, count_rows, get_page
+from score_tracker.models.maps import iter_map_ids_without_score
+from score_tracker.models.users import get_tracked_user_ids
+from score_tracker.models.utils import close_connection, close_connections
+
+# milliseconds between checks for progress messages from the worker thread
+POLL_INTERVAL = 100
+# seconds between reloads of the table while a task is storing results
+RELOAD_INTERVAL = 2.0
+# milliseconds to wait after typing before searching
+SEARCH_DELAY = 300
+# milliseconds between checks for rows read by the table's reader thread
+READ_POLL_INTERVAL = 20
+# rows read from the database at a time, and blocks of them kept in memory
+BLOCK_SIZE = 200
+CACHED_BLOCKS = 8
+WHEEL_ROWS = 3
+# year the first maps were ranked
+MIN_YEAR = 2007
+
+HEADINGS: dict[str, tuple[str, int]] = {
+    "map_id": ("Map ID", 70),
+    "artist": ("Artist", 150),
+    "title": ("Title", 200),
+    "diff_name": ("Difficulty", 150),
+    "mapper": ("Mapper", 110),
+    "stars": ("Stars", 50),
+    "length": ("Length", 55),
+    "ranked_time": ("Ranked", 85),
+    "ranked_type": ("Status", 70),
+    "score": ("Score", 90),
+    "accuracy": ("Accuracy", 70),
+    "mods": ("Mods", 60),
+    "pp": ("pp", 50),
+    "grade": ("Grade", 45),
+    "submit_time": ("Submitted", 85),
+}
+STATUS_NAMES = {
+    -2: "Graveyard",
+    -1: "WIP",
+    0: "Pending",
+    1: "Ranked",
+    2: "Approved",
+    3: "Qualified",
+    4: "Loved",
+}
+SHOW_OPTIONS: dict[str, bool | None] = {
+    "All maps": None,
+    "Played": True,
+    "Not played": False,
+}
+
+
+def _date(timestamp: int) -> str:
+    if not timestamp:
+        return ""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _number(text: str) -> float | None:
+    """Number typed into a field, or None if it is empty or not a number."""
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _format_row(row: tuple) -> tuple[str, ...]:
+    """Text shown for each column of a row of `get_page`."""
+    values = dict(zip(COLUMNS, row))
+    played = values["score"] > 0
+    return (
+        str(values["map_id"]),
+        values["artist"],
+        values["title"],
+        values["diff_name"],
+        values["mapper"],
+        f"{values['stars']:.2f}",
+        f"{values['length'] // 60}:{values['length'] % 60:02}",
+        _date(values["ranked_time"]),
+        STATUS_NAMES.get(values["ranked_type"], str(values["ranked_type"])),
+        f"{values['score']:,}" if played else "",
+        f"{values['accuracy']:.2%}" if played else "",
+        decode_mods(values["mods"]) if played else "",
+        f"{values['pp']:.0f}" if played else "",
+        values["grade"],
+        _date(values["submit_time"]) if played else "",
+    )
+
+
+class VirtualTable(ttk.Frame):
+    """Table of the maps selected by `filters`, showing only the rows on
+    screen.
+
+    Rows are read `BLOCK_SIZE` at a time by a reader thread, which also reads
+    the block after the one on screen ahead of time. A block following one
+    already read is found from its last row by sort key, other blocks by
+    their offset. Until a block is read, the rows shown before stay on
+    screen. Clicking a heading sorts by that column, and clicking it again
+    reverses the order.
+
+    Generates `<<TableCounted>>` once `total` is known after a reload, and
+    `<<TableError>>` with the message in `error` when a read fails."""
+
+    def __init__(self, master: tk.Misc) -> None:
+        super().__init__(master)
+        self.filters = BrowseFilter()
+        self.sort = "map_id"
+        self.descending = False
+        self.total = 0
+        self.offset = 0
+        self.visible_rows = 20
+        self.error = ""
+        self._generation = 0
+        self._blocks: OrderedDict[int, list[tuple]] = OrderedDict()
+        self._loading: set[int] = set()
+        # sort key of the last row of each block read, by generation and block
+        self._last_keys: dict[tuple[int, int], tuple] = {}
+        self._reads: list[tuple[Future, Callable]] = []
+        self._reader = ThreadPoolExecutor(1, thread_name_prefix="gui-reader")
+        self._redraw_pending = False
+
+        self.tree = ttk.Treeview(
+            self, columns=tuple(COLUMNS), show="headings", selectmode="browse"
+        )
+        for name, (heading, width) in HEADINGS.items():
+            self.tree.heading(name, text=heading, command=partial(self.sort_by, name))
+            self.tree.column(
+                name, width=width, stretch=name in ("artist", "title", "diff_name")
+            )
+        self.scrollbar = ttk.Scrollbar(
+            self, orient=tk.VERTICAL, command=self._on_scrollbar
+        )
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", self._on_wheel)
+        self.tree.bind("<Button-5>", self._on_wheel)
+        self.tree.bind("<Prior>", lambda _: self.scroll_by(-self.visible_rows))
+        self.tree.bind("<Next>", lambda _: self.scroll_by(self.visible_rows))
+        self.tree.bind("<Home>", lambda _: self.scroll_to(0))
+        self.tree.bind("<End>", lambda _: self.scroll_to(self.total))
+        self.after(READ_POLL_INTERVAL, self._check_reads)
+
+    def set_filters(self, filters: BrowseFilter) -> None:
+        """Show the maps selected by `filters`, from the top"""
+        self.filters = filters
+        self.offset = 0
+        self.reload()
+
+    def sort_by(self, column: str) -> None:
+        """Sort by `column`, reversing the order if already sorted by it"""
+        self.descending = column == self.sort and not self.descending
+        self.sort = column
+        for name, (heading, _) in HEADINGS.items():
+            arrow = (" ▼" if self.descending else " ▲") if name == column else ""
+            self.tree.heading(name, text=heading + arrow)
+        self.offset = 0
+        self.reload()
+
+    def reload(self) -> None:
+        """Count and read the rows again, keeping the scroll position"""
+        self._generation += 1
+        self._blocks.clear()
+        self._loading.clear()
+        self._last_keys.clear()
+        generation, filters = self._generation, self.filters
+        self._read(lambda: count_rows(filters), partial(self._counted, generation))
+
+    def scroll_to(self, offset: int) -> None:
+        """Show the rows from `offset` on"""
+        self.offset = max(0, min(offset, self.total - self.visible_rows))
+        # consecutive scroll events are drawn once
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def scroll_by(self, rows: int) -> None:
+        self.scroll_to(self.offset + rows)
+
+    def close(self) -> None:
+        """Stop the reader thread, after the read it is running"""
+        self._reader.shutdown(cancel_futures=True)
+
+    def _read(self, read: Callable, done: Callable) -> None:
+        """Run `read` in the reader thread, then `done` with its result, or
+        with None if it raised."""
+        self._reads.append((self._reader.submit(read), done))
+
+    def _check_reads(self) -> None:
+        self.after(READ_POLL_INTERVAL, self._check_reads)
+        reads, self._reads = self._reads, []
+        for future, done in reads:
+            if not future.done():
+                self._reads.append((future, done))
+            elif future.cancelled():
+                continue
+            elif (error := future.exception()) is not None:
+                self.error = f"Could not read the maps: {error}"
+                self.event_generate("<<TableError>>")
+                done(None)
+            else:
+                done(future.result())
+
+    def _counted(self, generation: int, total: int | None) -> None:
+        if generation != self._generation:
+            return
+        self.total = total or 0
+        self.event_generate("<<TableCounted>>")
+        self.scroll_to(self.offset)
+
+    def _visible_blocks(self) -> range:
+        first = self.offset // BLOCK_SIZE
+        last = (self.offset + self.visible_rows - 1) // BLOCK_SIZE
+        return range(first, last + 1)
+
+    def _load(self, block: int) -> None:
+        """Read `block` in the reader thread, unless it is read already."""
+        if block in self._blocks or block in self._loading:
+            return
+        self._loading.add(block)
+        generation, filters = self._generation, self.filters
+        sort, descending = self.sort, self.descending
+        sort_index = list(COLUMNS).index(sort)
+
+        def read() -> list[tuple] | None:
+            # skip blocks scrolled past while waiting for earlier reads
+            visible = self._visible_blocks()
+            if generation != self._generation or not (
+                visible.start <= block <= visible.stop
+            ):
+                return None
+            rows = get_page(
+                filters,
+                sort,
+                descending,
+                BLOCK_SIZE,
+                offset=block * BLOCK_SIZE,
+                after=self._last_keys.get((generation, block - 1)),
+            )
+            if len(rows) == BLOCK_SIZE:
+                self._last_keys[generation, block] = rows[-1][sort_index], rows[-1][0]
+            return rows
+
+        self._read(read, partial(self._loaded, generation, block))
+
+    def _loaded(self, generation: int, block: int, rows: list[tuple] | None) -> None:
+        if generation != self._generation:
+            return
+        self._loading.discard(block)
+        if rows is None:
+            return
+        self._blocks[block] = rows
+        while len(self._blocks) > CACHED_BLOCKS:
+            self._blocks.popitem(last=False)
+        self._redraw()
+
+    def _redraw(self) -> None:
+        self._redraw_pending = False
+        visible = self._visible_blocks()
+        # the block after the visible ones is read ahead
+        for block in range(visible.start, visible.stop + 1):
+            if block * BLOCK_SIZE < self.total:
+                self._load(block)
+        if any(
+            block not in self._blocks and block * BLOCK_SIZE < self.total
+            for block in visible
+        ):
+            return
+
+        rows = []
+        for block in visible:
+            if block in self._blocks:
+                self._blocks.move_to_end(block)
+                rows += self._blocks[block]
+        start = self.offset - visible.start * BLOCK_SIZE
+        self.tree.delete(*self.tree.get_children())
+        for row in rows[start : start + self.visible_rows]:
+            self.tree.insert("", tk.END, values=_format_row(row))
+        if self.total:
+            self.scrollbar.set(
+                self.offset / self.total,
+                min(1.0, (self.offset + self.visible_rows) / self.total),
+            )
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_resize(self, event: tk.Event) -> None:
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        # less the height of the headings
+        self.visible_rows = max(1, (event.height - row_height - 6) // row_height)
+        self.scroll_to(self.offset)
+
+    def _on_scrollbar(self, action: str, value: str, unit: str = "") -> None:
+        if action == tk.MOVETO:
+            self.scroll_to(round(float(value) * self.total))
+        elif action == tk.SCROLL:
+            step = self.visible_rows if unit == tk.PAGES else 1
+            self.scroll_by(int(value) * step)
+
+    def _on_wheel(self, event: tk.Event) -> str:
+        if event.num == 4 or event.delta > 0:
+            self.scroll_by(-WHEEL_ROWS)
+        else:
+            self.scroll_by(WHEEL_ROWS)
+        return "break"
+
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
+        self.title("osu! Score Tracker")
+        self.geometry("1200x700")
+
+        self._events: queue.Queue[tuple[str, str, dict]] = queue.Queue()
+        self._task: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._closing = False
+        self._stored = False
+        self._last_reload = monotonic()
+        self._search_after: str | None = None
+
+        self._build_toolbar().pack(fill=tk.X, padx=6, pady=(6, 0))
+        self._build_filters().pack(fill=tk.X, padx=6, pady=6)
+        self.table = VirtualTable(self)
+        self.table.bind("<<TableCounted>>", lambda _: self._show_count())
+        self.table.bind(
+            "<<TableError>>", lambda _: self.status.configure(text=self.table.error)
+        )
+        self.table.pack(fill=tk.BOTH, expand=True, padx=6)
+        self._build_status_bar().pack(fill=tk.X, padx=6, pady=6)
+
+        progress.set_listener(lambda *event: self._events.put(event))
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self._load_users()
+        self._reload()
+        self.after(POLL_INTERVAL, self._poll)
+
+    def _build_toolbar(self) -> ttk.Frame:
+        toolbar = ttk.Frame(self)
+        self.track_entry = ttk.Entry(toolbar, width=12)
+        self.track_entry.bind("<Return>", lambda _: self.track())
+        ttk.Label(toolbar, text="User ID:").pack(side=tk.LEFT)
+        self.track_entry.pack(side=tk.LEFT, padx=(4, 2))
+        ttk.Button(toolbar, text="Track user", command=self.track).pack(side=tk.LEFT)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=8)
+        ttk.Button(toolbar, text="Sync maps", command=self.sync).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Fetch scores", command=self.fetch).pack(
+            side=tk.LEFT, padx=4
+        )
+        self.stop_button = ttk.Button(
+            toolbar, text="Stop", command=self.stop, state=tk.DISABLED
+        )
+        self.stop_button.pack(side=tk.LEFT)
+        return toolbar
+
+    def _build_filters(self) -> ttk.Frame:
+        filters = ttk.Frame(self)
+        self.user_box = ttk.Combobox(filters, width=12)
+        self.user_box.bind("<<ComboboxSelected>>", lambda _: self.apply_filters())
+        self.user_box.bind("<Return>", lambda _: self.apply_filters())
+        self.search = tk.StringVar()
+        self.search.trace_add("write", lambda *_: self._schedule_search())
+        self.show_box = ttk.Combobox(
+            filters, values=list(SHOW_OPTIONS), state="readonly", width=10
+        )
+        self.show_box.current(0)
+        self.show_box.bind("<<ComboboxSelected>>", lambda _: self.apply_filters())
+        self.ranked_only = tk.BooleanVar()
+        self.min_stars = tk.StringVar()
+        self.max_stars = tk.StringVar()
+        self.year = tk.StringVar()
+        for variable in (self.min_stars, self.max_stars, self.year):
+            variable.trace_add("write", lambda *_: self._schedule_search())
+
+        ttk.Label(filters, text="Scores of user:").pack(side=tk.LEFT)
+        self.user_box.pack(side=tk.LEFT, padx=(4, 12))
+        ttk.Label(filters, text="Search:").pack(side=tk.LEFT)
+        ttk.Entry(filters, textvariable=self.search, width=24).pack(
+            side=tk.LEFT, padx=(4, 12)
+        )
+        ttk.Label(filters, text="Stars:").pack(side=tk.LEFT)
+        for variable in (self.min_stars, self.max_stars):
+            ttk.Spinbox(
+                filters,
+                textvariable=variable,
+                from_=0,
+                to=15,
+                increment=0.5,
+                width=5,
+            ).pack(side=tk.LEFT, padx=(4, 0))
+        ttk.Label(filters, text="Year:").pack(side=tk.LEFT, padx=(12, 0))
+        ttk.Entry(filters, textvariable=self.year, width=6).pack(
+            side=tk.LEFT, padx=(4, 12)
+        )
+        self.show_box.pack(side=tk.LEFT)
+        ttk.Checkbutton(
+            filters,
+            text="Ranked and approved only",
+            variable=self.ranked_only,
+            command=self.apply_filters,
+        ).pack(side=tk.LEFT, padx=12)
+        self.count_label = ttk.Label(filters)
+        self.count_label.pack(side=tk.RIGHT)
+        return filters
+
+    def _build_status_bar(self) -> ttk.Frame:
+        status_bar = ttk.Frame(self)
+        self.status = ttk.Label(status_bar, text="Ready", anchor=tk.W)
+        self.progressbar = ttk.Progressbar(status_bar, length=200)
+        self.status.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.progressbar.pack(side=tk.RIGHT)
+        return status_bar
+
+    def _show_count(self) -> None:
+        self.count_label["text"] = f"{self.table.total:,} maps"
+
+    def _load_users(self) -> None:
+        self.user_box["values"] = [""] + [str(user) for user in get_tracked_user_ids()]
+
+    def _selected_user(self) -> int | None:
+        text = self.user_box.get().strip()
+        return int(text) if text.isdecimal() else None
+
+    def _schedule_search(self) -> None:
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DELAY, self.apply_filters)
+
+    def apply_filters(self) -> None:
+        """Show the maps selected by the filter widgets"""
+        self._search_after = None
+        year = _number(self.year.get())
+        if year is not None and not MIN_YEAR <= year <= datetime.now().year:
+            self.status["text"] = (
+                f"{repr(self.year.get())} is not a year from {MIN_YEAR} to "
+                f"{datetime.now().year}"
+            )
+            return
+        self.table.set_filters(
+            BrowseFilter(
+                user_id=self._selected_user(),
+                search=self.search.get().strip(),
+                played=SHOW_OPTIONS[self.show_box.get()],
+                ranked_only=self.ranked_only.get(),
+                min_stars=_number(self.min_stars.get()),
+                max_stars=_number(self.max_stars.get()),
+                year=int(year) if year is not None else None,
+            )
+        )
+
+    def run_task(self, description: str, function: Callable, *args, **kwargs) -> None:
+        """Run `function` in a worker thread, unless a task is already
+        running"""
+        if self._task is not None and self._task.is_alive():
+            self.status["text"] = "Another task is running, stop it first"
+            return
+        self._stop.clear()
+        self._stored = False
+        self.status["text"] = f"{description}..."
+        self.stop_button["state"] = tk.NORMAL
+        self.progressbar.configure(mode="indeterminate", value=0)
+        self.progressbar.start()
+        self._task = threading.Thread(
+            target=self._run_task,
+            args=(description, function, args, kwargs),
+            name="gui-task",
+            daemon=True,
+        )
+        self._task.start()
+
+    def _run_task(
+        self, description: str, function: Callable, args: tuple, kwargs: dict
+    ) -> None:
+        try:
+            function(*args, **kwargs)
+        except Exception as error:
+            self._events.put(("failed", f"{description} failed: {error}", {}))
+        else:
+            self._events.put(("finished", f"{description} finished", {}))
+        finally:
+            close_connection()
+
+    def track(self) -> None:
+        text = self.track_entry.get().strip()
+        if not text.isdecimal() or int(text) < 1:
+            self.status["text"] = f"{repr(text)} is not a user ID"
+            return
+        self.run_task(f"Tracking user {text}", self._track_user, int(text))
+
+    @staticmethod
+    def _track_user(user_id: int) -> None:
+        if not track_user(user_id):
+            raise ValueError(f"user {user_id} does not exist")
+
+    def sync(self) -> None:
+        self.run_task("Syncing maps", sync_maps)
+
+    def fetch(self) -> None:
+        """Get the scores of the selected user, or of all tracked users"""
+        user_id = self._selected_user()
+        if user_id is None:
+            self.run_task("Fetching scores", run_scheduler, stop=self._stop)
+            return
+        self.run_task(
+            f"Fetching scores of user {user_id}",
+            run_crawl_job,
+            user_id,
+            "all",
+            lambda: iter_map_ids_without_score(user_id),
+            stop=self._stop,
+        )
+
+    def stop(self) -> None:
+        """Stop fetching scores. Map syncs run until they finish"""
+        self._stop.set()
+        self.status["text"] = "Stopping once the current requests finish..."
+
+    def close(self) -> None:
+        """Close the window, once the running task has stopped and stored
+        its results"""
+        if self._task is None or not self._task.is_alive():
+            progress.set_listener(None)
+            self.table.close()
+            self.destroy()
+            close_connections()
+            return
+        self._closing = True
+        self.stop()
+
+    def _poll(self) -> None:
+        """Show the progress messages queued by the worker thread."""
+        while True:
+            try:
+                event, message, fields = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._show_progress(event, message, fields)
+
+        if self._stored and monotonic() - self._last_reload > RELOAD_INTERVAL:
+            self._reload()
+        if self._closing and (self._task is None or not self._task.is_alive()):
+            self.close()
+            return
+        self.after(POLL_INTERVAL, self._poll)
+
+    def _show_progress(self, event: str, message: str, fields: dict) -> None:
+        self.status["text"] = message
+        if event in ("finished", "failed"):
+            self.progressbar.stop()
+            self.progressbar.configure(mode="determinate", value=0)
+            self.stop_button["state"] = tk.DISABLED
+            self._load_users()
+            self._reload()
+            return
+
+        self._stored = True
+        if fields.get("total"):
+            self.progressbar.stop()
+            self.progressbar.configure(
+                mode="determinate", value=100 * fields["done"] / fields["total"]
+            )
+
+    def _reload(self) -> None:
+        self._stored = False
+        self._last_reload = monotonic()
+        self.table.reload()
+
 
 def main():
+    initialise_database()
     app = App()
-
     app.mainloop()
@@ -1,8 +1,7 @@
-from datetime import datetime, timedelta, timezone
-
-import score_tracker.api as api
 import score_tracker.cli as cli
 import score_tracker.database as db
+from score_tracker.controllers.jobs import run_crawl_job
+from score_tracker.models.maps import iter_map_ids_without_score
 
 
 def get_integer_input():
@@ -18,20 +17,10 @@ def get_integer_input():
 
 
 def main():
-    user_id = get_integer_input()
-
-    ranked_maps = api.get_leaderboard_maps(
-        upto=datetime(2024, 1, 1, tzinfo=timezone.utc)
-    )
-
-    ranked_maps = [map for map in ranked_maps if map.approved in ["1", "2"]]
+    user_id = int(get_integer_input())
 
-    for i, map in enumerate(ranked_maps):
-        score = api.get_score(map.beatmap_id, user_id)
-        db.add_score(db._score_into_table_record(score))
-        print(
-            f"Progress: {i}/{len(ranked_maps)} | Time remaining {timedelta(seconds=len(ranked_maps)-i)}"
-        )
+    cli.initialise_database()
+    run_crawl_job(user_id, "all", lambda: iter_map_ids_without_score(user_id))
 
     db.export_scores_as_csv(user_id)
 
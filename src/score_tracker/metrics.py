@@ -0,0 +1,238 @@
+"""Throughput and latency metrics of long running crawls."""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import timedelta
+from time import monotonic, perf_counter
+from typing import Iterator
+from urllib.parse import urlsplit
+
+from score_tracker.controllers.utils import all_limiters
+from score_tracker.progress import report
+
+# upper bounds of the histogram buckets in seconds, from 1 ms to about 65 s
+BUCKETS = tuple(0.001 * 2**i for i in range(17))
+
+
+class Histogram:
+    """Counts of observed durations in exponentially growing buckets."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = next(
+            (i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS)
+        )
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the `fraction` quantile."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total": round(self.total, 3),
+            "mean": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.percentile(0.5), 4),
+            "p95": round(self.percentile(0.95), 4),
+            "p99": round(self.percentile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+
+class Throughput:
+    """Moving average of completed items per second over the last `window`."""
+
+    def __init__(self, window: timedelta = timedelta(minutes=5)) -> None:
+        self.window = window.total_seconds()
+        self._times: deque[float] = deque()
+
+    def add(self, count: int = 1) -> None:
+        now = monotonic()
+        self._times.extend([now] * count)
+        while self._times and self._times[0] < now - self.window:
+            self._times.popleft()
+
+    @property
+    def rate(self) -> float:
+        if len(self._times) < 2:
+            return 0.0
+        elapsed = monotonic() - self._times[0]
+        return len(self._times) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, remaining: int) -> timedelta | None:
+        """Time until `remaining` more items are done at the current rate."""
+        if not (rate := self.rate):
+            return None
+        return timedelta(seconds=round(remaining / rate))
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """`method` and the path of `url` with ids replaced, e.g.
+    "GET /api/v2/beatmaps/{id}/scores/users/{id}"."""
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", urlsplit(url).path)
+    return f"{method} {path}"
+
+
+def _is_request(name: str) -> bool:
+    return not name.startswith("db.")
+
+
+_lock = threading.Lock()
+_started = monotonic()
+_histograms: dict[str, Histogram] = {}
+_counters: dict[str, int] = {}
+_gauges: dict[str, dict[str, float]] = {}
+_interval = 60.0
+_path: str | None = None
+_last_emitted = monotonic()
+
+
+def configure(interval: float = 60.0, path: str | None = None) -> None:
+    """Report a summary every `interval` seconds, also writing it to the JSON
+    file `path` if given."""
+    global _interval, _path
+    with _lock:
+        _interval = interval
+        _path = path
+
+
+def reset() -> None:
+    global _started, _last_emitted
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+        _started = _last_emitted = monotonic()
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a duration in the histogram `name`."""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        _histograms[name].observe(seconds)
+
+
+def increment(name: str, count: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + count
+
+
+def gauge(name: str, value: float) -> None:
+    """Set the current value of `name`, also keeping the highest value."""
+    with _lock:
+        previous = _gauges.get(name, {"max": value})
+        _gauges[name] = {"value": value, "max": max(previous["max"], value)}
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Record the duration of the `with` block in the histogram `name`."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, perf_counter() - start)
+
+
+def snapshot() -> dict:
+    """Current values of all metrics, ready to be serialised as JSON."""
+    with _lock:
+        elapsed = monotonic() - _started
+        histograms = {name: hist.summary() for name, hist in _histograms.items()}
+        counters = dict(_counters)
+        gauges = {name: dict(values) for name, values in _gauges.items()}
+    limiters = {limiter.name: asdict(limiter.stats) for limiter in all_limiters()}
+
+    api = [summary for name, summary in histograms.items() if _is_request(name)]
+    database = [
+        summary for name, summary in histograms.items() if not _is_request(name)
+    ]
+    requests = sum(summary["count"] for summary in api)
+    time_split = {
+        "api": sum(summary["total"] for summary in api),
+        "rate_limit": sum(
+            stats["wait_time"] + stats["throttle_time"] for stats in limiters.values()
+        ),
+        "database": sum(summary["total"] for summary in database),
+    }
+    return {
+        "elapsed": round(elapsed, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 3) if elapsed else 0.0,
+        "retries": sum(stats["retries"] for stats in limiters.values()),
+        "throttles": sum(stats["throttles"] for stats in limiters.values()),
+        "time_split": {name: round(total, 3) for name, total in time_split.items()},
+        "counters": counters,
+        "gauges": gauges,
+        "histograms": histograms,
+        "limiters": limiters,
+    }
+
+
+def summary_line(values: dict) -> str:
+    split = values["time_split"]
+    total = sum(split.values()) or 1.0
+    parts = [
+        f"{values['requests']} requests",
+        f"{values['requests_per_second']:.2f} req/s",
+        f"{values['retries']} retries",
+        f"{values['throttles']} throttles",
+        "time "
+        + " / ".join(
+            f"{name} {seconds / total:.0%}" for name, seconds in split.items()
+        ),
+    ]
+    for name, gauge_values in values["gauges"].items():
+        parts.append(f"{name} {gauge_values['value']:g} (max {gauge_values['max']:g})")
+    for name, histogram in values["histograms"].items():
+        parts.append(
+            f"{name} p50 {histogram['p50'] * 1000:.0f}ms "
+            f"p95 {histogram['p95'] * 1000:.0f}ms"
+        )
+    return "Metrics | " + " | ".join(parts)
+
+
+def emit() -> None:
+    """Report a summary of all metrics now."""
+    global _last_emitted
+    values = snapshot()
+    with _lock:
+        _last_emitted = monotonic()
+        path = _path
+    report("metrics", summary_line(values), **values)
+    if path:
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(values, file, indent=2)
+        os.replace(temporary, path)
+
+
+def maybe_emit() -> None:
+    """Report a summary if the last one is older than the interval."""
+    with _lock:
+        due = monotonic() - _last_emitted >= _interval
+    if due:
+        emit()
@@ -0,0 +1,139 @@
+"""Paged queries for browsing the stored maps, with a user's score on each."""
+
+import sqlite3 as sql
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from score_tracker.models.search import match_expression
+from score_tracker.models.utils import auto_connection
+
+# columns of a page, with the expression each is read and sorted by
+COLUMNS: dict[str, str] = {
+    "map_id": "m.map_id",
+    "artist": "COALESCE(m.artist, '') COLLATE NOCASE",
+    "title": "COALESCE(m.title, '') COLLATE NOCASE",
+    "diff_name": "COALESCE(m.diff_name, '') COLLATE NOCASE",
+    "mapper": "COALESCE(m.mapper, '') COLLATE NOCASE",
+    "stars": "COALESCE(m.diff_rating, 0)",
+    "length": "COALESCE(m.length, 0)",
+    "ranked_time": "COALESCE(m.ranked_time, 0)",
+    "ranked_type": "COALESCE(m.ranked_type, 0)",
+    "score": "COALESCE(s.score, 0)",
+    "accuracy": "COALESCE(s.accuracy, 0)",
+    "mods": "COALESCE(s.mods, 0)",
+    "pp": "COALESCE(s.pp, 0)",
+    "grade": "COALESCE(s.grade, '')",
+    "submit_time": "COALESCE(s.submit_time, 0)",
+}
+
+
+@dataclass(frozen=True)
+class BrowseFilter:
+    """Which maps a page is read from. Score columns are those of `user_id`,
+    or empty without a user. `played` keeps only maps the user has (True) or
+    has not (False) played. `search` is matched against artist, title,
+    difficulty and mapper, as described in `match_expression`. Star ratings
+    and lengths (in seconds) are inclusive ranges, and `year` is the UTC
+    year maps were ranked in."""
+
+    user_id: int | None = None
+    search: str = ""
+    played: bool | None = None
+    ranked_only: bool = False
+    min_stars: float | None = None
+    max_stars: float | None = None
+    min_length: int | None = None
+    max_length: int | None = None
+    year: int | None = None
+
+
+_FROM = """
+    FROM maps AS m
+    LEFT JOIN scores AS s ON s.user_id = ? AND s.map_id = m.map_id
+"""
+
+
+def _conditions(filters: BrowseFilter) -> tuple[list[str], list]:
+    """WHERE conditions of the rows selected by `filters`, and the parameters
+    of `_FROM` and the conditions."""
+    conditions = []
+    params: list = [filters.user_id]
+    if expression := match_expression(filters.search):
+        conditions.append(
+            "m.map_id IN (SELECT rowid FROM maps_search WHERE maps_search MATCH ?)"
+        )
+        params.append(expression)
+    if filters.played is True:
+        conditions.append("s.score > 0")
+    elif filters.played is False:
+        conditions.append("COALESCE(s.score, 0) = 0")
+    if filters.ranked_only:
+        conditions.append("m.ranked_type BETWEEN 1 AND 2")
+    for condition, value in (
+        ("m.diff_rating >= ?", filters.min_stars),
+        ("m.diff_rating <= ?", filters.max_stars),
+        ("m.length >= ?", filters.min_length),
+        ("m.length <= ?", filters.max_length),
+    ):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    if filters.year is not None:
+        conditions.append("m.ranked_time >= ? AND m.ranked_time < ?")
+        params += [
+            int(datetime(filters.year, 1, 1, tzinfo=timezone.utc).timestamp()),
+            int(datetime(filters.year + 1, 1, 1, tzinfo=timezone.utc).timestamp()),
+        ]
+    return conditions, params
+
+
+def _where(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+@auto_connection
+def count_rows(cursor: sql.Cursor, filters: BrowseFilter) -> int:
+    """Count the maps selected by `filters`"""
+    conditions, params = _conditions(filters)
+    return cursor.execute(
+        f"SELECT COUNT(*) {_FROM} {_where(conditions)};", params
+    ).fetchone()[0]
+
+
+@auto_connection
+def get_page(
+    cursor: sql.Cursor,
+    filters: BrowseFilter,
+    sort: str = "map_id",
+    descending: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+    after: tuple | None = None,
+) -> list[tuple]:
+    """Get up to `limit` rows of `COLUMNS` sorted by column `sort`, ties
+    broken by map id, skipping `offset` rows.
+
+    With `after`, the `(sort value, map_id)` of the row before the page, the
+    page is found from that row instead and `offset` is ignored"""
+    if sort not in COLUMNS:
+        raise ValueError(f"cannot sort by {repr(sort)}")
+    conditions, params = _conditions(filters)
+    key = COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+
+    if after is not None:
+        comparison = "<" if descending else ">"
+        conditions.append(f"({key}, m.map_id) {comparison} (?, ?)")
+        params += list(after)
+        offset = 0
+
+    return cursor.execute(
+        f"""
+        SELECT {", ".join(COLUMNS.values())}
+        {_FROM}
+        {_where(conditions)}
+        ORDER BY {key} {direction}, m.map_id {direction}
+        LIMIT ? OFFSET ?;
+        """,
+        params + [limit, offset],
+    ).fetchall()
@@ -0,0 +1,119 @@
+"""Append-only history of every score stored for a user on a map."""
+
+import sqlite3 as sql
+from datetime import datetime
+
+from score_tracker.models.utils import ScoreRecord, auto_connection
+
+
+def _append(row: str) -> str:
+    return f"""
+        INSERT OR IGNORE INTO score_history VALUES (
+            {row}.score_id,
+            {row}.user_id,
+            {row}.map_id,
+            {row}.score,
+            {row}.accuracy,
+            {row}.max_combo,
+            {row}.mods,
+            {row}.submit_time,
+            {row}.pp,
+            {row}.grade,
+            {row}.perfect,
+            CAST(strftime('%s', 'now') AS INTEGER)
+        );
+    """
+
+
+HISTORY_TRIGGERS: tuple[str, ...] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS scores_history_insert AFTER INSERT ON scores
+    WHEN NEW.score > 0
+    BEGIN {_append("NEW")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS scores_history_update AFTER UPDATE ON scores
+    WHEN NEW.score > 0 AND NEW.score_id IS NOT OLD.score_id
+    BEGIN {_append("NEW")} END;
+    """,
+)
+
+
+@auto_connection
+def backfill_history(cursor: sql.Cursor) -> int:
+    """Append the stored scores missing from `score_history`, as recorded
+    now. Returns the number of scores appended"""
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO score_history
+        SELECT
+            score_id, user_id, map_id, score, accuracy, max_combo, mods,
+            submit_time, pp, grade, perfect,
+            CAST(strftime('%s', 'now') AS INTEGER)
+        FROM scores
+        WHERE score > 0;
+        """
+    )
+    return cursor.rowcount
+
+
+@auto_connection
+def get_score_history(
+    cursor: sql.Cursor, user_id: int, map_id: int
+) -> list[ScoreRecord]:
+    """Get every recorded score of a user on a map, oldest first"""
+    rows = cursor.execute(
+        """
+        SELECT
+            score_id, user_id, map_id, score, accuracy, max_combo, mods,
+            submit_time, pp, grade, perfect
+        FROM score_history
+        WHERE user_id = ? AND map_id = ?
+        ORDER BY submit_time ASC;
+        """,
+        (user_id, map_id),
+    ).fetchall()
+
+    return [ScoreRecord(*row) for row in rows]
+
+
+@auto_connection
+def get_improvements(
+    cursor: sql.Cursor,
+    user_id: int,
+    since: datetime,
+    until: datetime | None = None,
+) -> list[tuple[ScoreRecord, ScoreRecord | None]]:
+    """Get the scores a user set between `since` and `until`, each with the
+    score it improved on, or None for a first score on the map. Newest
+    first"""
+    until_timestamp = int(until.timestamp()) if until is not None else None
+    rows = cursor.execute(
+        """
+        SELECT
+            h.score_id, h.user_id, h.map_id, h.score, h.accuracy,
+            h.max_combo, h.mods, h.submit_time, h.pp, h.grade, h.perfect,
+            p.score_id, p.user_id, p.map_id, p.score, p.accuracy,
+            p.max_combo, p.mods, p.submit_time, p.pp, p.grade, p.perfect
+        FROM score_history AS h
+        LEFT JOIN score_history AS p ON p.rowid = (
+            SELECT rowid FROM score_history
+            WHERE user_id = h.user_id AND map_id = h.map_id
+                AND submit_time < h.submit_time
+            ORDER BY submit_time DESC
+            LIMIT 1
+        )
+        WHERE h.user_id = ? AND h.submit_time >= ?
+            AND (? IS NULL OR h.submit_time < ?)
+        ORDER BY h.submit_time DESC;
+        """,
+        (user_id, int(since.timestamp()), until_timestamp, until_timestamp),
+    ).fetchall()
+
+    return [
+        (
+            ScoreRecord(*row[:11]),
+            ScoreRecord(*row[11:]) if row[11] is not None else None,
+        )
+        for row in rows
+    ]
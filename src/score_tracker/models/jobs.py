@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+from itertools import batched
+from typing import Iterable
+import sqlite3 as sql
+
+from score_tracker.models.utils import auto_connection
+
+# status of a map within a crawl job
+PENDING = "pending"
+DONE = "done"
+RETRY = "retry"
+FAILED = "failed"
+
+
+@auto_connection
+def create_job(
+    cursor: sql.Cursor, user_id: int, name: str, map_ids: Iterable[int]
+) -> int:
+    """Create a crawl job named `name` for `user_id` over `map_ids`"""
+    cursor.execute(
+        """
+        INSERT INTO crawl_jobs (user_id, name, created_time, cursor)
+        VALUES (?, ?, ?, 0);
+        """,
+        (user_id, name, int(datetime.now(timezone.utc).timestamp())),
+    )
+    job_id = cursor.lastrowid
+    positions = enumerate(map_ids, start=1)
+    for chunk in batched(positions, 1000):
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO crawl_job_maps VALUES (?, ?, ?, ?, 0, NULL);
+            """,
+            [(job_id, map_id, position, PENDING) for position, map_id in chunk],
+        )
+    return job_id
+
+
+@auto_connection
+def get_active_job(cursor: sql.Cursor, user_id: int, name: str) -> int | None:
+    """Get the unfinished crawl job named `name` for `user_id`, if any"""
+    result = cursor.execute(
+        """
+        SELECT job_id FROM crawl_jobs
+        WHERE user_id = ? AND name = ? AND finished_time IS NULL
+        ORDER BY job_id DESC LIMIT 1;
+        """,
+        (user_id, name),
+    ).fetchone()
+
+    return result[0] if result else None
+
+
+@auto_connection
+def get_pending_map_ids(cursor: sql.Cursor, job_id: int) -> list[int]:
+    """Get the maps of a job not attempted yet, starting from its cursor"""
+    map_ids = cursor.execute(
+        """
+        SELECT map_id FROM crawl_job_maps
+        WHERE job_id = ? AND status = ? AND position > (
+            SELECT cursor FROM crawl_jobs WHERE job_id = ?
+        )
+        ORDER BY position ASC;
+        """,
+        (job_id, PENDING, job_id),
+    ).fetchall()
+
+    return [row[0] for row in map_ids]
+
+
+@auto_connection
+def get_retry_map_ids(cursor: sql.Cursor, job_id: int) -> list[int]:
+    """Get the maps of a job whose last attempt failed with a transient error"""
+    map_ids = cursor.execute(
+        """
+        SELECT map_id FROM crawl_job_maps
+        WHERE job_id = ? AND status = ?
+        ORDER BY position ASC;
+        """,
+        (job_id, RETRY),
+    ).fetchall()
+
+    return [row[0] for row in map_ids]
+
+
+@auto_connection
+def mark_map_done(cursor: sql.Cursor, job_id: int, map_id: int) -> None:
+    """Record a map of a job as completed and advance the job's cursor"""
+    cursor.execute(
+        """
+        UPDATE crawl_job_maps SET status = ?, attempts = attempts + 1
+        WHERE job_id = ? AND map_id = ?;
+        """,
+        (DONE, job_id, map_id),
+    )
+    _advance_cursor(cursor, job_id)
+
+
+@auto_connection
+def mark_map_failed(
+    cursor: sql.Cursor, job_id: int, map_id: int, error: str, max_attempts: int
+) -> None:
+    """Record a failed attempt on a map of a job, queueing it for retry until
+    it has failed `max_attempts` times"""
+    cursor.execute(
+        """
+        UPDATE crawl_job_maps
+        SET attempts = attempts + 1,
+            last_error = ?,
+            status = CASE WHEN attempts + 1 < ? THEN ? ELSE ? END
+        WHERE job_id = ? AND map_id = ?;
+        """,
+        (error, max_attempts, RETRY, FAILED, job_id, map_id),
+    )
+    _advance_cursor(cursor, job_id)
+
+
+def _advance_cursor(cursor: sql.Cursor, job_id: int) -> None:
+    """Move the cursor of a job past every map that is no longer pending"""
+    cursor.execute(
+        """
+        UPDATE crawl_jobs SET cursor = COALESCE(
+            (
+                SELECT MIN(position) - 1 FROM crawl_job_maps
+                WHERE job_id = ? AND status = ?
+            ),
+            (SELECT MAX(position) FROM crawl_job_maps WHERE job_id = ?),
+            0
+        )
+        WHERE job_id = ?;
+        """,
+        (job_id, PENDING, job_id, job_id),
+    )
+
+
+@auto_connection
+def finish_job(cursor: sql.Cursor, job_id: int) -> None:
+    """Mark a crawl job as finished"""
+    cursor.execute(
+        """
+        UPDATE crawl_jobs SET finished_time = ?
+        WHERE job_id = ?;
+        """,
+        (int(datetime.now(timezone.utc).timestamp()), job_id),
+    )
+
+
+@auto_connection
+def get_job_progress(cursor: sql.Cursor, job_id: int) -> tuple[int, int]:
+    """Get the number of maps of a job done or failed for good, and the total.
+    Maps waiting for a retry are not counted until they are settled"""
+    result = cursor.execute(
+        """
+        SELECT
+            COUNT(*) FILTER (WHERE status IN (?, ?)),
+            COUNT(*)
+        FROM crawl_job_maps
+        WHERE job_id = ?;
+        """,
+        (DONE, FAILED, job_id),
+    ).fetchone()
+
+    return result[0], result[1]
+
+
+@auto_connection
+def remove_all_jobs(cursor: sql.Cursor) -> None:
+    """Remove all crawl jobs"""
+    cursor.execute(
+        """
+        DELETE FROM crawl_job_maps;
+        """
+    )
+    cursor.execute(
+        """
+        DELETE FROM crawl_jobs;
+        """
+    )
@@ -0,0 +1,225 @@
+"""Positions of tracked users on the leaderboards of maps they have played."""
+
+import sqlite3 as sql
+from datetime import datetime, timezone
+
+from score_tracker.models.utils import auto_connection
+
+LEADERBOARD_TRIGGERS: tuple[str, ...] = (
+    """
+    CREATE TRIGGER IF NOT EXISTS leaderboard_positions_history_insert
+    AFTER INSERT ON leaderboard_positions
+    BEGIN
+        INSERT INTO leaderboard_history
+        VALUES (NEW.user_id, NEW.map_id, NEW.recorded_time, NEW.position)
+        ON CONFLICT DO UPDATE SET position = excluded.position;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS leaderboard_positions_history_update
+    AFTER UPDATE ON leaderboard_positions
+    WHEN NEW.position IS NOT OLD.position
+    BEGIN
+        INSERT INTO leaderboard_history
+        VALUES (NEW.user_id, NEW.map_id, NEW.recorded_time, NEW.position)
+        ON CONFLICT DO UPDATE SET position = excluded.position;
+    END;
+    """,
+    # a new best score moves its owner on the leaderboard, so read it soon
+    """
+    CREATE TRIGGER IF NOT EXISTS scores_leaderboard_insert
+    AFTER INSERT ON scores
+    WHEN NEW.score > 0
+    BEGIN
+        UPDATE leaderboard_checks SET digest = NULL, next_check_time = 0
+        WHERE map_id = NEW.map_id;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS scores_leaderboard_update
+    AFTER UPDATE OF score_id ON scores
+    WHEN NEW.score > 0 AND NEW.score_id IS NOT OLD.score_id
+    BEGIN
+        UPDATE leaderboard_checks SET digest = NULL, next_check_time = 0
+        WHERE map_id = NEW.map_id;
+    END;
+    """,
+)
+
+
+def _now() -> int:
+    return int(datetime.now(timezone.utc).timestamp())
+
+
+@auto_connection
+def get_due_maps(
+    cursor: sql.Cursor,
+    due_time: int,
+    after: tuple[int, int] | None = None,
+    limit: int = 500,
+) -> list[tuple[int, int]]:
+    """Get `(next_check_time, map_id)` of maps a tracked user has a score on
+    whose leaderboard is due to be read by `due_time`, maps never read first,
+    starting after the key `after`"""
+    return cursor.execute(
+        """
+        SELECT due, map_id FROM (
+            SELECT DISTINCT s.map_id, COALESCE(c.next_check_time, 0) AS due
+            FROM tracked_users AS t
+            JOIN scores AS s ON s.user_id = t.user_id AND s.score > 0
+            LEFT JOIN leaderboard_checks AS c ON c.map_id = s.map_id
+        )
+        WHERE due <= ? AND (due, map_id) > (?, ?)
+        ORDER BY due ASC, map_id ASC LIMIT ?;
+        """,
+        (due_time, *(after or (-1, -1)), limit),
+    ).fetchall()
+
+
+@auto_connection
+def get_due_map_count(cursor: sql.Cursor, due_time: int) -> int:
+    """Count the maps whose leaderboard is due to be read by `due_time`"""
+    return cursor.execute(
+        """
+        SELECT COUNT(DISTINCT s.map_id)
+        FROM tracked_users AS t
+        JOIN scores AS s ON s.user_id = t.user_id AND s.score > 0
+        LEFT JOIN leaderboard_checks AS c ON c.map_id = s.map_id
+        WHERE COALESCE(c.next_check_time, 0) <= ?;
+        """,
+        (due_time,),
+    ).fetchone()[0]
+
+
+@auto_connection
+def record_leaderboard(
+    cursor: sql.Cursor,
+    map_id: int,
+    digest: str,
+    positions: dict[int, int],
+    min_interval: int,
+    max_interval: int,
+) -> bool:
+    """Record a read of a map's leaderboard with the given digest and the
+    positions of the users on it (user id to position).
+
+    If the digest is unchanged nothing else is written, and the next read is
+    put off by as long as the leaderboard has not changed, between
+    `min_interval` and `max_interval` seconds. Otherwise the position of
+    every tracked user with a score on the map is stored, NULL if they are
+    not in `positions`, and it is read again after `min_interval`.
+    Returns whether the leaderboard changed"""
+    now = _now()
+    previous = cursor.execute(
+        """
+        SELECT digest, changed_time FROM leaderboard_checks WHERE map_id = ?;
+        """,
+        (map_id,),
+    ).fetchone()
+
+    if previous is not None and previous[0] == digest:
+        interval = min(max(now - previous[1], min_interval), max_interval)
+        cursor.execute(
+            """
+            UPDATE leaderboard_checks SET checked_time = ?, next_check_time = ?
+            WHERE map_id = ?;
+            """,
+            (now, now + interval, map_id),
+        )
+        return False
+
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO leaderboard_checks VALUES (?, ?, ?, ?, ?);
+        """,
+        (map_id, digest, now, now, now + min_interval),
+    )
+    user_ids = cursor.execute(
+        """
+        SELECT s.user_id FROM scores AS s
+        JOIN tracked_users AS t ON t.user_id = s.user_id
+        WHERE s.map_id = ? AND s.score > 0;
+        """,
+        (map_id,),
+    ).fetchall()
+    cursor.executemany(
+        """
+        INSERT INTO leaderboard_positions VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, map_id) DO UPDATE
+        SET position = excluded.position, recorded_time = excluded.recorded_time
+        WHERE position IS NOT excluded.position;
+        """,
+        [(user_id, map_id, positions.get(user_id), now) for (user_id,) in user_ids],
+    )
+    return True
+
+
+@auto_connection
+def get_position_history(
+    cursor: sql.Cursor, user_id: int, map_id: int
+) -> list[tuple[int, int | None]]:
+    """Get `(recorded_time, position)` of every change of a user's position
+    on a map, oldest first"""
+    return cursor.execute(
+        """
+        SELECT recorded_time, position FROM leaderboard_history
+        WHERE user_id = ? AND map_id = ?
+        ORDER BY recorded_time ASC;
+        """,
+        (user_id, map_id),
+    ).fetchall()
+
+
+@auto_connection
+def get_dropped_out(
+    cursor: sql.Cursor,
+    top: int,
+    since: datetime,
+    user_ids: list[int] | None = None,
+) -> list[tuple[int, int, int, int | None, int]]:
+    """Get the scores that were in the top `top` of their map at some point
+    since `since` but are not any more, as `(user_id, map_id, best position
+    since then, current position, time it changed)`, most recent first.
+    A current position of None is outside the part of the leaderboard read.
+
+    Only users in `user_ids` if given"""
+    params = {"since": int(since.timestamp()), "top": top}
+    user_filter = ""
+    if user_ids is not None:
+        names = [f"user_{i}" for i in range(len(user_ids))]
+        user_filter = f"AND p.user_id IN ({', '.join(':' + name for name in names)})"
+        params |= dict(zip(names, user_ids))
+    return cursor.execute(
+        f"""
+        SELECT * FROM (
+            SELECT
+                p.user_id,
+                p.map_id,
+                (
+                    SELECT MIN(h.position) FROM leaderboard_history AS h
+                    WHERE h.user_id = p.user_id AND h.map_id = p.map_id
+                        AND h.recorded_time >= COALESCE((
+                            SELECT MAX(recorded_time) FROM leaderboard_history
+                            WHERE user_id = p.user_id AND map_id = p.map_id
+                                AND recorded_time <= :since
+                        ), :since)
+                ) AS best,
+                p.position,
+                p.recorded_time
+            FROM leaderboard_positions AS p
+            WHERE p.recorded_time >= :since
+                AND COALESCE(p.position > :top, TRUE)
+                {user_filter}
+        )
+        WHERE best <= :top
+        ORDER BY recorded_time DESC, user_id ASC, map_id ASC;
+        """,
+        params,
+    ).fetchall()
+
+
+@auto_connection
+def remove_all_positions(cursor: sql.Cursor) -> None:
+    """Remove all recorded leaderboard positions and checks"""
+    for table in ("leaderboard_positions", "leaderboard_history", "leaderboard_checks"):
+        cursor.execute(f"DELETE FROM {table};")
@@ -1,35 +1,153 @@
 from datetime import datetime, timezone
+from itertools import batched
+import json
+from typing import Iterable, Iterator
 import sqlite3 as sql
 
-from ossapi.ossapi import Beatmap as BeatmapV1
-
-from score_tracker.models.utils import auto_connection
-from score_tracker.models.utils import beatmapv1_into_table_record
+from score_tracker.models.utils import MapRecord, auto_connection, transaction
 
 
 @auto_connection
-def add_map(cursor: sql.Cursor, map: BeatmapV1) -> None:
+def add_map(cursor: sql.Cursor, record: MapRecord) -> None:
     """Add map details to table `maps`"""
-    values = beatmapv1_into_table_record(map)
-
     cursor.execute(
         """
         INSERT OR IGNORE INTO maps VALUES (
             ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
         );
         """,
-        values,
+        record,
+    )
+
+
+def add_maps(records: Iterable[MapRecord], chunk_size: int = 1000) -> int:
+    """Add many maps to table `maps`, one transaction per `chunk_size` maps.
+
+    Each chunk is inserted by a single statement. The search index triggers
+    still run once per map, but FTS5 only flushes its pending changes at the
+    end of each statement, so once per chunk.
+
+    Returns the number of maps added, leaving out those already stored."""
+    added = 0
+    for chunk in batched(records, chunk_size):
+        with transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO maps
+                SELECT
+                    value ->> 0, value ->> 1, value ->> 2, value ->> 3,
+                    value ->> 4, value ->> 5, value ->> 6, value ->> 7,
+                    value ->> 8, value ->> 9, value ->> 10
+                FROM json_each(?);
+                """,
+                (json.dumps(chunk),),
+            )
+            added += cursor.rowcount
+    return added
+
+
+@auto_connection
+def upsert_maps(
+    cursor: sql.Cursor, records: Iterable[MapRecord]
+) -> list[tuple[int, int, int]]:
+    """Add maps to table `maps`, updating maps that are already stored.
+
+    Returns `(map_id, old_ranked_type, new_ranked_type)` for every stored map
+    whose ranked status changed."""
+    records = list(records)
+    previous = dict(
+        cursor.execute(
+            """
+            SELECT map_id, ranked_type FROM maps
+            WHERE map_id IN (SELECT value FROM json_each(?));
+            """,
+            (json.dumps([record.map_id for record in records]),),
+        ).fetchall()
+    )
+
+    cursor.executemany(
+        """
+        INSERT INTO maps VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        )
+        ON CONFLICT (map_id) DO UPDATE SET
+            ranked_time = excluded.ranked_time,
+            ranked_type = excluded.ranked_type,
+            diff_rating = excluded.diff_rating,
+            length = excluded.length
+        WHERE (ranked_time, ranked_type, diff_rating, length) IS NOT (
+            excluded.ranked_time,
+            excluded.ranked_type,
+            excluded.diff_rating,
+            excluded.length
+        );
+        """,
+        records,
     )
 
+    return [
+        (record.map_id, previous[record.map_id], record.ranked_type)
+        for record in records
+        if record.map_id in previous and previous[record.map_id] != record.ranked_type
+    ]
+
+
+@auto_connection
+def get_stored_map_ids(cursor: sql.Cursor, map_ids: Iterable[int]) -> set[int]:
+    """Get which of `map_ids` are in table `maps`"""
+    stored = cursor.execute(
+        """
+        SELECT map_id FROM maps
+        WHERE map_id IN (SELECT value FROM json_each(?));
+        """,
+        (json.dumps(list(map_ids)),),
+    ).fetchall()
+
+    return {row[0] for row in stored}
+
 
 @auto_connection
 def remove_all_maps(cursor: sql.Cursor) -> None:
-    """Remove all maps from table `maps`"""
+    """Remove all maps from table `maps` and forget how far they were synced"""
     cursor.execute(
         """
         DELETE FROM maps;
         """
     )
+    cursor.execute(
+        """
+        DELETE FROM sync_state;
+        """
+    )
+
+
+@auto_connection
+def get_sync_watermark(cursor: sql.Cursor, name: str) -> tuple[datetime, int] | None:
+    """Get the ranked time and id of the last map retrieved by sync `name`"""
+    result = cursor.execute(
+        """
+        SELECT ranked_time, map_id FROM sync_state
+        WHERE name = ?;
+        """,
+        (name,),
+    ).fetchone()
+
+    if result is None:
+        return None
+    return datetime.fromtimestamp(result[0], tz=timezone.utc), result[1]
+
+
+@auto_connection
+def set_sync_watermark(
+    cursor: sql.Cursor, name: str, ranked_time: datetime, map_id: int
+) -> None:
+    """Record the last map retrieved by sync `name`"""
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?);
+        """,
+        (name, int(ranked_time.timestamp()), map_id),
+    )
 
 
 @auto_connection
@@ -37,8 +155,7 @@ def get_latest_leaderboard_map(cursor: sql.Cursor) -> datetime:
     """Get the datetime of the latest leaderboard map in the `maps` table"""
     timestamp = cursor.execute(
         """
-        SELECT ranked_time FROM maps
-        ORDER BY ranked_time DESC LIMIT 1;
+        SELECT MAX(ranked_time) FROM maps;
         """
     ).fetchone()[0]
 
@@ -47,11 +164,11 @@ def get_latest_leaderboard_map(cursor: sql.Cursor) -> datetime:
 
 @auto_connection
 def get_latest_ranked_map(cursor: sql.Cursor) -> datetime:
-    """Get the datetime of the latest leaderboard map in the `maps` table"""
+    """Get the datetime of the latest ranked map in the `maps` table"""
     timestamp = cursor.execute(
         """
         SELECT ranked_time FROM maps
-        WHERE ranked_type = 1 OR ranked_type = 2
+        WHERE ranked_type IN (1, 2)
         ORDER BY ranked_time DESC LIMIT 1;
         """
     ).fetchone()[0]
@@ -59,41 +176,53 @@ def get_latest_ranked_map(cursor: sql.Cursor) -> datetime:
     return datetime.fromtimestamp(timestamp, tz=timezone.utc)
 
 
+_MAP_IDS_WITHOUT_SCORE = """
+    SELECT map_id FROM maps
+    WHERE map_id > ? AND NOT EXISTS (
+        SELECT 1 FROM scores
+        WHERE scores.user_id = ? AND scores.map_id = maps.map_id {condition}
+    )
+    ORDER BY map_id ASC LIMIT ?;
+"""
+
+
 @auto_connection
-def get_all_map_ids_without_score(cursor: sql.Cursor) -> list[int]:
+def _get_map_ids_without_score_page(
+    cursor: sql.Cursor, user_id: int, after: int, limit: int, in_database: bool
+) -> list[int]:
+    """Get up to `limit` map ids greater than `after` that `user_id` has no
+    score on, or no row at all if `in_database`"""
+    condition = "" if in_database else "AND scores.score > 0"
     map_ids = cursor.execute(
-        """
-        SELECT map_id FROM maps;
-        """
+        _MAP_IDS_WITHOUT_SCORE.format(condition=condition),
+        (after, user_id, limit),
     ).fetchall()
 
-    score_map_ids = cursor.execute(
-        """
-        SELECT map_id FROM scores
-        WHERE score > 0;
-        """
-    ).fetchall()
+    return [row[0] for row in map_ids]
 
-    difference = set(row[0] for row in map_ids) - set(row[0] for row in score_map_ids)
-    return sorted(list(difference))
 
+def get_all_map_ids_without_score(user_id: int) -> list[int]:
+    """Get ids of all maps `user_id` has no score on"""
+    return _get_map_ids_without_score_page(user_id, 0, -1, in_database=False)
 
-@auto_connection
-def get_all_map_ids_without_score_in_database(cursor: sql.Cursor) -> list[int]:
-    map_ids = cursor.execute(
-        """
-        SELECT map_id FROM maps;
-        """
-    ).fetchall()
 
-    score_map_ids = cursor.execute(
-        """
-        SELECT map_id FROM scores;
-        """
-    ).fetchall()
+def get_all_map_ids_without_score_in_database(user_id: int) -> list[int]:
+    """Get ids of all maps with no row in `scores` for `user_id`"""
+    return _get_map_ids_without_score_page(user_id, 0, -1, in_database=True)
+
+
+def iter_map_ids_without_score(
+    user_id: int, in_database: bool = False, page_size: int = 1000
+) -> Iterator[int]:
+    """Stream ids of maps `user_id` has no score on, `page_size` at a time.
 
-    difference = set(row[0] for row in map_ids) - set(row[0] for row in score_map_ids)
-    return sorted(list(difference))
+    With `in_database`, maps with a placeholder row are skipped as well."""
+    after = 0
+    while page := _get_map_ids_without_score_page(
+        user_id, after, page_size, in_database
+    ):
+        yield from page
+        after = page[-1]
 
 
 @auto_connection
@@ -116,7 +245,8 @@ def get_map_ids_for_year(cursor: sql.Cursor, year: int) -> list[int]:
 def get_map_count(cursor: sql.Cursor) -> int:
     result = cursor.execute(
         """
-        SELECT COUNT(*) FROM maps;
+        SELECT COALESCE(SUM(count), 0) FROM map_stat_counts
+        WHERE category = 'status';
         """
     ).fetchone()
 
@@ -127,8 +257,8 @@ def get_map_count(cursor: sql.Cursor) -> int:
 def get_ranked_map_count(cursor: sql.Cursor) -> int:
     result = cursor.execute(
         """
-        SELECT COUNT(*) FROM maps
-        WHERE ranked_type BETWEEN 1 AND 2;
+        SELECT COALESCE(SUM(count), 0) FROM map_stat_counts
+        WHERE category = 'status' AND key BETWEEN 1 AND 2;
         """
     ).fetchone()
 
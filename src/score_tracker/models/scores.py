@@ -1,23 +1,99 @@
+import json
+from datetime import datetime, timezone
+from itertools import batched
+from typing import Iterable, Iterator
 import sqlite3 as sql
 
-from ossapi import Score
 
+from score_tracker.models.utils import (
+    ScoreRecord,
+    auto_connection,
+    get_connection,
+    transaction,
+)
 
-from score_tracker.models.utils import score_into_table_record, auto_connection
 
+_UPSERT_IF = """
+    INSERT INTO scores VALUES (
+        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    )
+    ON CONFLICT (user_id, map_id) DO UPDATE SET
+        score_id = excluded.score_id,
+        score = excluded.score,
+        accuracy = excluded.accuracy,
+        max_combo = excluded.max_combo,
+        mods = excluded.mods,
+        submit_time = excluded.submit_time,
+        pp = excluded.pp,
+        grade = excluded.grade,
+        perfect = excluded.perfect
+    WHERE {condition};
+"""
 
-@auto_connection
-def add_score(cursor: sql.Cursor, score: Score) -> None:
-    """Add scroe details to table `scores`"""
-    values = score_into_table_record(score)
-    cursor.execute(
-        """
+# statements for adding scores, by what to do with an already stored score.
+# "best-score" and "best-pp" leave rows that would not change untouched, so
+# refreshing unchanged scores writes nothing
+CONFLICT_POLICIES: dict[str, str] = {
+    "ignore": """
         INSERT OR IGNORE INTO scores VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        );
+    """,
+    "replace": """
+        INSERT OR REPLACE INTO scores VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
         );
+    """,
+    "best-score": _UPSERT_IF.format(condition="excluded.score > scores.score"),
+    "best-pp": _UPSERT_IF.format(
+        condition="COALESCE(excluded.pp, 0) > COALESCE(scores.pp, 0)"
+    ),
+}
+
+
+@auto_connection
+def add_score(
+    cursor: sql.Cursor, record: ScoreRecord, on_conflict: str = "best-score"
+) -> None:
+    """Add scroe details to table `scores`. By default a stored score is only
+    replaced by a better one, such as a placeholder by a real score."""
+    cursor.execute(CONFLICT_POLICIES[on_conflict], record)
+
+
+def add_scores(
+    records: Iterable[ScoreRecord],
+    chunk_size: int = 1000,
+    on_conflict: str = "best-score",
+) -> int:
+    """Add many records to table `scores`, one transaction per `chunk_size`
+    records. `on_conflict` is a key of `CONFLICT_POLICIES`.
+
+    Returns the number of records written, leaving out those ignored or
+    kept from being stored by `on_conflict`."""
+    statement = CONFLICT_POLICIES[on_conflict]
+    added = 0
+    for chunk in batched(records, chunk_size):
+        with transaction() as cursor:
+            cursor.executemany(statement, chunk)
+            added += cursor.rowcount
+    return added
+
+
+@auto_connection
+def get_user_map_ids(
+    cursor: sql.Cursor, user_id: int, map_ids: Iterable[int]
+) -> set[int]:
+    """Get which of `map_ids` the user has a row in `scores` for, placeholders
+    included"""
+    stored = cursor.execute(
+        """
+        SELECT map_id FROM scores
+        WHERE user_id = ? AND map_id IN (SELECT value FROM json_each(?));
         """,
-        values,
-    )
+        (user_id, json.dumps(list(map_ids))),
+    ).fetchall()
+
+    return {row[0] for row in stored}
 
 
 @auto_connection
@@ -34,8 +110,7 @@ def remove_all_scores(cursor: sql.Cursor) -> None:
 def get_score_count(cursor: sql.Cursor) -> int:
     result = cursor.execute(
         """
-        SELECT COUNT(*) FROM scores
-        WHERE score > 0;
+        SELECT COALESCE(SUM(played), 0) FROM user_stats;
         """
     ).fetchone()
 
@@ -46,8 +121,60 @@ def get_score_count(cursor: sql.Cursor) -> int:
 def get_score_in_database_count(cursor: sql.Cursor) -> int:
     result = cursor.execute(
         """
-        SELECT COUNT(*) FROM scores;
+        SELECT COALESCE(SUM(checked), 0) FROM user_stats;
         """
     ).fetchone()
 
     return result[0]
+
+
+def iter_scores_with_maps(
+    user_ids: Iterable[int] | None = None,
+    year: int | None = None,
+    mods: int | None = None,
+    played_only: bool = False,
+    chunk_size: int = 10000,
+) -> Iterator[list[tuple]]:
+    """Stream rows of `scores` joined with their map's metadata, `chunk_size`
+    rows at a time.
+
+    Filters on the players, the year the map was ranked (UTC) and mods that
+    must all be enabled are applied in SQL."""
+    conditions = []
+    params: list = []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        conditions.append(f"s.user_id IN ({', '.join('?' * len(user_ids))})")
+        params += user_ids
+    if year is not None:
+        conditions.append("m.ranked_time BETWEEN ? AND ?")
+        params += [
+            int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp()),
+            int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp()) - 1,
+        ]
+    if mods is not None:
+        conditions.append("s.mods & ? = ?")
+        params += [mods, mods]
+    if played_only:
+        conditions.append("s.score > 0")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    cursor = get_connection().execute(
+        f"""
+        SELECT
+            s.score_id, s.user_id, s.map_id,
+            m.artist, m.title, m.diff_name, m.mapper, m.diff_rating, m.ranked_time,
+            s.score, s.accuracy, s.max_combo, s.mods, s.submit_time, s.pp,
+            s.grade, s.perfect
+        FROM scores AS s
+        LEFT JOIN maps AS m ON m.map_id = s.map_id
+        {where}
+        ORDER BY s.user_id, s.map_id;
+        """,
+        params,
+    )
+    try:
+        while rows := cursor.fetchmany(chunk_size):
+            yield rows
+    finally:
+        cursor.close()
@@ -0,0 +1,78 @@
+"""Full-text search over the artist, title, difficulty name and mapper of maps."""
+
+import sqlite3 as sql
+
+from score_tracker.models.utils import auto_connection
+
+# names a word can be prefixed with to only search one column, e.g. "mapper:"
+SEARCH_COLUMNS = {
+    "artist": "artist",
+    "title": "title",
+    "diff": "diff_name",
+    "difficulty": "diff_name",
+    "version": "diff_name",
+    "mapper": "mapper",
+    "creator": "mapper",
+}
+
+_COLUMNS = "artist, title, diff_name, mapper"
+
+
+def _values(row: str) -> str:
+    return f"{row}.map_id, {row}.artist, {row}.title, {row}.diff_name, {row}.mapper"
+
+
+SEARCH_TRIGGERS: tuple[str, ...] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_search_insert AFTER INSERT ON maps
+    BEGIN
+        INSERT INTO maps_search (rowid, {_COLUMNS}) VALUES ({_values("NEW")});
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_search_delete AFTER DELETE ON maps
+    BEGIN
+        INSERT INTO maps_search (maps_search, rowid, {_COLUMNS})
+        VALUES ('delete', {_values("OLD")});
+    END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_search_update
+    AFTER UPDATE OF artist, title, diff_name, mapper ON maps
+    BEGIN
+        INSERT INTO maps_search (maps_search, rowid, {_COLUMNS})
+        VALUES ('delete', {_values("OLD")});
+        INSERT INTO maps_search (rowid, {_COLUMNS}) VALUES ({_values("NEW")});
+    END;
+    """,
+)
+
+
+@auto_connection
+def rebuild_search(cursor: sql.Cursor) -> None:
+    """Index every map in table `maps` again"""
+    cursor.execute(
+        """
+        INSERT INTO maps_search (maps_search) VALUES ('rebuild');
+        """
+    )
+
+
+def match_expression(text: str) -> str:
+    """FTS5 query matching the maps with every word of `text`, as a word or
+    the start of one. A word prefixed with a name from `SEARCH_COLUMNS` and
+    a colon, e.g. "mapper:sotarks", only matches that column.
+
+    Returns "" if `text` has no words."""
+    terms = []
+    for word in text.split():
+        name, colon, value = word.partition(":")
+        column = SEARCH_COLUMNS.get(name.lower()) if colon else None
+        if column is None:
+            value = word
+        # words of only punctuation have no tokens, and would match nothing
+        if not any(character.isalnum() for character in value):
+            continue
+        term = '"{}"*'.format(value.replace('"', '""'))
+        terms.append(f"{column} : {term}" if column is not None else term)
+    return " ".join(terms)
@@ -1,5 +1,9 @@
 import sqlite3 as sql
 
+from score_tracker.models.history import HISTORY_TRIGGERS, backfill_history
+from score_tracker.models.leaderboards import LEADERBOARD_TRIGGERS
+from score_tracker.models.search import SEARCH_TRIGGERS, rebuild_search
+from score_tracker.models.stats import STATS_TRIGGERS, rebuild_stats
 from score_tracker.models.utils import auto_connection
 
 
@@ -7,7 +11,7 @@ from score_tracker.models.utils import auto_connection
 def create_map_table(cursor: sql.Cursor) -> None:
     """Create the table `maps` with all the relevant columns.
 
-    Changes should also be made to _beatmapv1_into_table_record()"""
+    Changes should also be made to MapRecord and beatmapv1_into_table_record()"""
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS maps (
@@ -25,6 +29,88 @@ def create_map_table(cursor: sql.Cursor) -> None:
         );
         """
     )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS maps_ranked_time
+        ON maps (ranked_time, ranked_type);
+        """
+    )
+    # one per map column the browser sorts by, matching `browse.COLUMNS`, so
+    # a page at any offset is read from the index instead of a full sort
+    for name, key in (
+        ("artist", "COALESCE(artist, '') COLLATE NOCASE"),
+        ("title", "COALESCE(title, '') COLLATE NOCASE"),
+        ("diff_name", "COALESCE(diff_name, '') COLLATE NOCASE"),
+        ("mapper", "COALESCE(mapper, '') COLLATE NOCASE"),
+        ("stars", "COALESCE(diff_rating, 0)"),
+        ("length", "COALESCE(length, 0)"),
+        ("ranked_time", "COALESCE(ranked_time, 0)"),
+    ):
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS maps_sort_{name} ON maps ({key}, map_id);
+            """
+        )
+
+
+@auto_connection
+def create_search_table(cursor: sql.Cursor) -> None:
+    """Create the full-text index `maps_search` of table `maps` and the
+    triggers keeping it current. It is rebuilt whenever a trigger was
+    missing, such as after `maps` was recreated.
+
+    Must be called after create_map_table()"""
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS maps_search USING fts5 (
+            artist,
+            title,
+            diff_name,
+            mapper,
+            content = 'maps',
+            content_rowid = 'map_id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+        """
+    )
+
+    trigger_count = cursor.execute(
+        """
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name LIKE 'maps\\_search\\_%' ESCAPE '\\';
+        """
+    ).fetchone()[0]
+    for trigger in SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+    if trigger_count < len(SEARCH_TRIGGERS):
+        rebuild_search()
+
+
+@auto_connection
+def delete_search_table(cursor: sql.Cursor) -> None:
+    """Delete the full-text index `maps_search` and its triggers"""
+    for name in ("maps_search_insert", "maps_search_delete", "maps_search_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name};")
+    cursor.execute(
+        """
+        DROP TABLE IF EXISTS maps_search;
+        """
+    )
+
+
+@auto_connection
+def create_sync_table(cursor: sql.Cursor) -> None:
+    """Create the table `sync_state` holding the last map retrieved by each
+    map sync."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            ranked_time INTEGER,
+            map_id INTEGER
+        );
+        """
+    )
 
 
 @auto_connection
@@ -41,7 +127,7 @@ def delete_map_table(cursor: sql.Cursor) -> None:
 def create_score_table(cursor: sql.Cursor):
     """Create the table `scores` with all the relevant columns.
 
-    Changes should also be made to _score_into_table_record()"""
+    Changes should also be made to ScoreRecord and score_into_table_record()"""
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS scores (
@@ -54,10 +140,42 @@ def create_score_table(cursor: sql.Cursor):
             mods INTEGER,
             submit_time INTEGER,
             pp REAL,
+            grade TEXT,
+            perfect INTEGER,
             PRIMARY KEY (user_id, map_id)
         );
     """
     )
+    _add_missing_columns(cursor, "scores", {"grade": "TEXT", "perfect": "INTEGER"})
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS scores_user_map_score
+        ON scores (user_id, map_id, score);
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS scores_user_pp
+        ON scores (user_id, pp);
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS scores_map_id
+        ON scores (map_id);
+        """
+    )
+
+
+def _add_missing_columns(
+    cursor: sql.Cursor, table: str, columns: dict[str, str]
+) -> None:
+    """Add `columns` (name to type) that a table created by an older version
+    does not have yet."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table});")}
+    for name, type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type};")
 
 
 @auto_connection
@@ -68,3 +186,283 @@ def delete_score_table(cursor: sql.Cursor):
         DROP TABLE IF EXISTS scores;
         """
     )
+
+
+@auto_connection
+def create_job_tables(cursor: sql.Cursor) -> None:
+    """Create the tables `crawl_jobs` and `crawl_job_maps` holding the state
+    of resumable score crawls."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_jobs (
+            job_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            name TEXT,
+            created_time INTEGER,
+            cursor INTEGER,
+            finished_time INTEGER
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_job_maps (
+            job_id INTEGER,
+            map_id INTEGER,
+            position INTEGER,
+            status TEXT,
+            attempts INTEGER,
+            last_error TEXT,
+            PRIMARY KEY (job_id, map_id)
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS crawl_job_maps_status
+        ON crawl_job_maps (job_id, status, position);
+        """
+    )
+
+
+@auto_connection
+def delete_job_tables(cursor: sql.Cursor) -> None:
+    """Delete the tables `crawl_jobs` and `crawl_job_maps`"""
+    cursor.execute(
+        """
+        DROP TABLE IF EXISTS crawl_job_maps;
+        """
+    )
+    cursor.execute(
+        """
+        DROP TABLE IF EXISTS crawl_jobs;
+        """
+    )
+
+
+@auto_connection
+def create_user_tables(cursor: sql.Cursor) -> None:
+    """Create the tables `tracked_users` and `score_checks`, the time each
+    user's score on each map was last requested."""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tracked_users (
+            user_id INTEGER PRIMARY KEY,
+            added_time INTEGER
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS score_checks (
+            user_id INTEGER,
+            map_id INTEGER,
+            checked_time INTEGER,
+            PRIMARY KEY (user_id, map_id)
+        );
+        """
+    )
+
+
+@auto_connection
+def delete_user_tables(cursor: sql.Cursor) -> None:
+    """Delete the tables `tracked_users` and `score_checks`"""
+    cursor.execute(
+        """
+        DROP TABLE IF EXISTS tracked_users;
+        """
+    )
+    cursor.execute(
+        """
+        DROP TABLE IF EXISTS score_checks;
+        """
+    )
+
+
+@auto_connection
+def create_stats_tables(cursor: sql.Cursor) -> None:
+    """Create the tables `user_stats`, `user_stat_counts` and
+    `map_stat_counts` and the triggers keeping them up to date with `scores`
+    and `maps`. They are filled from the existing rows whenever a trigger was
+    missing, such as after either table was recreated.
+
+    Must be called after create_map_table() and create_score_table()"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            checked INTEGER,
+            played INTEGER,
+            fc_count INTEGER,
+            total_score INTEGER,
+            total_pp REAL,
+            accuracy_sum REAL
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_stat_counts (
+            user_id INTEGER,
+            category TEXT,
+            key,
+            count INTEGER,
+            PRIMARY KEY (user_id, category, key)
+        ) WITHOUT ROWID;
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS map_stat_counts (
+            category TEXT,
+            key,
+            count INTEGER,
+            PRIMARY KEY (category, key)
+        ) WITHOUT ROWID;
+        """
+    )
+
+    trigger_count = cursor.execute(
+        """
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name LIKE '%\\_stats\\_%' ESCAPE '\\';
+        """
+    ).fetchone()[0]
+    for trigger in STATS_TRIGGERS:
+        cursor.execute(trigger)
+    if trigger_count < len(STATS_TRIGGERS):
+        rebuild_stats()
+
+
+@auto_connection
+def delete_stats_tables(cursor: sql.Cursor) -> None:
+    """Delete the tables `user_stats`, `user_stat_counts` and
+    `map_stat_counts` and their triggers"""
+    for name in (
+        "scores_stats_insert",
+        "scores_stats_delete",
+        "scores_stats_update",
+        "maps_stats_insert",
+        "maps_stats_delete",
+        "maps_stats_update",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name};")
+    for table in ("user_stats", "user_stat_counts", "map_stat_counts"):
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
+
+
+@auto_connection
+def create_history_table(cursor: sql.Cursor) -> None:
+    """Create the table `score_history` and the triggers appending new scores
+    of table `scores` to it. Stored scores missing from it are added whenever
+    a trigger was missing, such as after `scores` was recreated.
+
+    Must be called after create_score_table()"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS score_history (
+            score_id INTEGER,
+            user_id INTEGER,
+            map_id INTEGER,
+            score INTEGER,
+            accuracy REAL,
+            max_combo INTEGER,
+            mods INTEGER,
+            submit_time INTEGER,
+            pp REAL,
+            grade TEXT,
+            perfect INTEGER,
+            recorded_time INTEGER,
+            PRIMARY KEY (user_id, map_id, score_id)
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS score_history_user_time
+        ON score_history (user_id, submit_time);
+        """
+    )
+
+    trigger_count = cursor.execute(
+        """
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name LIKE 'scores\\_history\\_%' ESCAPE '\\';
+        """
+    ).fetchone()[0]
+    for trigger in HISTORY_TRIGGERS:
+        cursor.execute(trigger)
+    if trigger_count < len(HISTORY_TRIGGERS):
+        backfill_history()
+
+
+@auto_connection
+def delete_history_table(cursor: sql.Cursor) -> None:
+    """Delete the table `score_history` and its triggers"""
+    cursor.execute("DROP TRIGGER IF EXISTS scores_history_insert;")
+    cursor.execute("DROP TRIGGER IF EXISTS scores_history_update;")
+    cursor.execute("DROP TABLE IF EXISTS score_history;")
+
+
+@auto_connection
+def create_leaderboard_tables(cursor: sql.Cursor) -> None:
+    """Create the tables `leaderboard_positions`, `leaderboard_history` and
+    `leaderboard_checks` and the triggers recording changes of position.
+
+    Must be called after create_score_table()"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_positions (
+            user_id INTEGER,
+            map_id INTEGER,
+            position INTEGER,
+            recorded_time INTEGER,
+            PRIMARY KEY (user_id, map_id)
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS leaderboard_positions_time
+        ON leaderboard_positions (recorded_time, user_id);
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_history (
+            user_id INTEGER,
+            map_id INTEGER,
+            recorded_time INTEGER,
+            position INTEGER,
+            PRIMARY KEY (user_id, map_id, recorded_time)
+        ) WITHOUT ROWID;
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_checks (
+            map_id INTEGER PRIMARY KEY,
+            digest TEXT,
+            checked_time INTEGER,
+            changed_time INTEGER,
+            next_check_time INTEGER
+        );
+        """
+    )
+    for trigger in LEADERBOARD_TRIGGERS:
+        cursor.execute(trigger)
+
+
+@auto_connection
+def delete_leaderboard_tables(cursor: sql.Cursor) -> None:
+    """Delete the tables `leaderboard_positions`, `leaderboard_history` and
+    `leaderboard_checks` and their triggers"""
+    for name in (
+        "leaderboard_positions_history_insert",
+        "leaderboard_positions_history_update",
+        "scores_leaderboard_insert",
+        "scores_leaderboard_update",
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name};")
+    for table in ("leaderboard_positions", "leaderboard_history", "leaderboard_checks"):
+        cursor.execute(f"DROP TABLE IF EXISTS {table};")
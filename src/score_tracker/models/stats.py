@@ -0,0 +1,246 @@
+"""Per-user statistics, kept up to date by triggers."""
+
+import sqlite3 as sql
+
+from score_tracker.models.utils import auto_connection
+
+# weight of the n-th best score in the weighted pp total is WEIGHT ** n
+WEIGHT = 0.95
+WEIGHTED_SCORES = 100
+
+
+def _year(row: str) -> str:
+    """Key of category "year": the year the map `row` was ranked, in UTC."""
+    year = f"strftime('%Y', {row}.ranked_time, 'unixepoch')"
+    return f"COALESCE(CAST({year} AS INTEGER), 0)"
+
+
+def _stars(row: str) -> str:
+    """Key of category "stars": star rating rounded down, 10 for anything above."""
+    return f"MIN(CAST(COALESCE({row}.diff_rating, 0) AS INTEGER), 10)"
+
+
+def _score_changes(row: str, sign: str) -> str:
+    """Statements adding (`sign` "+1") or removing ("-1") the score `row`."""
+    return f"""
+        INSERT INTO user_stats VALUES (
+            {row}.user_id,
+            {sign},
+            {sign} * ({row}.score > 0),
+            {sign} * ({row}.score > 0 AND COALESCE({row}.perfect, 0)),
+            {sign} * {row}.score,
+            {sign} * COALESCE({row}.pp, 0),
+            {sign} * ({row}.score > 0) * {row}.accuracy
+        )
+        ON CONFLICT (user_id) DO UPDATE SET
+            checked = checked + excluded.checked,
+            played = played + excluded.played,
+            fc_count = fc_count + excluded.fc_count,
+            total_score = total_score + excluded.total_score,
+            total_pp = total_pp + excluded.total_pp,
+            accuracy_sum = accuracy_sum + excluded.accuracy_sum;
+
+        INSERT INTO user_stat_counts
+        SELECT {row}.user_id, 'grade', COALESCE({row}.grade, ''), {sign}
+        WHERE {row}.score > 0
+        UNION ALL
+        SELECT {row}.user_id, 'mods', {row}.mods, {sign}
+        WHERE {row}.score > 0
+        UNION ALL
+        SELECT {row}.user_id, 'year', {_year("m")}, {sign}
+        FROM maps AS m WHERE m.map_id = {row}.map_id AND {row}.score > 0
+        UNION ALL
+        SELECT {row}.user_id, 'stars', {_stars("m")}, {sign}
+        FROM maps AS m WHERE m.map_id = {row}.map_id AND {row}.score > 0
+        ON CONFLICT (user_id, category, key) DO UPDATE SET
+            count = count + excluded.count;
+    """
+
+
+def _map_changes(row: str, sign: str) -> str:
+    """Statements adding or removing the map `row`, and the played scores on
+    it from each user's counts by year and star rating."""
+    return f"""
+        INSERT INTO map_stat_counts
+        SELECT 'status', {row}.ranked_type, {sign} WHERE true
+        UNION ALL
+        SELECT 'year', {_year(row)}, {sign} WHERE true
+        UNION ALL
+        SELECT 'stars', {_stars(row)}, {sign} WHERE true
+        ON CONFLICT (category, key) DO UPDATE SET
+            count = count + excluded.count;
+
+        INSERT INTO user_stat_counts
+        SELECT user_id, 'year', {_year(row)}, {sign} * COUNT(*)
+        FROM scores WHERE map_id = {row}.map_id AND score > 0 GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 'stars', {_stars(row)}, {sign} * COUNT(*)
+        FROM scores WHERE map_id = {row}.map_id AND score > 0 GROUP BY user_id
+        ON CONFLICT (user_id, category, key) DO UPDATE SET
+            count = count + excluded.count;
+    """
+
+
+STATS_TRIGGERS: tuple[str, ...] = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS scores_stats_insert AFTER INSERT ON scores
+    BEGIN {_score_changes("NEW", "+1")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS scores_stats_delete AFTER DELETE ON scores
+    BEGIN {_score_changes("OLD", "-1")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS scores_stats_update AFTER UPDATE ON scores
+    BEGIN {_score_changes("OLD", "-1")} {_score_changes("NEW", "+1")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_stats_insert AFTER INSERT ON maps
+    BEGIN {_map_changes("NEW", "+1")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_stats_delete AFTER DELETE ON maps
+    BEGIN {_map_changes("OLD", "-1")} END;
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS maps_stats_update
+    AFTER UPDATE OF ranked_time, ranked_type, diff_rating ON maps
+    WHEN OLD.ranked_type IS NOT NEW.ranked_type
+        OR {_year("OLD")} != {_year("NEW")}
+        OR {_stars("OLD")} != {_stars("NEW")}
+    BEGIN {_map_changes("OLD", "-1")} {_map_changes("NEW", "+1")} END;
+    """,
+)
+
+
+@auto_connection
+def rebuild_stats(cursor: sql.Cursor) -> None:
+    """Recompute all aggregate tables from `scores` and `maps`"""
+    cursor.execute("DELETE FROM user_stats;")
+    cursor.execute("DELETE FROM user_stat_counts;")
+    cursor.execute("DELETE FROM map_stat_counts;")
+    cursor.execute(
+        """
+        INSERT INTO user_stats
+        SELECT
+            user_id,
+            COUNT(*),
+            SUM(score > 0),
+            SUM(score > 0 AND COALESCE(perfect, 0)),
+            SUM(score),
+            SUM(COALESCE(pp, 0)),
+            SUM((score > 0) * accuracy)
+        FROM scores
+        GROUP BY user_id;
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO map_stat_counts
+        SELECT 'status', ranked_type, COUNT(*) FROM maps GROUP BY 2
+        UNION ALL
+        SELECT 'year', {_year("maps")}, COUNT(*) FROM maps GROUP BY 2
+        UNION ALL
+        SELECT 'stars', {_stars("maps")}, COUNT(*) FROM maps GROUP BY 2;
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO user_stat_counts
+        SELECT user_id, 'grade', COALESCE(grade, ''), COUNT(*)
+        FROM scores WHERE score > 0 GROUP BY 1, 3
+        UNION ALL
+        SELECT user_id, 'mods', mods, COUNT(*)
+        FROM scores WHERE score > 0 GROUP BY 1, 3
+        UNION ALL
+        SELECT s.user_id, 'year', {_year("m")}, COUNT(*)
+        FROM scores AS s JOIN maps AS m ON m.map_id = s.map_id
+        WHERE s.score > 0 GROUP BY 1, 3
+        UNION ALL
+        SELECT s.user_id, 'stars', {_stars("m")}, COUNT(*)
+        FROM scores AS s JOIN maps AS m ON m.map_id = s.map_id
+        WHERE s.score > 0 GROUP BY 1, 3;
+        """
+    )
+
+
+@auto_connection
+def get_user_stats(cursor: sql.Cursor, user_id: int) -> dict:
+    """Totals of a user's stored scores: maps checked and played, full
+    combos, total score, total and weighted pp and average accuracy"""
+    row = cursor.execute(
+        """
+        SELECT checked, played, fc_count, total_score, total_pp, accuracy_sum
+        FROM user_stats
+        WHERE user_id = ?;
+        """,
+        (user_id,),
+    ).fetchone()
+    if row is None:
+        row = (0, 0, 0, 0, 0.0, 0.0)
+
+    best_pp = cursor.execute(
+        """
+        SELECT pp FROM scores
+        WHERE user_id = ? AND score > 0 AND pp > 0
+        ORDER BY pp DESC
+        LIMIT ?;
+        """,
+        (user_id, WEIGHTED_SCORES),
+    ).fetchall()
+
+    return {
+        "checked": row[0],
+        "played": row[1],
+        "fc_count": row[2],
+        "total_score": row[3],
+        "total_pp": round(row[4], 3),
+        "weighted_pp": round(sum(pp * WEIGHT**i for i, (pp,) in enumerate(best_pp)), 3),
+        "accuracy": round(row[5] / row[1], 6) if row[1] else 0.0,
+    }
+
+
+@auto_connection
+def get_user_counts(cursor: sql.Cursor, user_id: int, category: str) -> dict:
+    """Number of a user's played scores by the keys of `category`"""
+    rows = cursor.execute(
+        """
+        SELECT key, count FROM user_stat_counts
+        WHERE user_id = ? AND category = ? AND count > 0
+        ORDER BY key;
+        """,
+        (user_id, category),
+    ).fetchall()
+
+    return dict(rows)
+
+
+@auto_connection
+def get_user_completion(
+    cursor: sql.Cursor, user_id: int, category: str
+) -> list[tuple[int, int, int]]:
+    """Maps played by a user and maps stored, by year or star rating"""
+    return cursor.execute(
+        """
+        SELECT m.key, COALESCE(u.count, 0), m.count
+        FROM map_stat_counts AS m
+        LEFT JOIN user_stat_counts AS u
+            ON u.user_id = ? AND u.category = m.category AND u.key = m.key
+        WHERE m.category = ? AND m.count > 0
+        ORDER BY m.key;
+        """,
+        (user_id, category),
+    ).fetchall()
+
+
+@auto_connection
+def get_map_status_counts(cursor: sql.Cursor) -> dict[int, int]:
+    """Number of stored maps by ranked type"""
+    rows = cursor.execute(
+        """
+        SELECT key, count FROM map_stat_counts
+        WHERE category = 'status' AND count > 0;
+        """
+    ).fetchall()
+
+    return dict(rows)
@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+import sqlite3 as sql
+
+from score_tracker.models.utils import auto_connection
+
+# keyset for the first page of queries ordered by (ranked_time, map_id) DESC
+_LAST_KEY = (2**63 - 1, 2**63 - 1)
+
+
+@auto_connection
+def add_tracked_user(cursor: sql.Cursor, user_id: int) -> None:
+    """Add user to table `tracked_users`, and have the leaderboards of the
+    maps they have scores on read again so their positions are recorded"""
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO tracked_users VALUES (?, ?);
+        """,
+        (user_id, int(datetime.now(timezone.utc).timestamp())),
+    )
+    if cursor.rowcount == 0:
+        return
+    cursor.execute(
+        """
+        UPDATE leaderboard_checks SET digest = NULL, next_check_time = 0
+        WHERE map_id IN (
+            SELECT map_id FROM scores WHERE user_id = ? AND score > 0
+        );
+        """,
+        (user_id,),
+    )
+
+
+@auto_connection
+def remove_tracked_user(cursor: sql.Cursor, user_id: int) -> None:
+    """Remove user from table `tracked_users`"""
+    cursor.execute(
+        """
+        DELETE FROM tracked_users
+        WHERE user_id = ?;
+        """,
+        (user_id,),
+    )
+
+
+@auto_connection
+def get_tracked_user_ids(cursor: sql.Cursor) -> list[int]:
+    user_ids = cursor.execute(
+        """
+        SELECT user_id FROM tracked_users
+        ORDER BY added_time ASC;
+        """
+    ).fetchall()
+
+    return [row[0] for row in user_ids]
+
+
+@auto_connection
+def record_score_check(cursor: sql.Cursor, user_id: int, map_id: int) -> None:
+    """Record that a user's score on a map was just requested"""
+    cursor.execute(
+        """
+        INSERT OR REPLACE INTO score_checks VALUES (?, ?, ?);
+        """,
+        (user_id, map_id, int(datetime.now(timezone.utc).timestamp())),
+    )
+
+
+@auto_connection
+def get_unchecked_maps(
+    cursor: sql.Cursor,
+    user_id: int,
+    before: tuple[int, int] | None = None,
+    limit: int = 500,
+) -> list[tuple[int, int]]:
+    """Get `(ranked_time, map_id)` of maps with no row in `scores` for the
+    user, most recently ranked first, starting after the key `before`"""
+    return cursor.execute(
+        """
+        SELECT ranked_time, map_id FROM maps
+        WHERE (ranked_time, map_id) < (?, ?) AND NOT EXISTS (
+            SELECT 1 FROM scores
+            WHERE scores.user_id = ? AND scores.map_id = maps.map_id
+        )
+        ORDER BY ranked_time DESC, map_id DESC LIMIT ?;
+        """,
+        (*(before or _LAST_KEY), user_id, limit),
+    ).fetchall()
+
+
+@auto_connection
+def get_stale_maps(
+    cursor: sql.Cursor,
+    user_id: int,
+    checked_before: int,
+    before: tuple[int, int] | None = None,
+    limit: int = 500,
+) -> list[tuple[int, int]]:
+    """Get `(ranked_time, map_id)` of maps the user had no score on when last
+    checked, if that was before `checked_before`, most recently ranked first"""
+    return cursor.execute(
+        """
+        SELECT m.ranked_time, m.map_id FROM scores AS s
+        JOIN maps AS m ON m.map_id = s.map_id
+        LEFT JOIN score_checks AS c
+            ON c.user_id = s.user_id AND c.map_id = s.map_id
+        WHERE s.user_id = ? AND s.score = 0
+            AND COALESCE(c.checked_time, 0) < ?
+            AND (m.ranked_time, m.map_id) < (?, ?)
+        ORDER BY m.ranked_time DESC, m.map_id DESC LIMIT ?;
+        """,
+        (user_id, checked_before, *(before or _LAST_KEY), limit),
+    ).fetchall()
+
+
+@auto_connection
+def get_remaining_work_count(
+    cursor: sql.Cursor, user_id: int, checked_before: int
+) -> int:
+    """Get the number of maps `get_unchecked_maps` and `get_stale_maps` would
+    return for the user"""
+    result = cursor.execute(
+        """
+        SELECT
+            (
+                SELECT COUNT(*) FROM maps
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM scores
+                    WHERE scores.user_id = ? AND scores.map_id = maps.map_id
+                )
+            ) + (
+                SELECT COUNT(*) FROM scores AS s
+                JOIN maps AS m ON m.map_id = s.map_id
+                LEFT JOIN score_checks AS c
+                    ON c.user_id = s.user_id AND c.map_id = s.map_id
+                WHERE s.user_id = ? AND s.score = 0
+                    AND COALESCE(c.checked_time, 0) < ?
+            );
+        """,
+        (user_id, user_id, checked_before),
+    ).fetchone()
+
+    return result[0]
+
+
+@auto_connection
+def get_user_score_count(cursor: sql.Cursor, user_id: int) -> int:
+    result = cursor.execute(
+        """
+        SELECT COALESCE(MAX(played), 0) FROM user_stats
+        WHERE user_id = ?;
+        """,
+        (user_id,),
+    ).fetchone()
+
+    return result[0]
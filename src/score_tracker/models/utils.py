@@ -1,40 +1,167 @@
 import sqlite3 as sql
+import threading
+from contextlib import contextmanager
 from functools import wraps
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Iterator, NamedTuple
 
-from ossapi.ossapi import Beatmap as BeatmapV1
-from ossapi.models import Score
+if TYPE_CHECKING:
+    from ossapi.ossapi import Beatmap as BeatmapV1
+    from ossapi.models import Score
 
-type BeatmapTuple = tuple[int, int, int, int, str, str, str, str, int, float, int]
-type ScoreTuple = tuple[int, int, int, int, float, int, int, int, float]
+
+class MapRecord(NamedTuple):
+    """Row of table `maps`.
+
+    Maps from the api are converted into these as soon as they are
+    retrieved, so only the stored fields are kept in memory."""
+
+    map_id: int
+    set_id: int
+    ranked_time: int
+    ranked_type: int
+    artist: str
+    title: str
+    diff_name: str
+    mapper: str
+    mapper_id: int
+    diff_rating: float
+    length: int
+
+
+class ScoreRecord(NamedTuple):
+    """Row of table `scores`. A `score` of 0 means the user has no score on
+    the map."""
+
+    score_id: int
+    user_id: int
+    map_id: int
+    score: int
+    accuracy: float
+    max_combo: int
+    mods: int
+    submit_time: int
+    pp: float
+    grade: str | None
+    perfect: int
+
+
+DATABASE_PATH = "database.sqlite"
+
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -32000;",
+    "PRAGMA busy_timeout = 10000;",
+    # so that INSERT OR REPLACE runs the delete triggers keeping stats current
+    "PRAGMA recursive_triggers = ON;",
+)
+
+_local = threading.local()
+_connections: list[sql.Connection] = []
+_connections_lock = threading.Lock()
+# bumped by `close_connections`, so other threads know to reconnect
+_generation = 0
+
+
+def get_connection() -> sql.Connection:
+    """Get the long-lived connection to the database for the current thread."""
+    connection = getattr(_local, "connection", None)
+    if connection is None or _local.generation != _generation:
+        connection = sql.connect(DATABASE_PATH, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            connection.execute(pragma)
+        _local.connection = connection
+        _local.generation = _generation
+        _local.depth = 0
+        with _connections_lock:
+            _connections.append(connection)
+    return connection
+
+
+def close_connections() -> None:
+    """Close every connection opened by `get_connection`, in all threads.
+    Threads still running open a new connection on their next query."""
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        while _connections:
+            _connections.pop().close()
+    _local.__dict__.clear()
+
+
+def close_connection() -> None:
+    """Close the current thread's connection, before the thread exits."""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        return
+    with _connections_lock:
+        if connection in _connections:
+            _connections.remove(connection)
+    connection.close()
+    _local.__dict__.clear()
+
+
+def set_database_path(path: str) -> None:
+    """Point all future connections at the database file `path`."""
+    global DATABASE_PATH
+    close_connections()
+    DATABASE_PATH = path
+
+
+@contextmanager
+def transaction() -> Iterator[sql.Cursor]:
+    """Unit of work on the current thread's connection.
+
+    Everything executed inside the outermost `transaction` is committed once
+    when it exits, or rolled back if it raises. Nested calls (including calls
+    to functions decorated with `auto_connection`) join the outer transaction
+    as a savepoint, so a nested block that raises is undone even if the
+    outer block catches the error.
+    """
+    connection = get_connection()
+    depth = _local.depth
+    if depth > 0:
+        # a savepoint outside a transaction would commit when released
+        if not connection.in_transaction:
+            connection.execute("BEGIN;")
+        connection.execute(f"SAVEPOINT level_{depth};")
+    _local.depth += 1
+    try:
+        yield connection.cursor()
+        if depth > 0:
+            connection.execute(f"RELEASE level_{depth};")
+        else:
+            connection.commit()
+    except BaseException:
+        if depth > 0:
+            connection.execute(f"ROLLBACK TO level_{depth};")
+            connection.execute(f"RELEASE level_{depth};")
+        else:
+            connection.rollback()
+        raise
+    finally:
+        _local.depth -= 1
 
 
 def auto_connection(func: Callable) -> Callable:
     """Decorator for automating the connection to the database."""
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        connection = sql.connect("database.sqlite")
-        try:
-            cursor = connection.cursor()
-            result = func(cursor, *args, **kwargs)
-            connection.commit()
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
-        return result
+        with transaction() as cursor:
+            return func(cursor, *args, **kwargs)
 
     return wrapper
 
 
-def beatmapv1_into_table_record(beatmap: BeatmapV1) -> BeatmapTuple:
+def beatmapv1_into_table_record(beatmap: "BeatmapV1") -> MapRecord:
     """Convert `Beatmap` object into record for sqlite table"""
-    return (
+    return MapRecord(
         beatmap.beatmap_id,
         beatmap.beatmapset_id,
         int(beatmap.approved_date.timestamp()),
-        beatmap.approved,
+        int(beatmap.approved),
         beatmap.artist,
         beatmap.title,
         beatmap.version,
@@ -45,13 +172,9 @@ def beatmapv1_into_table_record(beatmap: BeatmapV1) -> BeatmapTuple:
     )
 
 
-def score_into_table_record(score: Score | tuple[int, int]) -> ScoreTuple:
+def score_into_table_record(score: "Score") -> ScoreRecord:
     """Convert `Score` object into record for sqlite table"""
-    # tuple only used when there is no score on map
-    if isinstance(score, tuple):
-        return 0, score[0], score[1], 0, 0.0, 0, 0, 0, 0.0
-
-    return (
+    return ScoreRecord(
         score.id,
         score.user_id,
         score.beatmap.id,
@@ -61,4 +184,11 @@ def score_into_table_record(score: Score | tuple[int, int]) -> ScoreTuple:
         score.mods.value,
         int(score.created_at.timestamp()),
         score.pp,
+        score.rank.value,
+        int(score.perfect),
     )
+
+
+def missing_score_record(user_id: int, map_id: int) -> ScoreRecord:
+    """Record for sqlite table of a map the user has no score on"""
+    return ScoreRecord(0, user_id, map_id, 0, 0.0, 0, 0, 0, 0.0, None, 0)
@@ -0,0 +1,39 @@
+"""Progress messages of long running tasks, as text or JSON lines."""
+
+import json
+from datetime import datetime, timezone
+from typing import Callable
+
+type Listener = Callable[[str, str, dict], None]
+
+_json_lines = False
+_listener: Listener | None = None
+
+
+def set_json_lines(enabled: bool) -> None:
+    global _json_lines
+    _json_lines = enabled
+
+
+def set_listener(listener: Listener | None) -> None:
+    """Pass every message to `listener(event, message, fields)` instead of
+    printing it, from whichever thread reports it. None restores printing."""
+    global _listener
+    _listener = listener
+
+
+def report(event: str, message: str, **fields) -> None:
+    """Print a progress message, or its fields if JSON lines are enabled."""
+    if _listener is not None:
+        _listener(event, message, fields)
+        return
+    if not _json_lines:
+        print(message)
+        return
+
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "event": event,
+        **fields,
+    }
+    print(json.dumps(record, default=str), flush=True)